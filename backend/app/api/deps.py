@@ -1,9 +1,10 @@
 from typing import Generator
 from fastapi import Depends
 
-from app.db.database import get_connection
+from app.db.database import get_connection, get_unit_of_work
 from app.repositories.user import UserRepository
 from app.services.user import UserService
+from app.services.user_bulk import UserBulkService
 from app.services.auth import AuthService
 from app.core.security import get_current_user
 from app.core.security import get_username_from_apisix_request
@@ -12,28 +13,37 @@ from app.services.profile import ProfileService
 from app.services.consumer_group import ConsumerGroupService
 from app.repositories.login_attempt import LoginAttemptRepository
 from app.services.login_throttle import LoginThrottleService
+from app.services.throttle_store import get_throttle_store
+from app.repositories.reconcile import ReconcileRunRepository
+from app.repositories.api_key import ApiKeyRepository
+from app.services.api_keys import ApiKeyService
 
-def get_user_repository(conn = Depends(get_connection)) -> UserRepository:
+def get_user_repository(uow = Depends(get_unit_of_work)) -> UserRepository:
 	"""Get user repository instance."""
-	return UserRepository(conn)
+	return UserRepository(uow)
 
 
-def get_user_service(conn = Depends(get_connection)) -> UserService:
+def get_user_service(uow = Depends(get_unit_of_work)) -> UserService:
 	"""Get user service instance."""
-	repository = UserRepository(conn)
+	repository = UserRepository(uow)
 	return UserService(repository)
 
 
-def get_auth_service(conn = Depends(get_connection)) -> AuthService:
+def get_user_bulk_service(uow = Depends(get_unit_of_work)) -> UserBulkService:
+	"""Get user bulk export/import service instance."""
+	return UserBulkService(UserRepository(uow))
+
+
+def get_auth_service(uow = Depends(get_unit_of_work)) -> AuthService:
     """Get auth service instance."""
-    repository = UserRepository(conn)
+    repository = UserRepository(uow)
     return AuthService(repository)
 
 
-def get_login_throttle_service(conn = Depends(get_connection)) -> LoginThrottleService:
+def get_login_throttle_service(uow = Depends(get_unit_of_work)) -> LoginThrottleService:
     """Get login throttle service instance."""
-    repo = LoginAttemptRepository(conn)
-    return LoginThrottleService(repo)
+    store = get_throttle_store(LoginAttemptRepository(uow))
+    return LoginThrottleService(store)
 
 
 def get_profile_repository(conn = Depends(get_connection)) -> ProfileRepository:
@@ -51,16 +61,30 @@ def get_consumer_group_service() -> ConsumerGroupService:
 	return ConsumerGroupService()
 
 
+def get_reconcile_run_repository(uow = Depends(get_unit_of_work)) -> ReconcileRunRepository:
+	"""Get reconciliation run repository instance."""
+	return ReconcileRunRepository(uow)
+
+
+def get_api_key_service(uow = Depends(get_unit_of_work)) -> ApiKeyService:
+	"""Get API key service instance."""
+	return ApiKeyService(ApiKeyRepository(uow))
+
+
 # Re-export commonly used dependencies
 __all__ = [
     'get_connection',
+    'get_unit_of_work',
     'get_user_repository', 
     'get_user_service',
+    'get_user_bulk_service',
     'get_auth_service',
     'get_login_throttle_service',
     'get_profile_repository',
     'get_profile_service',
     'get_consumer_group_service',
+    'get_reconcile_run_repository',
+    'get_api_key_service',
     'get_current_user',
     'get_username_from_apisix_request'
 ]
\ No newline at end of file
@@ -0,0 +1,173 @@
+import asyncio
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Query, HTTPException
+
+from app.core.security import ensure_admin_request
+from app.db.instrumentation import query_stats
+from app.utils.cache import all_cache_stats, get_cache
+from app.core.hashing import password_hasher
+from app.core.pwned import pwned_passwords
+from app.services.consumer_cache import consumer_cache
+from app.services.profile_catalogue import profile_catalogue
+from app.services.provisioning import provisioning_worker
+from app.services.apisix_client import apisix_admin
+from app.services.auth import login_timings
+from app.services.reconcile import ReconciliationService
+from app.repositories.reconcile import ReconcileRunRepository
+from app.api.deps import get_reconcile_run_repository
+
+router = APIRouter()
+
+
+@router.get("/db/queries", include_in_schema=False)
+async def top_queries(
+	request: Request,
+	limit: int = Query(20, ge=1, le=500),
+	order_by: str = Query("total_ms", pattern="^(total_ms|count|avg_ms|max_ms|p95_ms|p99_ms|rows|errors)$")
+) -> dict:
+	"""Top-N repository statements by fingerprint, plus connection checkout wait."""
+
+	ensure_admin_request(request)
+
+	return query_stats.top(limit=limit, order_by=order_by)
+
+
+@router.post("/db/queries/reset", include_in_schema=False)
+async def reset_query_stats(request: Request) -> dict:
+	"""Start a fresh measurement window."""
+
+	ensure_admin_request(request)
+
+	query_stats.reset()
+	return {"message": "Query statistics reset"}
+
+
+@router.get("/caches", include_in_schema=False)
+async def cache_stats(request: Request) -> list:
+	"""Size, hit rate, evictions and invalidations of every in-process cache."""
+
+	ensure_admin_request(request)
+
+	return all_cache_stats()
+
+
+@router.post("/caches/{name}/clear", include_in_schema=False)
+async def clear_cache(request: Request, name: str) -> dict:
+	"""Drop every entry of one cache (this worker only)."""
+
+	ensure_admin_request(request)
+
+	cache = get_cache(name)
+	if cache is None:
+		raise HTTPException(status_code=404, detail=f"Cache {name} not found")
+	cache.clear()
+	return {"message": f"Cache {name} cleared"}
+
+
+@router.get("/hashing", include_in_schema=False)
+async def hashing_stats(request: Request) -> dict:
+	"""Password hashing pool: queue depth, rejections and latency (queueing included)."""
+
+	ensure_admin_request(request)
+
+	return password_hasher.stats()
+
+
+@router.get("/pwned", include_in_schema=False)
+async def pwned_stats(request: Request) -> dict:
+	"""Breached-password check: offline index state, lookups and remote calls."""
+
+	ensure_admin_request(request)
+
+	return pwned_passwords.stats()
+
+
+@router.get("/apisix-client", include_in_schema=False)
+async def apisix_client_stats(request: Request) -> dict:
+	"""Shared APISIX admin client: requests, retries and failed calls (this worker)."""
+
+	ensure_admin_request(request)
+
+	return apisix_admin.stats()
+
+
+@router.get("/consumer-cache", include_in_schema=False)
+async def consumer_cache_stats(request: Request) -> dict:
+	"""Local APISIX consumer cache: mode, size, hit rate and sync state (this worker)."""
+
+	ensure_admin_request(request)
+
+	return consumer_cache.stats()
+
+
+@router.post("/consumer-cache/reload", include_in_schema=False)
+async def reload_consumer_cache(request: Request) -> dict:
+	"""Reconcile the consumer cache with a full admin API listing now (this worker only)."""
+
+	ensure_admin_request(request)
+
+	if not consumer_cache.enabled:
+		raise HTTPException(status_code=409, detail="Consumer cache is disabled")
+	await consumer_cache.load()
+	return consumer_cache.stats()
+
+
+@router.get("/profile-catalogue", include_in_schema=False)
+async def profile_catalogue_stats(request: Request) -> dict:
+	"""Profile catalogue: groups and profiles held, reloads and admin API fallbacks (this worker)."""
+
+	ensure_admin_request(request)
+
+	return profile_catalogue.stats()
+
+
+@router.get("/provisioning", include_in_schema=False)
+async def provisioning_stats(request: Request) -> dict:
+	"""Consumer provisioning: outbox backlog (all workers) and this worker's outcomes."""
+
+	ensure_admin_request(request)
+
+	backlog = await asyncio.to_thread(provisioning_worker.backlog)
+	return {**provisioning_worker.stats(), **backlog}
+
+
+@router.get("/login-timing", include_in_schema=False)
+async def login_timing(request: Request) -> dict:
+	"""Latency of each /token login phase (phases overlap, see Server-Timing)."""
+
+	ensure_admin_request(request)
+
+	return login_timings.as_dict()
+
+
+@router.post("/reconcile", include_in_schema=False)
+async def start_reconciliation(
+	request: Request,
+	background_tasks: BackgroundTasks,
+	dry_run: bool = Query(True),
+	incremental: bool = Query(False)
+) -> dict:
+	"""Start a DB-to-APISIX reconciliation run in the background; poll it by id."""
+
+	ensure_admin_request(request)
+
+	service = ReconciliationService(dry_run=dry_run, incremental=incremental)
+	run_id = await service.begin()
+	background_tasks.add_task(service.run, run_id)
+	return {"id": run_id, "mode": "incremental" if service.incremental else "full", "dry_run": dry_run}
+
+
+@router.get("/reconcile/runs/{run_id}", include_in_schema=False)
+async def get_reconciliation_run(
+	request: Request,
+	run_id: int,
+	run_repository: ReconcileRunRepository = Depends(get_reconcile_run_repository)
+) -> dict:
+	"""State of a reconciliation run; the summary is stored when it finishes."""
+
+	ensure_admin_request(request)
+
+	run = run_repository.get(run_id)
+	if not run:
+		raise HTTPException(status_code=404, detail=f"Reconciliation run {run_id} not found")
+	return run
@@ -1,5 +1,6 @@
 import os
-from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
 from fastapi.responses import JSONResponse, RedirectResponse
 from app.api.deps import (
 	get_auth_service,
@@ -14,11 +15,12 @@ from app.schemas.user import (
 	PasswordRecoveryRequest,
 	PasswordRecoveryResponse,
 )
-from app.services.auth import AuthService
+from app.services.auth import AuthService, login_timings
 from app.services.user import UserService
 from app.services.login_throttle import LoginThrottleService
 from app.core.config import settings
-from app.core.exceptions import InvalidCredentialsException, TooManyLoginAttemptsException
+from app.core.exceptions import InvalidCredentialsException, TooManyLoginAttemptsException, HashingOverloadedException
+from app.utils.metrics import PhaseTimer
 import logging
 from datetime import datetime
 
@@ -31,6 +33,7 @@ CRUD_ADMIN = os.getenv('CRUD_ADMIN', 'admin')
 async def login(
 	request: Request,
 	form_data: UserLogin,
+	background_tasks: BackgroundTasks,
 	auth_service: AuthService = Depends(get_auth_service),
 	throttle_service: LoginThrottleService = Depends(get_login_throttle_service),
 ):
@@ -43,49 +46,49 @@ async def login(
 				return fwd.split(',')[0].strip()
 		return req.client.host
 
+	def _respond(content: dict, timer: PhaseTimer, headers: Optional[dict] = None) -> JSONResponse:
+		login_timings.record(timer)
+		return JSONResponse(
+			content=content,
+			headers={"Access-Control-Allow-Credentials": "true", "Server-Timing": timer.header(), **(headers or {})}
+		)
+
 	client_ip = _get_client_ip(request)
+	timer = PhaseTimer()
+	failed = {"success": False, "access_token": None, "status": None, "http_code": 401}
 	try:
 		# Check active lock before processing auth
-		locked_until = throttle_service.is_locked(form_data.username, client_ip)
+		with timer.phase("throttle"):
+			locked_until = throttle_service.is_locked(form_data.username, client_ip)
 		if locked_until:
 			# Calculate retry-after seconds
 			retry_after_seconds = max(0, int((locked_until - datetime.now()).total_seconds()))
-			return JSONResponse(
-				content={"success": False, "access_token": None, "status": None, "http_code": 429},
-				headers={"Access-Control-Allow-Credentials": "true", "Retry-After": str(retry_after_seconds)}
-			)
+			return _respond({**failed, "http_code": 429}, timer, {"Retry-After": str(retry_after_seconds)})
 
-		token_data = await auth_service.authenticate_user(form_data)
+		token_data = await auth_service.authenticate_user(form_data, timer)
 		if token_data and token_data.access_token:
-			# Success: clear any lock and record success
-			throttle_service.on_success(form_data.username, client_ip)
-			response = JSONResponse(
-				content={"success": True, "access_token": token_data.access_token, "status": token_data.status, "http_code": 200},
-				headers={"Access-Control-Allow-Credentials": "true"}
+			# Success: clear any lock and record success, once the response is sent
+			background_tasks.add_task(throttle_service.on_success, form_data.username, client_ip)
+			return _respond(
+				{"success": True, "access_token": token_data.access_token, "status": token_data.status, "http_code": 200},
+				timer
 			)
-		else:
-			# Treat as failure
+		# Treat as failure; counted before answering, so parallel attempts cannot outrun the lock
+		with timer.phase("throttle"):
 			throttle_service.register_failure_and_lock_if_needed(form_data.username, client_ip)
-			response = JSONResponse(
-				content={"success": False, "access_token": None, "status": None, "http_code": 401},
-				headers={"Access-Control-Allow-Credentials": "true"}
-			)
-		
-		return response
+		return _respond(failed, timer)
+	except HashingOverloadedException as e:
+		# Password hashing pool saturated: not a failed attempt, ask to retry shortly
+		return _respond({**failed, "http_code": 429}, timer, e.headers)
 	except InvalidCredentialsException:
 		# Invalid credentials: register failure and respond generically
-		throttle_service.register_failure_and_lock_if_needed(form_data.username, client_ip)
-		return JSONResponse(
-			content={"success": False, "access_token": None, "status": None, "http_code": 401},
-			headers={"Access-Control-Allow-Credentials": "true"}
-		)
+		with timer.phase("throttle"):
+			throttle_service.register_failure_and_lock_if_needed(form_data.username, client_ip)
+		return _respond(failed, timer)
 	except Exception as e:
 		print(e)
 		# Generic error
-		return JSONResponse(
-			content={"success": False, "access_token": None, "status": None, "http_code": 401},
-			headers={"Access-Control-Allow-Credentials": "true"}
-		)
+		return _respond(failed, timer)
 
 @router.get("/federated_token", include_in_schema=False)
 async def login2(
@@ -191,6 +194,12 @@ async def login_crud(
 			)
 		
 		return response
+	except HashingOverloadedException as e:
+		# Password hashing pool saturated: not a failed attempt, ask to retry shortly
+		return JSONResponse(
+			content={"success": False, "access_token": None, "http_code": 429},
+			headers={"Access-Control-Allow-Credentials": "true", **e.headers}
+		)
 	except InvalidCredentialsException:
 		# Invalid credentials: register failure and respond generically
 		throttle_service.register_failure_and_lock_if_needed(form_data.username, client_ip)
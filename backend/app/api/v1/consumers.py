@@ -19,7 +19,7 @@ async def create_consumer(
     """
     apisix_service = APISIXService()
     
-    if apisix_service.create_consumer(consumer):
+    if await apisix_service.create_consumer(consumer):
         return ConsumerResponse(
             message=f"Consumer '{consumer.username}' created successfully",
             username=consumer.username
@@ -38,5 +38,5 @@ async def delete_consumer(
     """
     apisix_service = APISIXService()
     
-    if apisix_service.delete_consumer(username):
+    if await apisix_service.delete_consumer(username):
         return {"message": f"Consumer '{username}' deleted successfully"}
\ No newline at end of file
@@ -4,6 +4,7 @@ import requests
 import os
 from app.core.security import get_username_from_apisix_request, verify_file_size,validate_file_type,sanitize_filename
 from app.services.user import UserService
+from app.services.api_keys import api_key_usage
 from app.api.deps import get_user_service, get_current_user
 from app.schemas.nlp import TextRequest
 import time
@@ -17,8 +18,10 @@ NLP_URL = os.getenv('NLP_URL', 'http://lemma_eta_nerc:8010')
 
 def api_key_header(apikey: str = Header(..., description="API key for authentication")):
     """
-    Solo para documentación. No valida nada en FastAPI.
+    Solo para documentación. No valida nada en FastAPI
+    (APISIX key-auth ya lo ha hecho); solo se anota el último uso de la clave.
     """
+    api_key_usage.record(apikey)
     return apikey
 
 # Function to call NLP Tools with text input
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1 import auth, users, consumers, profiles, nlp
+from app.api.v1 import auth, users, consumers, profiles, nlp, admin
 
 api_router = APIRouter()
 
@@ -9,4 +9,5 @@ api_router.include_router(auth.router, tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(consumers.router, tags=["consumers"])
 api_router.include_router(profiles.router, prefix="/profiles", tags=["profiles"])
-api_router.include_router(nlp.router, tags=["nlp"])
\ No newline at end of file
+api_router.include_router(nlp.router, tags=["nlp"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
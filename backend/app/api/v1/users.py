@@ -1,16 +1,24 @@
+import asyncio
 import os
-from typing import List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status, Request, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Request, BackgroundTasks, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
-from app.api.deps import get_user_service, get_current_user, get_username_from_apisix_request
+from app.api.deps import get_user_service, get_user_bulk_service, get_api_key_service, get_current_user, get_username_from_apisix_request
 from app.schemas.user import (
 	User, UserCreate, UserUpdate, UserProfile,
 	SendVerificationRequest, SendVerificationResponse,
-	EmailVerificationRequest, EmailVerificationResponse
+	EmailVerificationRequest, EmailVerificationResponse,
+	UserImportResponse, GroupMigrationRequest, ApiKeyBulkRequest, ApiKeyLookupRequest
 )
 from app.services.user import UserService, GenerateApiKeyResponse
+from app.services.user_bulk import UserBulkService
+from app.services.provisioning import provisioning_worker
+from app.services.bulk_jobs import BulkJobService
+from app.services.api_keys import ApiKeyService
+from app.core.config import settings
 from app.core.security import get_username_from_apisix_request, ensure_admin_request
 from app.core.exceptions import (
 	UserAlreadyExistsException,
@@ -27,15 +35,20 @@ router = APIRouter()
 @router.post("/", response_model=User, include_in_schema=False)
 async def create_user(
 	user: UserCreate,
+	background_tasks: BackgroundTasks,
 	user_service: UserService = Depends(get_user_service)
 ) -> User:
 	"""
 	Create a new user.
 	
-	This will also create the corresponding APISIX consumer.
+	The corresponding APISIX consumer is created in the background
+	(provision_state is 'provisioning' until then).
 	"""
 
-	return await user_service.create_user(user)
+	created = await user_service.create_user(user)
+	# Provision right after the response instead of waiting for the next poll
+	background_tasks.add_task(provisioning_worker.run_once)
+	return created
 
 
 @router.get("/", response_model=List[User], include_in_schema=False)
@@ -56,17 +69,139 @@ async def list_users(
 	- **email_contains**: Filter by email containing string
 	- **is_federated**: Filter by federation status
 	- **email_verified**: Filter by verification status
+
+	Rows are serialized directly (no response_model re-validation): they come
+	from the users table already shaped like the User schema.
 	"""
 
 	ensure_admin_request(request)
 
-	return await user_service.list_users(
+	rows = await user_service.list_user_rows(
 		u_type=u_type,
 		u_status=u_status,
 		email_contains=email_contains,
 		is_federated=is_federated,
 		email_verified=email_verified
 	)
+	return ORJSONResponse(content=rows)
+
+
+@router.get("/export", include_in_schema=False)
+async def export_users(
+	request: Request,
+	format: Literal["ndjson", "csv"] = "ndjson",
+	u_type: Optional[str] = None,
+	u_status: Optional[str] = None,
+	email_contains: Optional[str] = None,
+	is_federated: Optional[bool] = None,
+	email_verified: Optional[bool] = None
+) -> StreamingResponse:
+	"""
+	Stream users (same filters as the listing) as NDJSON or CSV.
+
+	Rows are read with a server-side cursor, batch by batch, so the export
+	runs in constant memory.
+	"""
+
+	ensure_admin_request(request)
+
+	media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+	return StreamingResponse(
+		UserBulkService.export_users(
+			format,
+			u_type=u_type,
+			u_status=u_status,
+			email_contains=email_contains,
+			is_federated=is_federated,
+			email_verified=email_verified
+		),
+		media_type=media_type,
+		headers={"Content-Disposition": f'attachment; filename="users.{format}"'}
+	)
+
+
+@router.post("/import", response_model=UserImportResponse, include_in_schema=False)
+async def import_users(
+	request: Request,
+	rows: List[Dict[str, Any]],
+	dry_run: bool = False,
+	bulk_service: UserBulkService = Depends(get_user_bulk_service)
+) -> UserImportResponse:
+	"""
+	Create many users at once (each row shaped like a user creation request).
+
+	Rows are validated individually: an invalid, duplicated or rejected row
+	does not stop the others. The response reports the outcome of every row.
+
+	- **dry_run**: Only validate and check for conflicts, create nothing
+	"""
+
+	ensure_admin_request(request)
+
+	return await bulk_service.import_users(rows, dry_run=dry_run)
+
+
+@router.post("/bulk/group-migration", include_in_schema=False)
+async def start_group_migration(
+	request: Request,
+	migration: GroupMigrationRequest,
+	background_tasks: BackgroundTasks
+) -> dict:
+	"""
+	Move many users to another consumer group in the background; poll the job by id.
+
+	Users are selected by id and/or by u_type / u_status (at least one is
+	required); those already in the target group are skipped. Renaming a
+	profile is a migration of every user of the old u_type.
+
+	- **dry_run**: Report what would be moved and which consumers are missing, change nothing
+	"""
+
+	ensure_admin_request(request)
+
+	if migration.user_ids is None and not migration.u_type and not migration.u_status:
+		raise HTTPException(status_code=400, detail="Select users by user_ids, u_type or u_status")
+
+	service = BulkJobService()
+	job_id = await service.start_group_migration(
+		migration.target_group,
+		user_ids=migration.user_ids,
+		u_type=migration.u_type,
+		u_status=migration.u_status,
+		dry_run=migration.dry_run
+	)
+	background_tasks.add_task(service.run, job_id)
+	return {"id": job_id, "dry_run": migration.dry_run}
+
+
+@router.get("/bulk/jobs/{job_id}", include_in_schema=False)
+async def get_bulk_job(request: Request, job_id: int, errors_after: int = 0) -> dict:
+	"""Progress of a bulk job and a page of its per-user errors (continue with errors_after)."""
+
+	ensure_admin_request(request)
+
+	job = await asyncio.to_thread(BulkJobService.get_job, job_id, errors_after)
+	if not job:
+		raise HTTPException(status_code=404, detail=f"Bulk job {job_id} not found")
+	return job
+
+
+@router.post("/bulk/jobs/{job_id}/resume", include_in_schema=False)
+async def resume_bulk_job(request: Request, job_id: int, background_tasks: BackgroundTasks) -> dict:
+	"""Continue an interrupted or failed bulk job from its last committed batch."""
+
+	ensure_admin_request(request)
+
+	job = await asyncio.to_thread(BulkJobService.get_job, job_id)
+	if not job:
+		raise HTTPException(status_code=404, detail=f"Bulk job {job_id} not found")
+	if job["status"] == "completed":
+		raise HTTPException(status_code=409, detail=f"Bulk job {job_id} is already completed")
+
+	service = BulkJobService()
+	await service.resume(job_id)
+	background_tasks.add_task(service.run, job_id)
+	return {"id": job_id, "cursor_id": job["cursor_id"]}
 
 
 @router.get("/profile", response_model=UserProfile)
@@ -197,6 +332,74 @@ async def generate_apiKey(
 	return GenerateApiKeyResponse(**result)
 
 
+@router.post("/api-keys/rotate", include_in_schema=False)
+async def rotate_api_keys(
+	request: Request,
+	body: ApiKeyBulkRequest,
+	api_key_service: ApiKeyService = Depends(get_api_key_service)
+) -> dict:
+	"""
+	Issue new API keys to many users at once; their previous keys stop working.
+
+	The new keys are returned in the per-user results (only this once).
+	"""
+
+	ensure_admin_request(request)
+
+	return await api_key_service.rotate(body.user_ids)
+
+
+@router.post("/api-keys/revoke", include_in_schema=False)
+async def revoke_api_keys(
+	request: Request,
+	body: ApiKeyBulkRequest,
+	api_key_service: ApiKeyService = Depends(get_api_key_service)
+) -> dict:
+	"""Remove the API keys of many users from the gateway and mark them revoked."""
+
+	ensure_admin_request(request)
+
+	return await api_key_service.revoke(body.user_ids)
+
+
+@router.post("/api-keys/lookup", include_in_schema=False)
+async def lookup_api_key(
+	request: Request,
+	body: ApiKeyLookupRequest,
+	api_key_service: ApiKeyService = Depends(get_api_key_service)
+) -> dict:
+	"""Owner and state of an API key (sent in the body, so it stays out of access logs)."""
+
+	ensure_admin_request(request)
+
+	key = api_key_service.lookup(body.api_key)
+	if not key:
+		raise HTTPException(status_code=404, detail="API key not found")
+	return key
+
+
+@router.get("/api-keys", include_in_schema=False)
+async def list_api_keys(
+	request: Request,
+	after_id: int = 0,
+	limit: int = Query(100, ge=1, le=settings.API_KEY_LIST_MAX_LIMIT),
+	user_id: Optional[int] = None,
+	active: Optional[bool] = None,
+	unused_since: Optional[datetime] = None,
+	api_key_service: ApiKeyService = Depends(get_api_key_service)
+) -> List[dict]:
+	"""
+	Audit API keys, in id order (continue with after_id = the last id).
+
+	- **active**: Only active (true) or only revoked / rotated (false) keys
+	- **unused_since**: Only keys not used since then, never-used keys included
+	"""
+
+	ensure_admin_request(request)
+
+	return api_key_service.list_keys(after_id, limit, user_id, active, unused_since)
+
+
 @router.get("/{user_id}", response_model=User)
 async def read_user(
 	request: Request,
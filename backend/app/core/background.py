@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+	"""Run a coroutine function every `interval` seconds on the event loop.
+
+	With `run_immediately` the first call happens on start instead of after the
+	first interval.
+	"""
+
+	def __init__(
+		self,
+		name: str,
+		interval: float,
+		func: Callable[[], Awaitable[None]],
+		run_immediately: bool = False
+	):
+		self.name = name
+		self.interval = interval
+		self.func = func
+		self.run_immediately = run_immediately
+		self._task: Optional[asyncio.Task] = None
+
+	def start(self) -> None:
+		if self._task is None or self._task.done():
+			self._task = asyncio.create_task(self._run(), name=self.name)
+
+	async def stop(self) -> None:
+		if self._task is None:
+			return
+		self._task.cancel()
+		try:
+			await self._task
+		except asyncio.CancelledError:
+			pass
+		self._task = None
+
+	async def _run(self) -> None:
+		wait = not self.run_immediately
+		while True:
+			if wait:
+				await asyncio.sleep(self.interval)
+			wait = True
+			try:
+				await self.func()
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				logger.error(f"Background task {self.name} failed: {str(e)}", exc_info=True)
+
+
+_tasks: List[PeriodicTask] = []
+_shutdown_hooks: List[Callable[[], Awaitable[None]]] = []
+
+
+def register(task: PeriodicTask) -> PeriodicTask:
+	"""Register a task to be started on application startup."""
+	_tasks.append(task)
+	return task
+
+
+def on_shutdown(hook: Callable[[], Awaitable[None]]) -> None:
+	"""Register a coroutine function to run after tasks are stopped (e.g. a final flush)."""
+	_shutdown_hooks.append(hook)
+
+
+def start_all() -> None:
+	for task in _tasks:
+		task.start()
+
+
+async def stop_all() -> None:
+	for task in _tasks:
+		await task.stop()
+	for hook in _shutdown_hooks:
+		try:
+			await hook()
+		except Exception as e:
+			logger.error(f"Shutdown hook failed: {str(e)}", exc_info=True)
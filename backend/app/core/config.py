@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -11,12 +11,30 @@ class Settings(BaseSettings):
 	DB_PASSWORD: str = "securepassword"
 	DB_NAME: str = "user_db"
 	DB_POOL_SIZE: int = 5
+	# Optional read replica for read-only repository methods
+	DB_REPLICA_HOST: Optional[str] = None
+	DB_REPLICA_PORT: int = 3306
+	DB_REPLICA_CONNECT_TIMEOUT: int = 2
+	DB_REPLICA_MAX_LAG_SECONDS: int = 5
+	DB_REPLICA_LAG_CHECK_SECONDS: int = 10
+	DB_REPLICA_RETRY_SECONDS: int = 30
+	# Query instrumentation
+	DB_QUERY_STATS_ENABLED: bool = True
+	DB_QUERY_STATS_MAX_FINGERPRINTS: int = 500
+	DB_SLOW_QUERY_MS: float = 200
 	
 	# JWT
 	# JWT_SECRET_KEY: str = "your-secret-key-here"
 	JWT_ALGORITHM: str = "HS256"
 	JWT_EXPIRATION_HOURS: int = 24
 
+	# Password hashing (bcrypt) runs in a process pool; None = one worker per CPU, 0 = threads
+	BCRYPT_ROUNDS: int = 12
+	BCRYPT_WORKERS: Optional[int] = None
+	# Queued + running hash operations before new ones get 429 (0 = 8 per worker)
+	BCRYPT_MAX_PENDING: int = 0
+	BCRYPT_RETRY_AFTER_SECONDS: int = 1
+
 	# SMTP Configuration
 	SMTP_HOST: str = os.getenv("SMTP_HOST")
 	SMTP_PORT: int = os.getenv("SMTP_PORT")
@@ -31,6 +49,13 @@ class Settings(BaseSettings):
 	EMAIL_VERIFICATION_EXPIRE_MINUTES: int = 30
 	MAX_EMAIL_RETRY_ATTEMPTS: int = 3
 	VERIFICATION_COOLDOWN_MINUTES: int = 5
+	EMAIL_VERIFICATION_MAX_ATTEMPTS: int = 5
+	# Server secret keying the stored hashes of verification codes, recovery tokens
+	# and API keys; changing it invalidates every outstanding token and the key index
+	TOKEN_HASH_KEY: str
+	# Expired verification/recovery tokens are deleted in background batches
+	TOKEN_SWEEP_SECONDS: float = 300
+	TOKEN_SWEEP_BATCH_SIZE: int = 1000
 	
 	# Password recovery
 	PASSWORD_RECOVERY_EXPIRE_MINUTES: int = 30
@@ -39,6 +64,35 @@ class Settings(BaseSettings):
 	# APISIX
 	APISIX_ADMIN_URL: str = os.getenv("APISIX_ADMIN_URL", "http://apisix:9180/apisix/admin")
 	APISIX_ADMIN_KEY: str = os.getenv("APISIX_ADMIN_KEY")
+	# Shared admin API client: keep-alive pool, retries (with jitter) for idempotent calls
+	APISIX_ADMIN_TIMEOUT_SECONDS: float = 10
+	APISIX_ADMIN_RETRIES: int = 2
+	APISIX_ADMIN_BACKOFF_SECONDS: float = 0.1
+	APISIX_ADMIN_MAX_CONNECTIONS: int = 20
+	# Consumer updates: re-read after writing to detect overwrites by other processes
+	# (only needed with several workers/replicas), and how often to re-apply the patch
+	APISIX_CONSUMER_UPDATE_VERIFY: bool = False
+	APISIX_CONSUMER_UPDATE_RETRIES: int = 3
+	# Local consumer cache for logins: "poll" (admin list API), "watch" (etcd) or "off"
+	CONSUMER_CACHE_MODE: str = os.getenv("CONSUMER_CACHE_MODE", "poll")
+	CONSUMER_CACHE_POLL_SECONDS: float = 30
+	CONSUMER_CACHE_RETRY_SECONDS: float = 5
+	CONSUMER_CACHE_PAGE_SIZE: int = 500
+	# Unknown usernames are remembered this long, so failed logins for them skip the admin API
+	CONSUMER_CACHE_NOT_FOUND_SECONDS: float = 10
+	CONSUMER_CACHE_NOT_FOUND_MAX: int = 100000
+	# scripts/gateway_sync.py: admin writes in flight at once within a phase
+	GATEWAY_SYNC_CONCURRENCY: int = 8
+	# Consumers of new users are created from the provisioning outbox in the background
+	PROVISIONING_POLL_SECONDS: float = 2
+	PROVISIONING_BATCH_SIZE: int = 50
+	PROVISIONING_CONCURRENCY: int = 8
+	# A claimed entry is retried after this long if its worker never reports back
+	PROVISIONING_LEASE_SECONDS: float = 60
+	PROVISIONING_BACKOFF_SECONDS: float = 1
+	PROVISIONING_MAX_BACKOFF_SECONDS: float = 600
+	ETCD_URL: str = os.getenv("ETCD_URL", "http://etcd:2379")
+	ETCD_PREFIX: str = "/apisix"
 	
 	# User limits
 	DEFAULT_U_TYPE: str = "basic"
@@ -46,6 +100,53 @@ class Settings(BaseSettings):
 	BASIC_USER_MSG: str = "Basic user limit exceeded."
 	PRO_USER_COUNT: int = 40
 	PRO_USER_MSG: str = "Pro user limit exceeded."
+
+	# In-process caches (per worker; TTL bounds staleness across workers)
+	PROFILE_CACHE_TTL_SECONDS: float = 60
+	PROFILE_CACHE_MAX_ENTRIES: int = 10000
+	# Login path: a disable takes effect within this many seconds on other workers
+	STATUS_CACHE_TTL_SECONDS: float = 10
+	STATUS_CACHE_MAX_ENTRIES: int = 50000
+	# Consumer groups / profiles: reloaded in the background, dropped on every group
+	# write of this worker; the TTL bounds staleness if reloading fails
+	PROFILE_CATALOGUE_REFRESH_SECONDS: float = 300
+	PROFILE_CATALOGUE_TTL_SECONDS: float = 900
+
+	# Bulk export / import
+	USER_EXPORT_BATCH_SIZE: int = 1000
+	USER_IMPORT_BATCH_SIZE: int = 500
+	USER_IMPORT_MAX_ROWS: int = 50000
+	USER_IMPORT_CONCURRENCY: int = 8
+	# Bulk jobs (group migration): users per batch / statement, concurrent consumer updates
+	BULK_JOB_BATCH_SIZE: int = 500
+	BULK_JOB_CONCURRENCY: int = 16
+	BULK_JOB_MAX_IDS: int = 50000
+	BULK_JOB_ERRORS_PAGE_SIZE: int = 100
+	# A running job whose row has not changed for this long (every batch updates it)
+	# is taken to have died with its process and can be resumed elsewhere
+	BULK_JOB_STALE_SECONDS: float = 600
+	# Bulk API key rotation / revocation (users per request) and key audit pages
+	API_KEY_BULK_MAX_USERS: int = 1000
+	API_KEY_LIST_MAX_LIMIT: int = 1000
+	# Last use of API keys seen by the backend is kept in memory and written this often
+	API_KEY_USAGE_FLUSH_SECONDS: float = 60
+	API_KEY_USAGE_MAX_PENDING: int = 100000
+
+	# DB-to-APISIX reconciliation (scripts/reconcile.py, POST /admin/reconcile)
+	RECONCILE_BATCH_SIZE: int = 1000
+	# Records sorted in memory before a run is spilled to a temporary file
+	RECONCILE_RUN_SIZE: int = 20000
+	RECONCILE_CONCURRENCY: int = 8
+	# Users and consumers younger than this may be mid-creation and are left alone
+	RECONCILE_GRACE_SECONDS: float = 300
+	RECONCILE_SAMPLE_SIZE: int = 100
+	# One run at a time across processes; a run still "running" after this long is
+	# taken to have died with its process
+	RECONCILE_STALE_SECONDS: float = 6 * 3600
+	# Consumers without a user on purpose (service accounts); CRUD_ADMIN always is.
+	# Repairing runs delete every other consumer without user, so they leave orphans
+	# alone until this is set (list CRUD_ADMIN alone if there are no service consumers)
+	RECONCILE_IGNORE_CONSUMERS: List[str] = []
 	
 	# API
 	API_V1_STR: str = "/api/v1"
@@ -59,11 +160,26 @@ class Settings(BaseSettings):
 	LOGIN_MAX_ATTEMPTS: int = 3
 	LOGIN_LOCKOUT_MINUTES: int = 15
 	LOGIN_WINDOW_MINUTES: int = 10
+	# Throttle store: "mysql" (shared), "memory" (single node) or "hybrid" (memory synced to MySQL)
+	LOGIN_THROTTLE_BACKEND: str = "mysql"
+	LOGIN_THROTTLE_SHARDS: int = 16
+	LOGIN_THROTTLE_SYNC_SECONDS: float = 5.0
+	# Raw attempt log (login_attempts) is optional and written in background batches
+	LOGIN_ATTEMPT_LOG_ENABLED: bool = False
+	LOGIN_ATTEMPT_LOG_BATCH_SIZE: int = 200
+	LOGIN_ATTEMPT_LOG_FLUSH_SECONDS: float = 2.0
+	LOGIN_ATTEMPT_LOG_MAX_PENDING: int = 10000
 	TRUST_PROXY: bool = True
 	FORWARDED_FOR_HEADER: str = "X-Forwarded-For"
 
 	# Have I Been Pwned API timeout
 	HIBP_TIMEOUT: int = 2
+	# Offline Pwned Passwords index (scripts/pwned_index.py); the remote API is only
+	# queried when no index is configured or it could not be loaded
+	PWNED_INDEX_PATH: Optional[str] = os.getenv("PWNED_INDEX_PATH")
+	PWNED_DELTA_PATH: Optional[str] = os.getenv("PWNED_DELTA_PATH")
+	PWNED_REFRESH_SECONDS: float = 300
+	HIBP_REMOTE_FALLBACK: bool = True
 	
 	# Validation constraints
 	USERNAME_MIN_LENGTH: int = 3
@@ -79,6 +195,7 @@ class Settings(BaseSettings):
 	ACCESS_TOKEN_MAX_LENGTH: int = 2048
 	ACCESS_TOKEN_PATTERN: str = r'^[A-Za-z0-9-_]+\.[A-Za-z0-9-_]+\.[A-Za-z0-9-_]+$'
 
+	API_KEY_BYTES: int = 24
 	API_KEY_LENGTH: int = 32
 	API_KEY_PATTERN: str = r'^[A-Za-z0-9+/=]{32}$'
 
@@ -20,6 +20,23 @@ class TooManyLoginAttemptsException(HTTPException):
 		)
 
 
+class ImportTooLargeException(HTTPException):
+	def __init__(self, max_rows: int):
+		super().__init__(
+			status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+			detail=f"Import is limited to {max_rows} rows per request"
+		)
+
+
+class HashingOverloadedException(HTTPException):
+	def __init__(self, retry_after_seconds: int):
+		super().__init__(
+			status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+			detail="Server busy. Try again later.",
+			headers={"Retry-After": str(retry_after_seconds)}
+		)
+
+
 class PasswordNotSecureException(HTTPException):
 	def __init__(self, count: int):
 		super().__init__(
@@ -87,4 +104,20 @@ class ProfileAlreadyExistsException(HTTPException):
 		super().__init__(
 			status_code=status.HTTP_409_CONFLICT,
 			detail=f"Profile '{profile_type}' already exists"
-		)
\ No newline at end of file
+		)
+
+
+class ReconcileInProgressException(HTTPException):
+	def __init__(self):
+		super().__init__(
+			status_code=status.HTTP_409_CONFLICT,
+			detail="A reconciliation run is already in progress"
+		)
+
+
+class BulkJobInProgressException(HTTPException):
+	def __init__(self, job_id: int):
+		super().__init__(
+			status_code=status.HTTP_409_CONFLICT,
+			detail=f"Bulk job {job_id} is already running"
+		)
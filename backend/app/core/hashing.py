@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+import bcrypt
+
+from app.core.config import settings
+from app.core.exceptions import HashingOverloadedException
+from app.core import background
+from app.utils.metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+# Worker functions: module-level so they can be pickled into the pool processes
+def _hash(password: str, rounds: int) -> str:
+	return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+
+def _verify(password: str, hashed_password: str) -> bool:
+	return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+class PasswordHasher:
+	"""Runs bcrypt off the event loop, in a process pool with a bounded queue.
+
+	At most `max_pending` operations may be queued or running; beyond that new
+	requests are rejected with HashingOverloadedException (429) instead of piling
+	up behind the CPU. With `workers=0` the work runs in the default thread pool.
+	A pool broken by a crashed worker process is replaced and the operation
+	retried once, so one crash does not fail every later login.
+	"""
+
+	def __init__(self, workers: int, max_pending: int, rounds: int):
+		self.workers = workers
+		self.max_pending = max_pending
+		self.rounds = rounds
+		self._executor: Optional[ProcessPoolExecutor] = None
+		self._lock = threading.Lock()
+		self._pending = 0
+		self._peak_pending = 0
+		self._rejected = 0
+		self._restarts = 0
+		self._latency = {"hash": Histogram(), "verify": Histogram()}
+
+	def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+		if self.workers <= 0:
+			return None
+		with self._lock:
+			if self._executor is None:
+				# Started on first use, so importing the app does not fork
+				self._executor = ProcessPoolExecutor(max_workers=self.workers)
+			return self._executor
+
+	def _replace_broken(self, executor: ProcessPoolExecutor) -> None:
+		with self._lock:
+			# Every operation in flight fails with the pool: only the first replaces it
+			if self._executor is not executor:
+				return
+			self._executor = None
+			self._restarts += 1
+		logger.warning("Password hashing pool broken (a worker process died), starting a new one")
+		executor.shutdown(wait=False, cancel_futures=True)
+
+	async def _run(self, kind: str, func: Callable, *args) -> Any:
+		with self._lock:
+			if self._pending >= self.max_pending:
+				self._rejected += 1
+				raise HashingOverloadedException(settings.BCRYPT_RETRY_AFTER_SECONDS)
+			self._pending += 1
+			self._peak_pending = max(self._peak_pending, self._pending)
+		started = time.perf_counter()
+		loop = asyncio.get_running_loop()
+		try:
+			executor = self._get_executor()
+			try:
+				return await loop.run_in_executor(executor, func, *args)
+			except BrokenProcessPool:
+				self._replace_broken(executor)
+				return await loop.run_in_executor(self._get_executor(), func, *args)
+		finally:
+			elapsed_ms = (time.perf_counter() - started) * 1000
+			with self._lock:
+				self._pending -= 1
+				self._latency[kind].observe(elapsed_ms)
+
+	async def hash(self, password: str) -> str:
+		return await self._run("hash", _hash, password, self.rounds)
+
+	async def verify(self, password: str, hashed_password: str) -> bool:
+		return await self._run("verify", _verify, password, hashed_password)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"workers": self.workers,
+				"rounds": self.rounds,
+				"pending": self._pending,
+				"peak_pending": self._peak_pending,
+				"max_pending": self.max_pending,
+				"rejected": self._rejected,
+				"restarts": self._restarts,
+				# Latency includes queueing: it is what a request actually waits
+				"hash": self._latency["hash"].as_dict(),
+				"verify": self._latency["verify"].as_dict(),
+			}
+
+	def shutdown(self) -> None:
+		with self._lock:
+			executor, self._executor = self._executor, None
+		if executor is not None:
+			executor.shutdown(wait=False, cancel_futures=True)
+
+
+_workers = settings.BCRYPT_WORKERS if settings.BCRYPT_WORKERS is not None else (os.cpu_count() or 1)
+password_hasher = PasswordHasher(
+	workers=_workers,
+	max_pending=settings.BCRYPT_MAX_PENDING or max(_workers, 1) * 8,
+	rounds=settings.BCRYPT_ROUNDS,
+)
+
+
+async def _shutdown_hasher() -> None:
+	password_hasher.shutdown()
+
+
+background.on_shutdown(_shutdown_hasher)
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core import background
+
+logger = logging.getLogger(__name__)
+
+# Index file: header, fan-out table, then fixed-size records sorted by hash.
+#   magic (8 bytes) | record count (u64) | fan-out (65537 x u64) | records
+# A record is the 20-byte SHA-1 followed by the breach count (u32, big endian).
+# fan-out[p] is the index of the first record whose hash starts with the 2 bytes p,
+# so a lookup binary-searches ~1/65536th of the file.
+INDEX_MAGIC = b"PWNDIDX1"
+HASH_SIZE = 20
+RECORD = struct.Struct(">20sI")
+FANOUT_SIZE = 65537
+HEADER_SIZE = len(INDEX_MAGIC) + 8 + FANOUT_SIZE * 8
+
+
+def read_range_lines(lines: Iterable[str], prefix: str = "") -> Iterator[Tuple[bytes, int]]:
+	"""Parse "HASH:COUNT" lines (or "SUFFIX:COUNT" for a range of `prefix`)."""
+	for line in lines:
+		line = line.strip()
+		if not line:
+			continue
+		suffix, _, count = line.partition(":")
+		count = int(count or 0)
+		if count > 0:
+			yield bytes.fromhex(prefix + suffix), count
+
+
+class PwnedPasswordIndex:
+	"""Memory-mapped, binary-searched index of breached password SHA-1 hashes.
+
+	Built offline by scripts/pwned_index.py from the Pwned Passwords range dataset.
+	An optional delta file ("HASH:COUNT" lines) holds hashes newer than the index.
+	`refresh()` maps the files again when they have been replaced. A lookup reads
+	a handful of pages of one fan-out bucket, which stay in the page cache.
+	"""
+
+	def __init__(self, path: str, delta_path: Optional[str] = None):
+		self.path = path
+		self.delta_path = delta_path
+		self._lock = threading.Lock()
+		self._index: Optional[mmap.mmap] = None
+		self._records = 0
+		self._fanout: Tuple[int, ...] = ()
+		self._delta: Dict[bytes, int] = {}
+		self._signatures: Dict[str, Optional[Tuple[int, int, int]]] = {}
+		self._lookups = 0
+		self._found = 0
+
+	@property
+	def loaded(self) -> bool:
+		return self._index is not None
+
+	@staticmethod
+	def _signature(path: Optional[str]) -> Optional[Tuple[int, int, int]]:
+		if not path:
+			return None
+		try:
+			st = os.stat(path)
+		except OSError:
+			return None
+		return st.st_ino, st.st_size, st.st_mtime_ns
+
+	@staticmethod
+	def _map(path: str) -> mmap.mmap:
+		with open(path, "rb") as f:
+			return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+	def refresh(self) -> bool:
+		"""Load the files, or load them again if any was replaced. Returns True on change."""
+		signatures = {
+			"index": self._signature(self.path),
+			"delta": self._signature(self.delta_path),
+		}
+		if signatures == self._signatures:
+			return False
+
+		index, records, fanout = None, 0, ()
+		if signatures["index"] is not None:
+			index = self._map(self.path)
+			if index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+				index.close()
+				raise ValueError(f"{self.path} is not a Pwned Passwords index")
+			records = struct.unpack_from(">Q", index, len(INDEX_MAGIC))[0]
+			fanout = struct.unpack_from(f">{FANOUT_SIZE}Q", index, len(INDEX_MAGIC) + 8)
+
+		delta: Dict[bytes, int] = {}
+		if signatures["delta"] is not None:
+			with open(self.delta_path, "r", encoding="ascii") as f:
+				delta = dict(read_range_lines(f))
+
+		# The old maps are not closed here: a lookup may still hold them, and they are
+		# unmapped when the last reference goes away
+		with self._lock:
+			self._index, self._records, self._fanout = index, records, fanout
+			self._delta = delta
+			self._signatures = signatures
+		logger.info(f"Pwned Passwords index: {records} hashes, {len(delta)} in delta")
+		return True
+
+	def lookup(self, sha1: bytes) -> int:
+		"""Breach count of a SHA-1 digest; 0 when it is not in the dataset."""
+		with self._lock:
+			index, fanout, delta = self._index, self._fanout, self._delta
+			self._lookups += 1
+		count = delta.get(sha1)
+		if count is not None:
+			return count
+		if index is None:
+			return 0
+
+		bucket = int.from_bytes(sha1[:2], "big")
+		lo, hi = fanout[bucket], fanout[bucket + 1]
+		while lo < hi:
+			mid = (lo + hi) // 2
+			offset = HEADER_SIZE + mid * RECORD.size
+			candidate = index[offset:offset + HASH_SIZE]
+			if candidate < sha1:
+				lo = mid + 1
+			elif candidate > sha1:
+				hi = mid
+			else:
+				self._found += 1
+				return RECORD.unpack_from(index, offset)[1]
+		return 0
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"loaded": self.loaded,
+			"records": self._records,
+			"delta": len(self._delta),
+			"lookups": self._lookups,
+			"found": self._found,
+		}
+
+
+class PwnedPasswordChecker:
+	"""Breached-password check: the local index when loaded, else the remote range API.
+
+	The remote call is asynchronous and, like before, fails open: a password is
+	accepted when the API cannot be reached within HIBP_TIMEOUT.
+	"""
+
+	def __init__(self, index: Optional[PwnedPasswordIndex], remote_fallback: bool, timeout: float):
+		self.index = index
+		self.remote_fallback = remote_fallback
+		self.timeout = timeout
+		self._client: Optional[httpx.AsyncClient] = None
+		self._remote_calls = 0
+		self._remote_failures = 0
+
+	async def count(self, password: str) -> int:
+		"""How many times the password appears in known breaches (0 if unknown)."""
+		sha1 = hashlib.sha1(password.encode()).digest()
+		if self.index is not None and self.index.loaded:
+			return self.index.lookup(sha1)
+		if self.remote_fallback:
+			return await self._remote_count(sha1.hex().upper())
+		return 0
+
+	async def _remote_count(self, sha1: str) -> int:
+		prefix, suffix = sha1[:5], sha1[5:]
+		if self._client is None:
+			# Padding hides the real size of the range from observers (padded entries count 0)
+			self._client = httpx.AsyncClient(timeout=self.timeout, headers={"Add-Padding": "true"})
+		self._remote_calls += 1
+		try:
+			response = await self._client.get(f"https://api.pwnedpasswords.com/range/{prefix}")
+			response.raise_for_status()
+		except httpx.HTTPError as e:
+			self._remote_failures += 1
+			logger.warning(f"Pwned Passwords API unavailable, password accepted unchecked: {str(e)}")
+			return 0
+		for line in response.text.splitlines():
+			hash_suffix, _, count = line.strip().partition(":")
+			if hash_suffix == suffix:
+				return int(count or 0)
+		return 0
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"index": self.index.stats() if self.index is not None else None,
+			"remote_fallback": self.remote_fallback,
+			"remote_calls": self._remote_calls,
+			"remote_failures": self._remote_failures,
+		}
+
+	async def close(self) -> None:
+		client, self._client = self._client, None
+		if client is not None:
+			await client.aclose()
+
+
+_index: Optional[PwnedPasswordIndex] = None
+if settings.PWNED_INDEX_PATH:
+	_index = PwnedPasswordIndex(settings.PWNED_INDEX_PATH, settings.PWNED_DELTA_PATH)
+
+pwned_passwords = PwnedPasswordChecker(_index, settings.HIBP_REMOTE_FALLBACK, settings.HIBP_TIMEOUT)
+
+if _index is not None:
+	async def _refresh_index() -> None:
+		# Mapping is cheap but reading the delta is file I/O: keep it off the loop
+		await asyncio.to_thread(_index.refresh)
+
+	background.register(background.PeriodicTask(
+		"pwned-index-refresh", settings.PWNED_REFRESH_SECONDS, _refresh_index, run_immediately=True
+	))
+background.on_shutdown(pwned_passwords.close)
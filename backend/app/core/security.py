@@ -1,7 +1,6 @@
 from typing import Tuple
-import bcrypt
-import hashlib
-import requests
+import base64
+import secrets
 import uuid
 import re
 import mimetypes
@@ -10,52 +9,39 @@ from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Request, UploadFile, Request
 from fastapi.security import OAuth2PasswordBearer
 from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.pwned import pwned_passwords
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-HIBP_TIMEOUT = settings.HIBP_TIMEOUT
 MAX_FILE_SIZE_MB = settings.MAX_FILE_SIZE_MB
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-	"""Verify a password against a hash."""
-	return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+	"""Verify a password against a hash (in the hashing pool)."""
+	return await password_hasher.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
-	"""Hash a password."""
-	hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-	return hash
+async def get_password_hash(password: str) -> str:
+	"""Hash a password (in the hashing pool, with BCRYPT_ROUNDS)."""
+	return await password_hasher.hash(password)
 
-def check_pwd_security(password: str, timeout: int = HIBP_TIMEOUT) -> Tuple[bool, int]:
+def generate_api_key() -> str:
+	"""New random API key: base64 of API_KEY_BYTES random bytes (API_KEY_LENGTH characters)."""
+	return base64.b64encode(secrets.token_bytes(settings.API_KEY_BYTES)).decode()
+
+async def check_pwd_security(password: str) -> Tuple[bool, int]:
     """
     Check if a password has been previously exposed.
     
-    This function makes a GET request to the Pwned Passwords API
-    with the first 5 characters of the SHA-1 hash of the password.
-    If the response contains the full hash, it returns False and the count
-    of how many times the password has been seen.
+    The SHA-1 of the password is looked up in the offline Pwned Passwords
+    index when one is configured, otherwise in the Pwned Passwords range API
+    (k-anonymity: only the first 5 characters of the hash are sent).
+    Returns False and the number of times the password has been seen if it
+    is breached, True and 0 otherwise.
     
-    If the request times out, it returns True and 0.
+    If the remote API cannot be reached, it returns True and 0.
     """
-    try:
-        sha1 = hashlib.sha1(password.encode()).hexdigest().upper()
-        prefix, suffix = sha1[:5], sha1[5:]
-        
-        response = requests.get(
-            f"https://api.pwnedpasswords.com/range/{prefix}",
-            timeout=timeout
-        )
-        
-        if response.status_code == 200:
-            for line in response.text.splitlines():
-                hash_suffix, count = line.split(':')
-                if hash_suffix == suffix:
-                    return False, int(count)
-        
-        return True, 0
-        
-    except:
-        # If the request fails for any reason, allow the user to register
-        return True, 0
+    count = await pwned_passwords.count(password)
+    return count == 0, count
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
 	"""Get the current user from the JWT token."""
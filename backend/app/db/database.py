@@ -1,3 +1,4 @@
+import time
 import mysql.connector
 from mysql.connector import Error
 from typing import Generator
@@ -5,6 +6,9 @@ from contextlib import contextmanager
 
 from app.core.config import settings
 from app.core.exceptions import DatabaseException
+from app.db.unit_of_work import UnitOfWork
+from app.db.instrumentation import query_stats
+from app.db.replica import replica_router
 
 
 def get_db_config():
@@ -16,13 +20,23 @@ def get_db_config():
 		"password": settings.DB_PASSWORD,
 		"pool_size": settings.DB_POOL_SIZE,
 		"pool_reset_session": True,
+		# Reads never hold a transaction open; writes start one through UnitOfWork.begin()
+		"autocommit": True,
 	}
 
 
+def _connect():
+	"""Check out a connection, recording how long the pool made us wait."""
+	started = time.perf_counter()
+	conn = mysql.connector.connect(**get_db_config())
+	query_stats.record_checkout((time.perf_counter() - started) * 1000)
+	return conn
+
+
 def get_connection():
 	"""Get database connection as a dependency."""
 	try:
-		conn = mysql.connector.connect(**get_db_config())
+		conn = _connect()
 		yield conn
 	except Error as e:
 		raise DatabaseException(str(e))
@@ -31,12 +45,30 @@ def get_connection():
 			conn.close()
 
 
+def get_unit_of_work() -> Generator[UnitOfWork, None, None]:
+	"""Get the request's unit of work as a dependency.
+
+	Services commit once at the end of each write flow; whatever is still
+	uncommitted when the request ends is rolled back. The connection is checked
+	out on first use, and read-only repository methods may use the replica
+	(also opened lazily) when one is configured.
+	"""
+	uow = UnitOfWork(
+		connect=_connect,
+		replica_connect=replica_router.connect if replica_router.enabled else None
+	)
+	try:
+		yield uow
+	finally:
+		uow.close()
+
+
 @contextmanager
 def get_db():
 	"""Get database connection as a context manager."""
 	conn = None
 	try:
-		conn = mysql.connector.connect(**get_db_config())
+		conn = _connect()
 		yield conn
 	except Error as e:
 		if conn:
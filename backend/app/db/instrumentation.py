@@ -0,0 +1,161 @@
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.utils.metrics import Histogram
+
+slow_query_logger = logging.getLogger("app.db.slow_query")
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\([^)]+\)s|%s")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"\bVALUES\s*(\([^()]*\))(?:\s*,\s*\([^()]*\))*", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(query: str) -> str:
+	"""Normalize a statement so that executions differing only in values share one key."""
+	normalized = _STRING_LITERAL.sub("?", query)
+	normalized = _PLACEHOLDER.sub("?", normalized)
+	normalized = _NUMBER_LITERAL.sub("?", normalized)
+	normalized = _IN_LIST.sub("IN (...)", normalized)
+	normalized = _VALUES_LIST.sub(r"VALUES \1", normalized)
+	return _WHITESPACE.sub(" ", normalized).strip()
+
+
+class _QueryEntry:
+	__slots__ = ("latency", "errors", "rows")
+
+	def __init__(self):
+		self.latency = Histogram()
+		self.errors = 0
+		self.rows = 0
+
+
+class QueryStats:
+	"""Process-wide per-statement latency histograms, row counts and connection checkout wait."""
+
+	def __init__(self, max_fingerprints: int, slow_query_ms: float):
+		self.max_fingerprints = max_fingerprints
+		self.slow_query_ms = slow_query_ms
+		self._lock = threading.Lock()
+		self._queries: Dict[str, _QueryEntry] = {}
+		self._checkout = Histogram()
+
+	def _entry(self, key: str) -> Optional[_QueryEntry]:
+		entry = self._queries.get(key)
+		if entry is None and len(self._queries) < self.max_fingerprints:
+			entry = self._queries[key] = _QueryEntry()
+		return entry
+
+	def record_query(self, key: str, elapsed_ms: float, failed: bool = False, param_count: int = 0) -> None:
+		with self._lock:
+			entry = self._entry(key)
+			if entry is not None:
+				entry.latency.observe(elapsed_ms)
+				if failed:
+					entry.errors += 1
+		if elapsed_ms >= self.slow_query_ms:
+			# Parameters are never logged, only how many were bound
+			slow_query_logger.warning(
+				f"Slow query ({elapsed_ms:.1f} ms{', failed' if failed else ''}): {key} "
+				f"[{param_count} params redacted]"
+			)
+
+	def record_rows(self, key: str, rows: int) -> None:
+		with self._lock:
+			entry = self._queries.get(key)
+			if entry is not None:
+				entry.rows += rows
+
+	def record_checkout(self, elapsed_ms: float) -> None:
+		with self._lock:
+			self._checkout.observe(elapsed_ms)
+
+	def top(self, limit: int = 20, order_by: str = "total_ms") -> Dict[str, Any]:
+		with self._lock:
+			queries = [
+				{"query": key, "errors": entry.errors, "rows": entry.rows, **entry.latency.as_dict()}
+				for key, entry in self._queries.items()
+			]
+			checkout = self._checkout.as_dict()
+		queries.sort(key=lambda q: q.get(order_by) or 0, reverse=True)
+		return {
+			"slow_query_ms": self.slow_query_ms,
+			"tracked_fingerprints": len(queries),
+			"connection_checkout": checkout,
+			"queries": queries[:limit],
+		}
+
+	def reset(self) -> None:
+		with self._lock:
+			self._queries.clear()
+			self._checkout = Histogram()
+
+	def instrument(self, cursor):
+		return InstrumentedCursor(cursor, self) if settings.DB_QUERY_STATS_ENABLED else cursor
+
+
+class InstrumentedCursor:
+	"""Cursor proxy that times statements and counts fetched rows."""
+
+	def __init__(self, cursor, stats: QueryStats):
+		self._cursor = cursor
+		self._stats = stats
+		self._key: Optional[str] = None
+
+	def __getattr__(self, name):
+		return getattr(self._cursor, name)
+
+	def _timed(self, method, query, params, param_count: int):
+		self._key = fingerprint(query)
+		started = time.perf_counter()
+		failed = True
+		try:
+			result = method(query, params) if params is not None else method(query)
+			failed = False
+			return result
+		finally:
+			elapsed_ms = (time.perf_counter() - started) * 1000
+			self._stats.record_query(self._key, elapsed_ms, failed=failed, param_count=param_count)
+
+	def __iter__(self):
+		return iter(self.fetchone, None)
+
+	def execute(self, query, params=None):
+		return self._timed(self._cursor.execute, query, params, len(params) if params else 0)
+
+	def executemany(self, query, seq_params):
+		seq_params = list(seq_params)
+		return self._timed(self._cursor.executemany, query, seq_params, sum(len(p) for p in seq_params))
+
+	def _count(self, rows: int) -> None:
+		if self._key is not None and rows:
+			self._stats.record_rows(self._key, rows)
+
+	def fetchone(self):
+		row = self._cursor.fetchone()
+		self._count(1 if row is not None else 0)
+		return row
+
+	def fetchmany(self, size: int = 1):
+		rows = self._cursor.fetchmany(size)
+		self._count(len(rows))
+		return rows
+
+	def fetchall(self):
+		rows = self._cursor.fetchall()
+		self._count(len(rows))
+		return rows
+
+
+query_stats = QueryStats(
+	max_fingerprints=settings.DB_QUERY_STATS_MAX_FINGERPRINTS,
+	slow_query_ms=settings.DB_SLOW_QUERY_MS,
+)
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def get_replica_db_config():
+	"""Get read replica configuration (same credentials as the primary)."""
+	return {
+		"host": settings.DB_REPLICA_HOST,
+		"port": settings.DB_REPLICA_PORT,
+		"database": settings.DB_NAME,
+		"user": settings.DB_USER,
+		"password": settings.DB_PASSWORD,
+		"pool_name": "replica",
+		"pool_size": settings.DB_POOL_SIZE,
+		"pool_reset_session": True,
+		"autocommit": True,
+		"connection_timeout": settings.DB_REPLICA_CONNECT_TIMEOUT,
+	}
+
+
+class ReplicaRouter:
+	"""Hands out replica connections while the replica is reachable and not lagging.
+
+	A connection error takes the replica out of rotation for DB_REPLICA_RETRY_SECONDS.
+	Replication lag is sampled at most every DB_REPLICA_LAG_CHECK_SECONDS; a replica
+	that is behind by more than DB_REPLICA_MAX_LAG_SECONDS (or not replicating at all)
+	is skipped until the next sample.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._down_until = 0.0
+		self._lag_checked_at = 0.0
+		self._lag_ok = True
+
+	@property
+	def enabled(self) -> bool:
+		return bool(settings.DB_REPLICA_HOST)
+
+	def available(self) -> bool:
+		return self.enabled and time.time() >= self._down_until and self._lag_ok_cached()
+
+	def _lag_ok_cached(self) -> bool:
+		# A stale sample does not block: connect() will refresh it
+		if time.time() - self._lag_checked_at >= settings.DB_REPLICA_LAG_CHECK_SECONDS:
+			return True
+		return self._lag_ok
+
+	def mark_down(self, reason: str) -> None:
+		with self._lock:
+			self._down_until = time.time() + settings.DB_REPLICA_RETRY_SECONDS
+		logger.warning(f"Read replica disabled for {settings.DB_REPLICA_RETRY_SECONDS}s: {reason}")
+
+	def connect(self):
+		"""Return a replica connection, or None if reads should go to the primary."""
+		if not self.available():
+			return None
+		try:
+			conn = mysql.connector.connect(**get_replica_db_config())
+		except Error as e:
+			self.mark_down(str(e))
+			return None
+		if not self._check_lag(conn):
+			conn.close()
+			return None
+		return conn
+
+	def _check_lag(self, conn) -> bool:
+		now = time.time()
+		with self._lock:
+			if now - self._lag_checked_at < settings.DB_REPLICA_LAG_CHECK_SECONDS:
+				return self._lag_ok
+			self._lag_checked_at = now
+		lag_ok = True
+		try:
+			cursor = conn.cursor(dictionary=True)
+			cursor.execute("SHOW REPLICA STATUS")
+			status = cursor.fetchone()
+			cursor.close()
+			if status:
+				lag = status.get("Seconds_Behind_Source")
+				# NULL means the SQL thread is not running: the data may be arbitrarily old
+				lag_ok = lag is not None and lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+				if not lag_ok:
+					logger.warning(f"Read replica lag is {lag}s, routing reads to the primary")
+		except Error as e:
+			# Without REPLICATION CLIENT privilege the lag cannot be sampled; trust the replica
+			logger.debug(f"Could not sample replica lag: {str(e)}")
+		with self._lock:
+			self._lag_ok = lag_ok
+		return lag_ok
+
+
+replica_router = ReplicaRouter()
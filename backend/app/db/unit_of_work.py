@@ -0,0 +1,124 @@
+from typing import Callable, Dict, Optional
+
+
+class UnitOfWork:
+	"""Request-scoped transaction boundary around a single connection.
+
+	Reads run in autocommit mode and never open a transaction. The first write
+	starts one, and it is committed or rolled back once by the owner of the unit
+	of work. Repositories built on the same unit of work share its cursors.
+
+	When a replica is configured, statements of read-only repository methods go to
+	it until the first write; from then on every read stays on the primary so the
+	rest of the request sees its own writes.
+
+	Given `connect` instead of a connection, the primary connection is only opened
+	on first use (and closed with the unit of work), so requests served entirely
+	from caches never check one out of the pool.
+	"""
+
+	def __init__(
+		self,
+		connection=None,
+		replica_connect: Optional[Callable[[], object]] = None,
+		connect: Optional[Callable[[], object]] = None
+	):
+		self._connection = connection
+		self._connect = connect
+		self._cursors: Dict[bool, object] = {}
+		self._in_transaction = False
+		self._wrote = False
+		self._replica_connect = replica_connect
+		self._replica = None
+		self._replica_cursors: Dict[bool, object] = {}
+
+	@property
+	def connection(self):
+		if self._connection is None and self._connect is not None:
+			self._connection = self._connect()
+		return self._connection
+
+	@property
+	def in_transaction(self) -> bool:
+		return self._in_transaction
+
+	def cursor(self, dictionary: bool = False):
+		"""Return the shared (buffered) cursor of the requested kind, creating it on first use."""
+		cursor = self._cursors.get(dictionary)
+		if cursor is None:
+			cursor = self.connection.cursor(buffered=True, dictionary=dictionary)
+			self._cursors[dictionary] = cursor
+		return cursor
+
+	def can_use_replica(self) -> bool:
+		return self._replica_connect is not None and not self._wrote
+
+	def read_cursor(self, dictionary: bool = False) -> tuple:
+		"""Return (cursor, on_replica) for a read-only statement."""
+		if self.can_use_replica():
+			if self._replica is None:
+				self._replica = self._replica_connect()
+				if self._replica is None:
+					# Replica unusable right now: stop asking for the rest of the request
+					self._replica_connect = None
+					return self.cursor(dictionary), False
+			cursor = self._replica_cursors.get(dictionary)
+			if cursor is None:
+				cursor = self._replica.cursor(buffered=True, dictionary=dictionary)
+				self._replica_cursors[dictionary] = cursor
+			return cursor, True
+		return self.cursor(dictionary), False
+
+	def drop_replica(self) -> None:
+		"""Stop using the replica for this unit of work (after a failure on it)."""
+		self._replica_connect = None
+		self._close_replica()
+
+	def begin(self) -> None:
+		"""Open the transaction if this is the first write."""
+		self._wrote = True
+		if not self._in_transaction:
+			self.connection.start_transaction()
+			self._in_transaction = True
+
+	def commit(self) -> None:
+		if self._in_transaction:
+			try:
+				self.connection.commit()
+			finally:
+				self._in_transaction = False
+
+	def rollback(self) -> None:
+		if self._in_transaction:
+			try:
+				self.connection.rollback()
+			finally:
+				self._in_transaction = False
+
+	def _close_replica(self) -> None:
+		for cursor in self._replica_cursors.values():
+			try:
+				cursor.close()
+			except Exception:
+				pass
+		self._replica_cursors.clear()
+		if self._replica is not None:
+			try:
+				self._replica.close()
+			except Exception:
+				pass
+			self._replica = None
+
+	def close(self) -> None:
+		"""Discard uncommitted work and release the cursors (and a lazily opened connection)."""
+		try:
+			self.rollback()
+		finally:
+			for cursor in self._cursors.values():
+				cursor.close()
+			self._cursors.clear()
+			self._close_replica()
+			if self._connect is not None and self._connection is not None:
+				if self._connection.is_connected():
+					self._connection.close()
+				self._connection = None
@@ -1,13 +1,22 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
+
+
+def column_names(cursor) -> Tuple[str, ...]:
+	"""Column names of the cursor's current result set."""
+	return tuple(column[0] for column in cursor.description) if cursor.description else ()
 
 
 def dict_from_row(cursor, row) -> Dict[str, Any]:
 	"""Convert a database row to a dictionary."""
 	if not row:
 		return {}
-	return {cursor.description[i][0]: value for i, value in enumerate(row)}
+	return dict(zip(column_names(cursor), row))
 
 
 def rows_to_dict_list(cursor, rows: List) -> List[Dict[str, Any]]:
-	"""Convert multiple database rows to a list of dictionaries."""
-	return [dict_from_row(cursor, row) for row in rows]
\ No newline at end of file
+	"""Convert multiple database rows to a list of dictionaries.
+
+	Column names are read from the cursor once for the whole result set.
+	"""
+	names = column_names(cursor)
+	return [dict(zip(names, row)) for row in rows]
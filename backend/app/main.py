@@ -4,6 +4,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.router import api_router
 from app.core.config import settings
 from app.db.database import check_db_connection
+from app.core import background
+from app.services import token_sweeper  # noqa: F401 (registers the expired-token sweeper)
 
 from fastapi.openapi.utils import get_openapi
 
@@ -89,12 +91,15 @@ async def startup_event():
 	if not check_db_connection():
 		print("WARNING: Database connection failed on startup")
 
+	background.start_all()
+
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
 	"""Run on application shutdown."""
 	print(f"Shutting down {settings.PROJECT_NAME}")
+	await background.stop_all()
 
 
 if __name__ == "__main__":
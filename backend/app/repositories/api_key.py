@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+
+from app.repositories.base import BaseRepository
+from app.repositories.token import hash_token
+from app.core.exceptions import DatabaseException
+
+API_KEY = 'api_key'
+
+
+def hash_api_key(api_key: str) -> bytes:
+	"""Index key of an API key (HMAC-SHA256 of "api_key:<key>", see hash_token)."""
+	return hash_token(API_KEY, api_key)
+
+
+def api_key_preview(api_key: str) -> str:
+	return api_key[:3] + '...' + api_key[-3:]
+
+
+class ApiKeyRepository(BaseRepository[dict]):
+	"""Repository for the hashed API key index (one active key per user)."""
+
+	@property
+	def table_name(self) -> str:
+		return "user_db.api_keys"
+
+	def issue_many(self, keys: Dict[int, str]) -> None:
+		"""Index new keys ({user_id: key}) and revoke the users' previous ones, in the caller's transaction."""
+		if not keys:
+			return
+		try:
+			self.revoke_many(list(keys))
+			with self._get_cursor(write=True) as cursor:
+				cursor.executemany(
+					f"""
+					INSERT INTO {self.table_name} (key_hash, user_id, key_preview, created_at)
+					VALUES (%s, %s, %s, NOW())
+					""",
+					[(hash_api_key(key), user_id, api_key_preview(key)) for user_id, key in keys.items()]
+				)
+		except Exception as e:
+			raise DatabaseException(f"Error saving API keys: {e}")
+
+	def revoke_many(self, user_ids: List[int]) -> int:
+		"""Revoke the active keys of several users with one statement; returns how many were revoked."""
+		if not user_ids:
+			return 0
+		query = f"""
+			UPDATE {self.table_name} SET revoked_at = NOW()
+			WHERE user_id IN ({', '.join(['%s'] * len(user_ids))}) AND revoked_at IS NULL
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, tuple(user_ids))
+				return cursor.rowcount
+		except Exception as e:
+			raise DatabaseException(f"Error revoking API keys: {e}")
+
+	def lookup(self, api_key: str) -> Optional[Dict[str, Any]]:
+		"""The indexed key (active or not) and its owner, or None if the key is unknown."""
+		query = f"""
+			SELECT k.id, k.user_id, u.username, u.u_type, u.u_status, k.key_preview,
+				k.created_at, k.last_used_at, k.revoked_at
+			FROM {self.table_name} k
+			JOIN user_db.users u ON u.id = k.user_id
+			WHERE k.key_hash = %s
+		"""
+		try:
+			return self.fetch_one(query, (hash_api_key(api_key),))
+		except Exception as e:
+			raise DatabaseException(f"Error looking up API key: {e}")
+
+	def list_keys(
+		self,
+		after_id: int,
+		limit: int,
+		user_id: Optional[int] = None,
+		active: Optional[bool] = None,
+		unused_since: Optional[datetime] = None
+	) -> List[Dict[str, Any]]:
+		"""Keys for audit, keyset-paginated on id.
+
+		`unused_since` keeps keys not used since then (never-used keys included).
+		"""
+		query = f"""
+			SELECT k.id, k.user_id, u.username, k.key_preview, k.created_at, k.last_used_at, k.revoked_at
+			FROM {self.table_name} k
+			JOIN user_db.users u ON u.id = k.user_id
+			WHERE k.id > %s
+		"""
+		params: List[Any] = [after_id]
+		if user_id is not None:
+			query += " AND k.user_id = %s"
+			params.append(user_id)
+		if active is not None:
+			query += " AND k.revoked_at IS NULL" if active else " AND k.revoked_at IS NOT NULL"
+		if unused_since is not None:
+			query += " AND (k.last_used_at IS NULL OR k.last_used_at < %s)"
+			params.append(unused_since)
+		query += " ORDER BY k.id LIMIT %s"
+		params.append(limit)
+		try:
+			return self.fetch_many(query, tuple(params))
+		except Exception as e:
+			raise DatabaseException(f"Error listing API keys: {e}")
+
+	def record_use(self, key_hashes: List[bytes]) -> int:
+		"""Set last_used_at of these active keys to now, with one statement."""
+		if not key_hashes:
+			return 0
+		query = f"""
+			UPDATE {self.table_name} SET last_used_at = NOW()
+			WHERE key_hash IN ({', '.join(['%s'] * len(key_hashes))}) AND revoked_at IS NULL
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, tuple(key_hashes))
+				return cursor.rowcount
+		except Exception as e:
+			raise DatabaseException(f"Error recording API key use: {e}")
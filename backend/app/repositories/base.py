@@ -1,8 +1,12 @@
 from typing import Generic, TypeVar, Type, Optional, List, Dict, Any
 from abc import ABC, abstractmethod
+from functools import wraps
 from mysql.connector import Error
 
 from app.db.utils import dict_from_row, rows_to_dict_list
+from app.db.unit_of_work import UnitOfWork
+from app.db.instrumentation import query_stats
+from app.db.replica import replica_router
 from app.core.exceptions import DatabaseException
 from contextlib import contextmanager
 
@@ -10,83 +14,124 @@ from contextlib import contextmanager
 T = TypeVar('T')
 
 
+def read_only(method):
+	"""Mark a repository method whose statements may be served by the read replica.
+
+	If the replica fails while serving the call, it is dropped for the rest of the
+	request, taken out of rotation, and the call is repeated on the primary.
+	"""
+	@wraps(method)
+	def wrapper(self, *args, **kwargs):
+		if not self.uow.can_use_replica():
+			return method(self, *args, **kwargs)
+		self._read_only = True
+		self._used_replica = False
+		try:
+			return method(self, *args, **kwargs)
+		except DatabaseException as e:
+			if not self._used_replica:
+				raise
+			replica_router.mark_down(str(e.detail))
+			self.uow.drop_replica()
+		finally:
+			self._read_only = False
+		return method(self, *args, **kwargs)
+	return wrapper
+
+
 class BaseRepository(ABC, Generic[T]):
-	"""Base repository with common CRUD operations."""
-	
+	"""Base repository with common CRUD operations.
+
+	Repositories run on a UnitOfWork. Requests pass the one bound to their connection,
+	so every repository in the request shares its cursors and transaction; a bare
+	connection (scripts, background jobs) gets a private unit of work.
+	"""
+
 	def __init__(self, connection):
-		self.connection = connection
-		self.cursor = connection.cursor()
+		self._owns_uow = not isinstance(connection, UnitOfWork)
+		self.uow = UnitOfWork(connection) if self._owns_uow else connection
+		self._read_only = False
+		self._used_replica = False
+
+	@property
+	def connection(self):
+		return self.uow.connection
+
+	@property
+	def cursor(self):
+		return self.uow.cursor()
 
 	@contextmanager
-	def _get_cursor(self):
-		cursor = None
+	def _get_cursor(self, write: bool = False, dictionary: bool = True):
+		"""Yield a shared cursor; `write=True` opens the unit of work's transaction first.
+
+		Inside a @read_only method the cursor may belong to the replica. The cursor is
+		instrumented so each statement is timed under its fingerprint before any
+		driver error is re-raised as DatabaseException.
+		"""
 		try:
-			cursor = self.connection.cursor(dictionary=True)
-			yield cursor
+			if write:
+				self.uow.begin()
+				cursor = self.uow.cursor(dictionary=dictionary)
+			elif self._read_only:
+				cursor, on_replica = self.uow.read_cursor(dictionary=dictionary)
+				self._used_replica = self._used_replica or on_replica
+			else:
+				cursor = self.uow.cursor(dictionary=dictionary)
+			yield query_stats.instrument(cursor)
 		except Error as e:
-			if cursor:
-				cursor.close()
 			raise DatabaseException(str(e))
-		finally:
-			if cursor:
-				cursor.close()
-		
+
 	@property
 	@abstractmethod
 	def table_name(self) -> str:
 		"""Return the table name for this repository."""
 		pass
-	
+
 	def execute_query(self, query: str, params: tuple = None) -> None:
 		"""Execute a query without returning results."""
-		try:
+		with self._get_cursor(write=True, dictionary=False) as cursor:
 			if params:
-				self.cursor.execute(query, params)
+				cursor.execute(query, params)
 			else:
-				self.cursor.execute(query)
-		except Error as e:
-			raise DatabaseException(str(e))
-	
+				cursor.execute(query)
+
 	def fetch_one(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
 		"""Execute a query and return one result."""
-		try:
+		with self._get_cursor(dictionary=False) as cursor:
 			if params:
-				self.cursor.execute(query, params)
+				cursor.execute(query, params)
 			else:
-				self.cursor.execute(query)
-			result = self.cursor.fetchone()
-			return dict_from_row(self.cursor, result) if result else None
-		except Error as e:
-			raise DatabaseException(str(e))
-	
+				cursor.execute(query)
+			result = cursor.fetchone()
+			return dict_from_row(cursor, result) if result else None
+
 	def fetch_many(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
 		"""Execute a query and return multiple results."""
-		try:
+		with self._get_cursor(dictionary=False) as cursor:
 			if params:
-				self.cursor.execute(query, params)
+				cursor.execute(query, params)
 			else:
-				self.cursor.execute(query)
-			results = self.cursor.fetchall()
-			return rows_to_dict_list(self.cursor, results)
-		except Error as e:
-			raise DatabaseException(str(e))
-	
+				cursor.execute(query)
+			results = cursor.fetchall()
+			return rows_to_dict_list(cursor, results)
+
 	def commit(self) -> None:
-		"""Commit the current transaction."""
+		"""Commit the unit of work's transaction, if a write opened one."""
 		try:
-			self.connection.commit()
+			self.uow.commit()
 		except Error as e:
 			self.rollback()
 			raise DatabaseException(str(e))
-	
+
 	def rollback(self) -> None:
-		"""Rollback the current transaction."""
+		"""Rollback the unit of work's transaction."""
 		try:
-			self.connection.rollback()
+			self.uow.rollback()
 		except Error as e:
 			raise DatabaseException(str(e))
-	
+
 	def close(self) -> None:
-		"""Close cursor."""
-		if self.cursor:
-			self.cursor.close()
\ No newline at end of file
+		"""Release cursors; a shared unit of work is closed by its owner instead."""
+		if self._owns_uow:
+			self.uow.close()
@@ -0,0 +1,119 @@
+from typing import Optional, List, Dict, Any, Tuple
+
+import orjson
+
+from app.repositories.base import BaseRepository
+from app.core.exceptions import DatabaseException
+
+GROUP_MIGRATION = 'group_migration'
+
+
+class BulkJobRepository(BaseRepository[dict]):
+	"""Repository for resumable bulk jobs and the per-user errors they report."""
+
+	@property
+	def table_name(self) -> str:
+		return "user_db.bulk_jobs"
+
+	def create(self, kind: str, params: Dict[str, Any], dry_run: bool) -> int:
+		query = f"""
+			INSERT INTO {self.table_name} (kind, params, dry_run, status, created_at)
+			VALUES (%s, %s, %s, 'running', NOW())
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (kind, orjson.dumps(params).decode(), dry_run))
+				return cursor.lastrowid
+		except Exception as e:
+			raise DatabaseException(f"Error creating bulk job: {e}")
+
+	def get(self, job_id: int, stale_seconds: float) -> Optional[Dict[str, Any]]:
+		"""A job; `active` tells whether it is running and has made progress within `stale_seconds`."""
+		query = f"""
+			SELECT id, kind, params, dry_run, status, cursor_id, processed, succeeded, failed,
+				error, created_at, updated_at, finished_at,
+				status = 'running' AND updated_at >= NOW() - INTERVAL %s SECOND AS active
+			FROM {self.table_name} WHERE id = %s
+		"""
+		try:
+			job = self.fetch_one(query, (int(stale_seconds), job_id))
+		except Exception as e:
+			raise DatabaseException(f"Error fetching bulk job: {e}")
+		if job:
+			job['params'] = orjson.loads(job['params'])
+			job['dry_run'] = bool(job['dry_run'])
+			job['active'] = bool(job['active'])
+		return job
+
+	def claim(self, job_id: int, stale_seconds: float) -> bool:
+		"""Mark a job running again for the caller; False if it is completed or still being run.
+
+		A job counts as still being run while it is 'running' and its row changed
+		within `stale_seconds` (every batch updates it). The check and the update
+		are one statement, so of two processes resuming a job only one gets it.
+		"""
+		query = f"""
+			UPDATE {self.table_name}
+			SET status = 'running', error = NULL, finished_at = NULL, updated_at = NOW()
+			WHERE id = %s AND status <> 'completed'
+			AND (status <> 'running' OR updated_at < NOW() - INTERVAL %s SECOND)
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (job_id, int(stale_seconds)))
+				return cursor.rowcount > 0
+		except Exception as e:
+			raise DatabaseException(f"Error claiming bulk job: {e}")
+
+	def get_errors(self, job_id: int, limit: int, after_id: int = 0) -> List[Dict[str, Any]]:
+		"""Per-user errors of a job, in the order they were recorded (keyset on id)."""
+		query = """
+			SELECT id, user_id, username, error, created_at
+			FROM user_db.bulk_job_errors
+			WHERE job_id = %s AND id > %s
+			ORDER BY id LIMIT %s
+		"""
+		try:
+			return self.fetch_many(query, (job_id, after_id, limit))
+		except Exception as e:
+			raise DatabaseException(f"Error fetching bulk job errors: {e}")
+
+	def record_batch(
+		self,
+		job_id: int,
+		cursor_id: int,
+		processed: int,
+		succeeded: int,
+		errors: List[Tuple[int, str, str]]
+	) -> None:
+		"""Store a batch's errors (user_id, username, error) and move the job's cursor past it."""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				if errors:
+					cursor.executemany(
+						"INSERT INTO user_db.bulk_job_errors (job_id, user_id, username, error) VALUES (%s, %s, %s, %s)",
+						[(job_id, user_id, username, error[:255]) for user_id, username, error in errors]
+					)
+				cursor.execute(
+					f"""
+					UPDATE {self.table_name}
+					SET cursor_id = %s, processed = processed + %s, succeeded = succeeded + %s, failed = failed + %s
+					WHERE id = %s
+					""",
+					(cursor_id, processed, succeeded, len(errors), job_id)
+				)
+		except Exception as e:
+			raise DatabaseException(f"Error recording bulk job progress: {e}")
+
+	def set_status(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+		"""Set the job finished ('completed' / 'failed')."""
+		query = f"""
+			UPDATE {self.table_name}
+			SET status = %s, error = %s, finished_at = IF(%s = 'running', NULL, NOW())
+			WHERE id = %s
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (status, error[:255] if error else None, status, job_id))
+		except Exception as e:
+			raise DatabaseException(f"Error updating bulk job: {e}")
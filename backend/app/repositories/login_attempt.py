@@ -1,47 +1,61 @@
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime
+from typing import Optional, List, Tuple, Dict, Any
 
 from app.repositories.base import BaseRepository
 from app.core.exceptions import DatabaseException
 
 
 class LoginAttemptRepository(BaseRepository[dict]):
-    """Repository to track login attempts and locks per (username, ip)."""
+    """Repository to track failed-login counters, locks and the optional attempt log per (username, ip)."""
 
     @property
     def table_name(self) -> str:
-        # Not used directly (we operate on two tables), but required by BaseRepository
-        return "user_db.login_attempts"
+        return "user_db.login_counters"
 
-    # Attempts
-    def record_attempt(self, username: str, ip: str, success: bool) -> None:
-        query = (
-            f"INSERT INTO {self.table_name} (username, ip, attempted_at, success) "
-            f"VALUES (%s, %s, NOW(), %s)"
-        )
-        try:
-            with self._get_cursor() as cursor:
-                cursor.execute(query, (username, ip, 1 if success else 0))
-                self.connection.commit()
-        except Exception as e:
-            self.connection.rollback()
-            raise DatabaseException(f"Error recording login attempt: {e}")
+    # Counters
+    def register_failure(
+        self,
+        username: str,
+        ip: str,
+        window_minutes: int,
+        max_attempts: int,
+        lockout_minutes: int,
+        increment: int = 1,
+    ) -> int:
+        """Add `increment` failures to the current fixed window and lock if the threshold is reached.
 
-    def get_failed_count(self, username: str, ip: str, since: datetime) -> int:
+        A single upsert resets an expired window, increments the counter and sets
+        `locked_until` once the count reaches `max_attempts`. The resulting count is
+        handed back through LAST_INSERT_ID(expr), so no follow-up SELECT is needed.
+        """
+        # ON DUPLICATE KEY UPDATE assignments run left to right and see the new
+        # value of `failures`, so window_start/locked_until are based on the updated count.
         query = (
-            f"SELECT COUNT(*) AS cnt FROM {self.table_name} "
-            f"WHERE username=%s AND ip=%s AND success=0 AND attempted_at >= %s"
+            f"INSERT INTO {self.table_name} (username, ip, window_start, failures, locked_until) "
+            f"VALUES (%s, %s, NOW(), LAST_INSERT_ID(%s), "
+            f"IF(%s >= %s, NOW() + INTERVAL %s MINUTE, NULL)) "
+            f"ON DUPLICATE KEY UPDATE "
+            f"failures = LAST_INSERT_ID(IF(window_start > NOW() - INTERVAL %s MINUTE, failures + %s, %s)), "
+            f"window_start = IF(failures = %s, NOW(), window_start), "
+            f"locked_until = IF(failures >= %s, NOW() + INTERVAL %s MINUTE, locked_until)"
+        )
+        params = (
+            username, ip, increment,
+            increment, max_attempts, lockout_minutes,
+            window_minutes, increment, increment,
+            increment,
+            max_attempts, lockout_minutes,
         )
         try:
-            result = self.fetch_one(query, (username, ip, since))
-            return int(result.get("cnt", 0)) if result else 0
+            with self._get_cursor(write=True) as cursor:
+                cursor.execute(query, params)
+                return int(cursor.lastrowid or 0)
         except Exception as e:
-            raise DatabaseException(f"Error counting failed login attempts: {e}")
+            raise DatabaseException(f"Error registering failed login: {e}")
 
-    # Locks
     def get_lock_until(self, username: str, ip: str) -> Optional[datetime]:
         query = (
-            f"SELECT locked_until FROM user_db.login_locks "
+            f"SELECT locked_until FROM {self.table_name} "
             f"WHERE username=%s AND ip=%s AND locked_until > NOW()"
         )
         try:
@@ -50,27 +64,35 @@ class LoginAttemptRepository(BaseRepository[dict]):
         except Exception as e:
             raise DatabaseException(f"Error fetching login lock: {e}")
 
-    def set_lock_until(self, username: str, ip: str, until: datetime) -> None:
-        # Upsert by (username, ip)
-        query = (
-            f"INSERT INTO user_db.login_locks (username, ip, locked_until) "
-            f"VALUES (%s, %s, %s) "
-            f"ON DUPLICATE KEY UPDATE locked_until=VALUES(locked_until)"
-        )
+    def get_active_locks(self) -> List[Dict[str, Any]]:
+        """Return every (username, ip) currently locked, for nodes syncing a local throttle."""
+        query = f"SELECT username, ip, locked_until FROM {self.table_name} WHERE locked_until > NOW()"
         try:
-            with self._get_cursor() as cursor:
-                cursor.execute(query, (username, ip, until))
-                self.connection.commit()
+            return self.fetch_many(query)
         except Exception as e:
-            self.connection.rollback()
-            raise DatabaseException(f"Error setting login lock: {e}")
+            raise DatabaseException(f"Error fetching active login locks: {e}")
 
-    def clear_lock(self, username: str, ip: str) -> None:
-        query = f"DELETE FROM user_db.login_locks WHERE username=%s AND ip=%s"
+    def reset(self, username: str, ip: str) -> None:
+        """Drop the counter and any lock after a successful login."""
+        query = f"DELETE FROM {self.table_name} WHERE username=%s AND ip=%s"
         try:
-            with self._get_cursor() as cursor:
+            with self._get_cursor(write=True) as cursor:
                 cursor.execute(query, (username, ip))
-                self.connection.commit()
         except Exception as e:
-            self.connection.rollback()
-            raise DatabaseException(f"Error clearing login lock: {e}")
+            raise DatabaseException(f"Error clearing login counter: {e}")
+
+    # Attempt log
+    def record_attempts(self, attempts: List[Tuple[str, str, datetime, bool]]) -> None:
+        """Append a batch of (username, ip, attempted_at, success) rows to the attempt log."""
+        if not attempts:
+            return
+        query = (
+            f"INSERT INTO user_db.login_attempts (username, ip, attempted_at, success) "
+            f"VALUES (%s, %s, %s, %s)"
+        )
+        rows = [(username, ip, attempted_at, 1 if success else 0) for username, ip, attempted_at, success in attempts]
+        try:
+            with self._get_cursor(write=True) as cursor:
+                cursor.executemany(query, rows)
+        except Exception as e:
+            raise DatabaseException(f"Error recording login attempts: {e}")
@@ -2,6 +2,7 @@ from typing import Optional, List, Dict, Any
 from app.repositories.base import BaseRepository
 from app.schemas.profile import Profile
 from app.services.consumer_group import ConsumerGroupService
+from app.services.profile_catalogue import profile_from_group
 
 
 class ProfileRepository(BaseRepository[Profile]):
@@ -18,44 +19,30 @@ class ProfileRepository(BaseRepository[Profile]):
 	def table_name(self) -> str:
 		return "consumer_groups"  # Conceptual table name
 	
-	def get_by_id(self, profile_id: str) -> Optional[Dict[str, Any]]:
+	async def get_by_id(self, profile_id: str) -> Optional[Dict[str, Any]]:
 		"""Get a profile by ID (u_type)."""
 		u_type = profile_id
 		if not u_type:
 			return None
-		group = self.consumer_group_service.get_consumer_group(u_type)
+		group = await self.consumer_group_service.get_consumer_group(u_type)
 		
 		if not group:
 			return None
 		
-		# Check if it has limit-count plugin (is a profile group)
-		plugins = group.get("plugins", {})
-		if "limit-count" not in plugins:
-			return None
-		
-		limit_config = plugins["limit-count"]
-		return {
-			"id": u_type,
-			"u_type": u_type,
-			"count": limit_config.get("count", 0),
-			"time_window": limit_config.get("time_window", 60),
-			"rejected_code": limit_config.get("rejected_code", 429),
-			"rejected_msg": limit_config.get("rejected_msg", "Rate limit exceeded"),
-			"policy": limit_config.get("policy", "local"),
-			"show_limit_quota_header": limit_config.get("show_limit_quota_header", True)
-		}
+		# Only groups with the limit-count plugin are profiles
+		return profile_from_group(u_type, group)
 	
-	def get_by_u_type(self, u_type: str) -> Optional[Dict[str, Any]]:
+	async def get_by_u_type(self, u_type: str) -> Optional[Dict[str, Any]]:
 		"""Get a profile by user type."""
-		return self.get_by_id(u_type)
+		return await self.get_by_id(u_type)
 	
-	def get_all(self) -> List[Dict[str, Any]]:
+	async def get_all(self) -> List[Dict[str, Any]]:
 		"""Get all profiles."""
-		return self.consumer_group_service.get_profile_groups()
+		return await self.consumer_group_service.get_profile_groups()
 	
-	def create(self, profile_data: Dict[str, Any]) -> str:
+	async def create(self, profile_data: Dict[str, Any]) -> str:
 		"""Create a new profile and return the ID (u_type)."""
-		success = self.consumer_group_service.create_profile_group(
+		success = await self.consumer_group_service.create_profile_group(
 			u_type=profile_data["u_type"],
 			count=profile_data["count"],
 			time_window=profile_data["time_window"],
@@ -70,7 +57,7 @@ class ProfileRepository(BaseRepository[Profile]):
 		else:
 			raise Exception("Failed to create consumer group")
 	
-	def update(self, profile_id: str, profile_data: Dict[str, Any]) -> bool:
+	async def update(self, profile_id: str, profile_data: Dict[str, Any]) -> bool:
 		"""Update a profile."""
 		if not profile_data:
 			return False
@@ -78,7 +65,7 @@ class ProfileRepository(BaseRepository[Profile]):
 		u_type = profile_id
 		
 		# Get current config to merge with updates
-		current = self.get_by_id(profile_id)
+		current = await self.get_by_id(profile_id)
 		if not current:
 			return False
 		
@@ -86,7 +73,7 @@ class ProfileRepository(BaseRepository[Profile]):
 		merged_data = current.copy()
 		merged_data.update({k: v for k, v in profile_data.items() if v is not None})
 		
-		return self.consumer_group_service.update_profile_group(
+		return await self.consumer_group_service.update_profile_group(
 			u_type=u_type,
 			count=merged_data["count"],
 			time_window=merged_data["time_window"],
@@ -96,10 +83,10 @@ class ProfileRepository(BaseRepository[Profile]):
 			show_limit_quota_header=merged_data["show_limit_quota_header"]
 		)
 	
-	def delete(self, profile_id: str) -> bool:
+	async def delete(self, profile_id: str) -> bool:
 		"""Delete a profile."""
 		u_type = profile_id
-		return self.consumer_group_service.delete_consumer_group(u_type)
+		return await self.consumer_group_service.delete_consumer_group(u_type)
 	
 	# Override base methods to avoid database operations
 	def commit(self) -> None:
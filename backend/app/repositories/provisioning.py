@@ -0,0 +1,133 @@
+from typing import Optional, List, Dict, Any, Tuple
+
+from app.repositories.base import BaseRepository
+from app.core.exceptions import DatabaseException
+
+PROVISIONING = 'provisioning'
+READY = 'ready'
+
+
+class ProvisioningOutboxRepository(BaseRepository[dict]):
+	"""Repository for pending APISIX consumer creations (the provisioning outbox)."""
+
+	@property
+	def table_name(self) -> str:
+		return "user_db.provisioning_outbox"
+
+	def enqueue(self, user_id: int, username: str, u_type: str, secret_hash: str) -> None:
+		"""Add the consumer creation of a new user, in the caller's transaction."""
+		query = f"""
+			INSERT INTO {self.table_name} (user_id, username, u_type, secret_hash, next_attempt_at, created_at)
+			VALUES (%s, %s, %s, %s, NOW(), NOW())
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (user_id, username, u_type, secret_hash))
+		except Exception as e:
+			raise DatabaseException(f"Error queueing consumer provisioning: {e}")
+
+	def enqueue_many(self, entries: List[Tuple[int, str, str, str]]) -> None:
+		"""Add the consumer creations of several new users (user_id, username, u_type, secret_hash) in one batch."""
+		if not entries:
+			return
+		query = f"""
+			INSERT INTO {self.table_name} (user_id, username, u_type, secret_hash, next_attempt_at, created_at)
+			VALUES (%s, %s, %s, %s, NOW(), NOW())
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.executemany(query, entries)
+		except Exception as e:
+			raise DatabaseException(f"Error queueing consumer provisioning: {e}")
+
+	def claim(self, limit: int, lease_seconds: float, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+		"""Lease up to `limit` due entries (or the entry of `user_id`, due or not) to this worker.
+
+		Rows locked by another worker's claim are skipped (SKIP LOCKED), and the lease
+		(next_attempt_at moved `lease_seconds` ahead) keeps them from being claimed
+		again once this transaction commits. The caller commits.
+		"""
+		if user_id is None:
+			where, params = "next_attempt_at <= NOW()", ()
+		else:
+			where, params = "user_id = %s", (user_id,)
+		select = f"""
+			SELECT id, user_id, username, u_type, secret_hash, attempts
+			FROM {self.table_name}
+			WHERE {where}
+			ORDER BY next_attempt_at
+			LIMIT %s
+			FOR UPDATE SKIP LOCKED
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(select, params + (limit,))
+				rows = [dict(row) for row in cursor.fetchall()]
+				if rows:
+					cursor.execute(
+						f"""
+						UPDATE {self.table_name}
+						SET attempts = attempts + 1, next_attempt_at = NOW() + INTERVAL %s SECOND
+						WHERE id IN ({', '.join(['%s'] * len(rows))})
+						""",
+						(int(lease_seconds),) + tuple(row['id'] for row in rows)
+					)
+				for row in rows:
+					row['attempts'] += 1
+				return rows
+		except Exception as e:
+			raise DatabaseException(f"Error claiming consumer provisioning: {e}")
+
+	def complete(self, outbox_id: int, user_id: int) -> bool:
+		"""Mark the user ready and drop the entry; False if the entry was already gone.
+
+		The entry is deleted with its user (ON DELETE CASCADE), so False also means
+		the user may have been deleted while its consumer was being created.
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(f"DELETE FROM {self.table_name} WHERE id = %s", (outbox_id,))
+				if cursor.rowcount == 0:
+					return False
+				cursor.execute(
+					"UPDATE user_db.users SET provision_state = %s WHERE id = %s",
+					(READY, user_id)
+				)
+				return True
+		except Exception as e:
+			raise DatabaseException(f"Error completing consumer provisioning: {e}")
+
+	def set_u_type_many(self, user_ids: List[int], u_type: str) -> None:
+		"""Change the group the pending consumers of these users will be created in."""
+		if not user_ids:
+			return
+		query = f"UPDATE {self.table_name} SET u_type = %s WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})"
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (u_type,) + tuple(user_ids))
+		except Exception as e:
+			raise DatabaseException(f"Error updating consumer provisioning: {e}")
+
+	def retry_later(self, outbox_id: int, delay_seconds: float, error: str) -> None:
+		"""Record a failed attempt and schedule the next one."""
+		query = f"""
+			UPDATE {self.table_name}
+			SET next_attempt_at = NOW() + INTERVAL %s SECOND, last_error = %s
+			WHERE id = %s
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (int(delay_seconds), error[:255], outbox_id))
+		except Exception as e:
+			raise DatabaseException(f"Error rescheduling consumer provisioning: {e}")
+
+	def backlog(self) -> Dict[str, Any]:
+		"""Pending entries, the oldest one and the most retried one."""
+		query = f"""
+			SELECT COUNT(*) AS pending, MIN(created_at) AS oldest, MAX(attempts) AS max_attempts
+			FROM {self.table_name}
+		"""
+		try:
+			return self.fetch_one(query) or {}
+		except Exception as e:
+			raise DatabaseException(f"Error reading provisioning backlog: {e}")
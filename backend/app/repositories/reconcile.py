@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+import orjson
+from mysql.connector import Error, errorcode
+
+from app.repositories.base import BaseRepository
+from app.core.exceptions import DatabaseException
+
+FULL = 'full'
+INCREMENTAL = 'incremental'
+
+
+class ReconcileRunRepository(BaseRepository[dict]):
+	"""Repository for the history of DB-to-APISIX reconciliation runs."""
+
+	@property
+	def table_name(self) -> str:
+		return "user_db.reconcile_runs"
+
+	def start(self, mode: str, dry_run: bool, since: Optional[datetime], stale_seconds: float) -> Optional[int]:
+		"""Record a new running run and return its id; None while another run is running.
+
+		Runs of any process count; one still 'running' after `stale_seconds` is taken
+		to have died with its process. The check and the insert are one statement:
+		of two processes starting at once, the second either waits for the first
+		and then sees its run, or is picked as the deadlock victim. The caller
+		commits (or rolls back on None).
+		"""
+		query = f"""
+			INSERT INTO {self.table_name} (mode, dry_run, since, status, started_at)
+			SELECT %s, %s, %s, 'running', NOW() FROM DUAL
+			WHERE NOT EXISTS (
+				SELECT 1 FROM {self.table_name}
+				WHERE status = 'running' AND started_at > NOW() - INTERVAL %s SECOND
+			)
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				try:
+					cursor.execute(query, (mode, dry_run, since, int(stale_seconds)))
+				except Error as e:
+					if e.errno == errorcode.ER_LOCK_DEADLOCK:
+						return None
+					raise
+				return cursor.lastrowid if cursor.rowcount else None
+		except Exception as e:
+			raise DatabaseException(f"Error starting reconciliation run: {e}")
+
+	def finish(self, run_id: int, status: str, summary: Dict[str, Any]) -> None:
+		"""Store the outcome of a run."""
+		query = f"""
+			UPDATE {self.table_name}
+			SET status = %s, summary = %s, finished_at = NOW()
+			WHERE id = %s
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (status, orjson.dumps(summary).decode(), run_id))
+		except Exception as e:
+			raise DatabaseException(f"Error finishing reconciliation run: {e}")
+
+	def get(self, run_id: int) -> Optional[Dict[str, Any]]:
+		query = f"""
+			SELECT id, mode, dry_run, since, status, started_at, finished_at, summary
+			FROM {self.table_name} WHERE id = %s
+		"""
+		try:
+			run = self.fetch_one(query, (run_id,))
+		except Exception as e:
+			raise DatabaseException(f"Error fetching reconciliation run: {e}")
+		if run:
+			run['dry_run'] = bool(run['dry_run'])
+			if run['summary']:
+				run['summary'] = orjson.loads(run['summary'])
+		return run
+
+	def last_watermark(self) -> Optional[datetime]:
+		"""Start time of the last completed run that repaired drift (the incremental watermark).
+
+		Dry runs change nothing, so they do not move it.
+		"""
+		query = f"""
+			SELECT started_at FROM {self.table_name}
+			WHERE status = 'completed' AND dry_run = 0
+			ORDER BY id DESC LIMIT 1
+		"""
+		try:
+			row = self.fetch_one(query)
+		except Exception as e:
+			raise DatabaseException(f"Error fetching reconciliation watermark: {e}")
+		return row['started_at'] if row else None
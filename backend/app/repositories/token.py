@@ -0,0 +1,107 @@
+import hashlib
+import hmac
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple
+
+from app.repositories.base import BaseRepository
+from app.core.config import settings
+from app.core.exceptions import DatabaseException
+
+VERIFICATION = 'verification'
+RECOVERY = 'recovery'
+
+
+def hash_token(purpose: str, token: str, user_id: Optional[int] = None) -> bytes:
+	"""HMAC-SHA256 key of a token under TOKEN_HASH_KEY; short codes are scoped to their user to stay unique.
+
+	Keyed, so that six-digit codes cannot be recovered from a leaked table by
+	trying all 10^6 of them. Must stay in sync with the SQL form used in
+	UserRepository.verify_email_code (see hmac_pads).
+	"""
+	material = f"{purpose}:{user_id}:{token}" if user_id is not None else f"{purpose}:{token}"
+	return hmac.new(settings.TOKEN_HASH_KEY.encode(), material.encode(), hashlib.sha256).digest()
+
+
+def hmac_pads() -> Tuple[bytes, bytes]:
+	"""Inner and outer padded keys of hash_token's HMAC, to compute it in SQL (RFC 2104).
+
+	HMAC(k, m) = SHA256(outer || SHA256(inner || m)), which MySQL can evaluate as
+	UNHEX(SHA2(CONCAT(outer, UNHEX(SHA2(CONCAT(inner, m), 256))), 256)).
+	"""
+	key = settings.TOKEN_HASH_KEY.encode()
+	if len(key) > 64:
+		key = hashlib.sha256(key).digest()
+	key = key.ljust(64, b"\0")
+	return bytes(b ^ 0x36 for b in key), bytes(b ^ 0x5C for b in key)
+
+
+class TokenRepository(BaseRepository[dict]):
+	"""Repository for hashed one-time tokens (one active token per user and purpose)."""
+
+	@property
+	def table_name(self) -> str:
+		return "user_db.user_tokens"
+
+	def issue(self, user_id: int, purpose: str, token_hash: bytes, expires_at: datetime) -> None:
+		"""Store a new token for the user, replacing the previous one of the same purpose."""
+		query = f"""
+			INSERT INTO {self.table_name} (token_hash, purpose, user_id, expires_at, attempts, created_at)
+			VALUES (%s, %s, %s, %s, 0, NOW())
+			ON DUPLICATE KEY UPDATE
+				token_hash = VALUES(token_hash),
+				expires_at = VALUES(expires_at),
+				attempts = 0,
+				created_at = NOW()
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (token_hash, purpose, user_id, expires_at))
+		except Exception as e:
+			raise DatabaseException(f"Error saving {purpose} token: {e}")
+
+	def redeem(self, token_hash: bytes, purpose: str) -> Optional[Dict[str, Any]]:
+		"""Consume a live token of a non-disabled user and return that user (id, username, email).
+
+		The token row is locked (SELECT ... FOR UPDATE) and deleted in the caller's
+		transaction, so a concurrent redemption of the same token waits and then
+		finds nothing; rolling back restores the token.
+		"""
+		query = f"""
+			SELECT u.id, u.username, u.email
+			FROM {self.table_name} t
+			JOIN user_db.users u ON u.id = t.user_id
+			WHERE t.token_hash = %s AND t.purpose = %s AND t.expires_at > NOW()
+			AND u.u_status != 'disabled'
+			FOR UPDATE
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (token_hash, purpose))
+				user = cursor.fetchone()
+				if not user:
+					return None
+				cursor.execute(f"DELETE FROM {self.table_name} WHERE token_hash = %s", (token_hash,))
+				return dict(user)
+		except Exception as e:
+			raise DatabaseException(f"Error redeeming {purpose} token: {e}")
+
+	def get_active(self, user_id: int, purpose: str) -> Optional[Dict[str, Any]]:
+		"""Return the user's live token row (expires_at, attempts, created_at), if any."""
+		query = f"""
+			SELECT expires_at, attempts, created_at FROM {self.table_name}
+			WHERE user_id = %s AND purpose = %s AND expires_at > NOW()
+		"""
+		try:
+			return self.fetch_one(query, (user_id, purpose))
+		except Exception as e:
+			raise DatabaseException(f"Error getting {purpose} token: {e}")
+
+	def delete_expired(self, limit: int) -> int:
+		"""Delete up to `limit` expired tokens; returns how many were removed."""
+		query = f"DELETE FROM {self.table_name} WHERE expires_at <= NOW() LIMIT %s"
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (limit,))
+				return cursor.rowcount
+		except Exception as e:
+			raise DatabaseException(f"Error deleting expired tokens: {e}")
@@ -1,10 +1,14 @@
-from typing import Optional, List, Dict, Any, Generator
-from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any, Generator, Iterator, Set, Tuple
+from datetime import datetime
 import logging
 
-from app.repositories.base import BaseRepository
+from mysql.connector import Error
+
+from app.repositories.base import BaseRepository, read_only
+from app.db.instrumentation import query_stats
+from app.db.utils import column_names
+from app.repositories.token import hmac_pads
 from app.schemas.user import User
-from app.core.config import settings
 from app.core.exceptions import DatabaseException
 
 logger = logging.getLogger(__name__)
@@ -12,6 +16,9 @@ logger = logging.getLogger(__name__)
 
 class UserRepository(BaseRepository[User]):
 	"""Repository for user operations."""
+
+	# Columns backing the User schema (the API key itself is never stored)
+	LIST_COLUMNS = ('id', 'username', 'email', 'u_status', 'u_type', 'isFederated', 'email_verified', 'provision_state')
 	
 	@property
 	def table_name(self) -> str:
@@ -58,9 +65,8 @@ class UserRepository(BaseRepository[User]):
 			VALUES ({placeholders})
 		"""
 		
-		with self._get_cursor() as cursor:
+		with self._get_cursor(write=True) as cursor:
 			cursor.execute(query, tuple(values))
-			self.connection.commit()
 			return cursor.lastrowid
 	
 	def update(self, user_id: int, user_data: Dict[str, Any]) -> bool:
@@ -84,17 +90,18 @@ class UserRepository(BaseRepository[User]):
 			SET {', '.join(fields)} 
 			WHERE id = %s
 		"""
-		with self._get_cursor() as cursor:
+		with self._get_cursor(write=True) as cursor:
 			cursor.execute(query, tuple(values))
 			return cursor.rowcount > 0
 	
 	def delete(self, user_id: int) -> bool:
 		"""Delete a user."""
 		query = f"DELETE FROM {self.table_name} WHERE id = %s"
-		with self._get_cursor() as cursor:
+		with self._get_cursor(write=True) as cursor:
 			cursor.execute(query, (user_id,))
 			return cursor.rowcount > 0
 	
+	@read_only
 	def list_users(
 		self, 
 		u_type: Optional[str] = None,
@@ -103,10 +110,30 @@ class UserRepository(BaseRepository[User]):
 		is_federated: Optional[bool] = None,
 		email_verified: Optional[bool] = None
 	) -> List[Dict[str, Any]]:
-		"""List users with optional filters."""
-		query = f"SELECT * FROM {self.table_name} WHERE 1=1"
+		"""List users with optional filters.
+
+		Only the columns of the User schema are selected, and boolean flags are
+		converted here, so rows can be serialized without re-validation.
+		"""
+		where, params = self._list_filters(u_type, u_status, email_contains, is_federated, email_verified)
+		query = f"SELECT {', '.join(self.LIST_COLUMNS)} FROM {self.table_name} WHERE {where}"
+		result = self.fetch_many(query, tuple(params) if params else None)
+		for row in result:
+			row['isFederated'] = bool(row['isFederated'])
+			row['email_verified'] = bool(row['email_verified'])
+		return result
+
+	@staticmethod
+	def _list_filters(
+		u_type: Optional[str] = None,
+		u_status: Optional[str] = None,
+		email_contains: Optional[str] = None,
+		is_federated: Optional[bool] = None,
+		email_verified: Optional[bool] = None
+	) -> Tuple[str, List[Any]]:
+		"""Build the WHERE clause (and its params) shared by listing and export."""
+		query = "1=1"
 		params = []
-		
 		if u_type:
 			query += " AND u_type = %s"
 			params.append(u_type)
@@ -122,9 +149,163 @@ class UserRepository(BaseRepository[User]):
 		if email_verified is not None:
 			query += " AND email_verified = %s"
 			params.append(email_verified)
-		result = self.fetch_many(query, tuple(params) if params else None)
-		return result
+		return query, params
+
+	def stream_users(self, batch_size: int, **filters) -> Iterator[List[Dict[str, Any]]]:
+		"""Yield batches of listed users through an unbuffered (server-side) cursor.
+
+		Only one batch is held in memory at a time. The cursor is private to the
+		generator, so the connection must not be used for anything else until the
+		iteration ends.
+		"""
+		where, params = self._list_filters(**filters)
+		query = f"SELECT {', '.join(self.LIST_COLUMNS)} FROM {self.table_name} WHERE {where} ORDER BY id"
+		cursor = query_stats.instrument(self.connection.cursor(buffered=False))
+		try:
+			cursor.execute(query, tuple(params) if params else None)
+			names = column_names(cursor)
+			while True:
+				rows = cursor.fetchmany(batch_size)
+				if not rows:
+					break
+				batch = [dict(zip(names, row)) for row in rows]
+				for row in batch:
+					row['isFederated'] = bool(row['isFederated'])
+					row['email_verified'] = bool(row['email_verified'])
+				yield batch
+		except Error as e:
+			raise DatabaseException(f"Error exporting users: {e}")
+		finally:
+			cursor.close()
+
+	def list_after(self, after_id: int, limit: int, updated_since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+		"""Next batch of users (id, username, u_type, provision_state, created_at, updated_at) after `after_id`, in id order.
+
+		Keyset pagination: each batch is one short primary-key range read, so a long
+		scan holds no cursor or snapshot open between batches. `updated_since` keeps
+		only rows changed at or after that time (served by idx_users_updated_at).
+		"""
+		query = f"SELECT id, username, u_type, provision_state, created_at, updated_at FROM {self.table_name} WHERE id > %s"
+		params: List[Any] = [after_id]
+		if updated_since is not None:
+			query += " AND updated_at >= %s"
+			params.append(updated_since)
+		query += " ORDER BY id LIMIT %s"
+		params.append(limit)
+		try:
+			return self.fetch_many(query, tuple(params))
+		except Exception as e:
+			raise DatabaseException(f"Error listing users: {e}")
+
+	def list_for_migration(
+		self,
+		after_id: int,
+		limit: int,
+		target_u_type: str,
+		user_ids: Optional[List[int]] = None,
+		u_type: Optional[str] = None,
+		u_status: Optional[str] = None
+	) -> List[Dict[str, Any]]:
+		"""Next batch of users (id, username, u_type, provision_state) to move to `target_u_type`.
+
+		Keyset pagination after `after_id`, like list_after. Users already in the
+		target group are skipped, so a re-run or a new job over the same selection
+		only picks up what is left. `user_ids` restricts the batch to those ids.
+		"""
+		where, params = self._list_filters(u_type=u_type, u_status=u_status)
+		query = f"""
+			SELECT id, username, u_type, provision_state FROM {self.table_name}
+			WHERE id > %s AND u_type <> %s AND {where}
+		"""
+		params = [after_id, target_u_type] + params
+		if user_ids is not None:
+			if not user_ids:
+				return []
+			query += f" AND id IN ({', '.join(['%s'] * len(user_ids))})"
+			params.extend(user_ids)
+		query += " ORDER BY id LIMIT %s"
+		params.append(limit)
+		try:
+			return self.fetch_many(query, tuple(params))
+		except Exception as e:
+			raise DatabaseException(f"Error listing users: {e}")
+
+	def set_u_type_many(self, user_ids: List[int], u_type: str) -> int:
+		"""Move several users to a user type with one statement."""
+		if not user_ids:
+			return 0
+		query = f"""
+			UPDATE {self.table_name} SET u_type = %s, updated_at = NOW()
+			WHERE id IN ({', '.join(['%s'] * len(user_ids))})
+		"""
+		try:
+			with self._get_cursor(write=True) as cursor:
+				cursor.execute(query, (u_type,) + tuple(user_ids))
+				return cursor.rowcount
+		except Exception as e:
+			raise DatabaseException(f"Error updating user types: {e}")
+
+	def find_existing(self, usernames: List[str], emails: List[str]) -> Tuple[Set[str], Set[str]]:
+		"""Return which of the given usernames and emails are already taken, in one query.
+
+		Both sets are lowercased, matching the case-insensitive collation of the table.
+		"""
+		if not usernames and not emails:
+			return set(), set()
+		conditions = []
+		params: List[Any] = []
+		if usernames:
+			conditions.append(f"username IN ({', '.join(['%s'] * len(usernames))})")
+			params.extend(usernames)
+		if emails:
+			conditions.append(f"email IN ({', '.join(['%s'] * len(emails))})")
+			params.extend(emails)
+		query = f"SELECT username, email FROM {self.table_name} WHERE {' OR '.join(conditions)}"
+		rows = self.fetch_many(query, tuple(params))
+		wanted_usernames = {u.lower() for u in usernames}
+		wanted_emails = {e.lower() for e in emails}
+		taken_usernames = {row['username'].lower() for row in rows} & wanted_usernames
+		taken_emails = {row['email'].lower() for row in rows} & wanted_emails
+		return taken_usernames, taken_emails
+
+	def create_many(self, users: List[Dict[str, Any]]) -> Dict[str, int]:
+		"""Insert users (all with the same keys) in one batch; return their ids by lowercased username."""
+		if not users:
+			return {}
+		fields = list(users[0].keys())
+		query = f"""
+			INSERT INTO {self.table_name} ({', '.join(fields)})
+			VALUES ({', '.join(['%s'] * len(fields))})
+		"""
+		with self._get_cursor(write=True, dictionary=False) as cursor:
+			cursor.executemany(query, [tuple(user[f] for f in fields) for user in users])
+		usernames = [user['username'] for user in users]
+		rows = self.fetch_many(
+			f"SELECT id, username FROM {self.table_name} WHERE username IN ({', '.join(['%s'] * len(usernames))})",
+			tuple(usernames)
+		)
+		return {row['username'].lower(): row['id'] for row in rows}
+
+	def get_usernames(self, user_ids: List[int]) -> Dict[int, str]:
+		"""Usernames of several users by id, in one query; unknown ids are left out."""
+		if not user_ids:
+			return {}
+		query = f"SELECT id, username FROM {self.table_name} WHERE id IN ({', '.join(['%s'] * len(user_ids))})"
+		try:
+			return {row['id']: row['username'] for row in self.fetch_many(query, tuple(user_ids))}
+		except Exception as e:
+			raise DatabaseException(f"Error fetching users: {e}")
+
+	def set_api_key_previews(self, previews: Dict[int, Optional[str]]) -> None:
+		"""Set the API key preview of several users ({user_id: preview or None}) in one batch."""
+		if not previews:
+			return
+		query = f"UPDATE {self.table_name} SET api_key_preview = %s, updated_at = NOW() WHERE id = %s"
+		with self._get_cursor(write=True) as cursor:
+			cursor.executemany(query, [(preview, user_id) for user_id, preview in previews.items()])
+
 	
+	@read_only
 	def get_user_status(self, username: str) -> Optional[str]:
 		"""Get user status by username."""
 		query = f"SELECT u_status FROM {self.table_name} WHERE username = %s"
@@ -134,6 +315,7 @@ class UserRepository(BaseRepository[User]):
 		except Exception as e:
 			raise DatabaseException(f"Error getting user status: {e}")
 
+	@read_only
 	def get_user_profile(self, username: str) -> Dict[str, Any]:
 		"""Get user profile with minimal data."""
 		query = f"""
@@ -150,189 +332,61 @@ class UserRepository(BaseRepository[User]):
 		except Exception as e:
 			raise DatabaseException(f"Error getting user profile: {e}")
 	
-	def can_send_verification(self, username: str) -> bool:
-		"""Check if enough time has passed since last verification email."""
-		query = f"""
-			SELECT last_verification_sent 
-			FROM {self.table_name} 
-			WHERE username = %s
-		"""
-		try:
-			result = self.fetch_one(query, (username,))
-			
-			if not result or not result.get('last_verification_sent'):
-				return True
-				
-			last_sent = result['last_verification_sent']
-			cooldown = timedelta(minutes=5)  # 5 minutes cooldown
-			return datetime.now() - last_sent > cooldown
-		except Exception as e:
-			raise DatabaseException(f"Error checking verification cooldown: {e}")
-		
-		last_sent = result['last_verification_sent']
-		cooldown_time = datetime.now() - timedelta(minutes=settings.VERIFICATION_COOLDOWN_MINUTES)
-		
-		return last_sent < cooldown_time
-
-	def save_verification_code(self, username: str, code: str) -> bool:
-		"""Save verification code for user.
-		
-		Args:
-			username: The username to save the verification code for
-			code: The verification code to save
-			
-		Returns:
-			bool: True if the code was saved successfully, False otherwise
-			
-		Raises:
-			DatabaseException: If there's an error executing the query
-		"""
-		expires_at = datetime.now() + timedelta(minutes=settings.EMAIL_VERIFICATION_EXPIRE_MINUTES)
-		query = f"""
-			UPDATE {self.table_name} 
-			SET verification_code = %s, 
-				verification_code_expires = %s,
-				verification_attempts = 0,
-				last_verification_sent = NOW()
-			WHERE username = %s
-		"""
-		try:
-			with self._get_cursor() as cursor:
-				cursor.execute(query, (code, expires_at, username))
-				self.connection.commit()
-				# For UPDATE queries, rowcount returns the number of rows affected
-				return cursor.rowcount > 0
-		except Exception as e:
-			self.connection.rollback()
-			logger.error(f"Error saving verification code for user {username}: {str(e)}")
-			raise DatabaseException(f"Error saving verification code: {e}")
-
 	def get_user_email_status(self, username: str) -> Dict[str, Any]:
-		"""Get user's email and verification status."""
+		"""Get user's email and verification status (None if the user does not exist)."""
 		query = f"""
-			SELECT email, email_verified, verification_code
+			SELECT id, email, email_verified, u_status
 			FROM {self.table_name}
 			WHERE username = %s
 		"""
 		try:
-			result = self.fetch_one(query, (username,))
-			if not result:
-				raise ValueError("User not found")
-			return result
+			return self.fetch_one(query, (username,))
 		except Exception as e:
 			raise DatabaseException(f"Error getting user email status: {e}")
 
-	def verify_email_code(self, username: str, code: str) -> bool:
-		"""Verify email code and mark email as verified."""
+	def verify_email_code(self, username: str, code: str, max_attempts: int) -> bool:
+		"""Verify a pending user's email code and activate the user, in one statement.
+
+		Matches the user's live, not exhausted verification token by its HMAC
+		(computed in SQL from the padded keys, see hash_token), then marks the
+		email verified, activates the user and expires the token. Returns False
+		if nothing matched.
+		"""
 		query = f"""
-			UPDATE {self.table_name} 
-			SET email_verified = 1,
-				verification_code = NULL,
-				verification_attempts = 0
-			WHERE username = %s AND verification_code = %s
+			UPDATE {self.table_name} u
+			JOIN user_db.user_tokens t ON t.user_id = u.id AND t.purpose = 'verification'
+			SET u.email_verified = 1,
+				u.u_status = 'active',
+				t.attempts = t.attempts + 1,
+				t.expires_at = NOW()
+			WHERE u.username = %s
+			AND u.u_status = 'pending'
+			AND t.token_hash = UNHEX(SHA2(CONCAT(%s, UNHEX(SHA2(CONCAT(%s, 'verification:', u.id, ':', %s), 256))), 256))
+			AND t.expires_at > NOW()
+			AND t.attempts < %s
 		"""
 		try:
-			with self._get_cursor() as cursor:
-				cursor.execute(query, (username, code))
+			with self._get_cursor(write=True) as cursor:
+				inner, outer = hmac_pads()
+				cursor.execute(query, (username, outer, inner, code, max_attempts))
 				return cursor.rowcount > 0
 		except Exception as e:
 			raise DatabaseException(f"Error verifying email code: {e}")
 
 	def increment_verification_attempts(self, username: str) -> None:
-		"""Increment failed verification attempts."""
+		"""Count a failed verification attempt against the user's live code."""
 		query = f"""
-			UPDATE {self.table_name} 
-			SET verification_attempts = verification_attempts + 1
-			WHERE username = %s
+			UPDATE user_db.user_tokens t
+			JOIN {self.table_name} u ON u.id = t.user_id
+			SET t.attempts = t.attempts + 1
+			WHERE u.username = %s AND t.purpose = 'verification' AND t.expires_at > NOW()
 		"""
 		try:
-			with self._get_cursor() as cursor:
+			with self._get_cursor(write=True) as cursor:
 				cursor.execute(query, (username,))
 		except Exception as e:
 			raise DatabaseException(f"Error incrementing verification attempts: {e}")
 
-	# ---- Password recovery helpers ----
-	def can_send_password_recovery(self, email: str) -> bool:
-		"""Check cooldown using last_recovery_sent timestamp."""
-		query = f"""
-			SELECT last_recovery_sent 
-			FROM {self.table_name}
-			WHERE email = %s
-		"""
-		try:
-			result = self.fetch_one(query, (email,))
-			if not result or not result.get('last_recovery_sent'):
-				return True
-			last_sent = result['last_recovery_sent']
-			cooldown = timedelta(minutes=settings.VERIFICATION_COOLDOWN_MINUTES)
-			return datetime.now() - last_sent > cooldown
-		except Exception as e:
-			raise DatabaseException(f"Error checking recovery cooldown: {e}")
-
-	def save_password_recovery_token(self, email: str, token: str, expires_at: datetime) -> bool:
-		"""Save recovery token and timestamps for the user with given email."""
-		query = f"""
-			UPDATE {self.table_name}
-			SET recovery_token = %s,
-				recovery_token_expires = %s,
-				recovery_attempts = 0,
-				last_recovery_sent = NOW()
-			WHERE email = %s
-		"""
-		try:
-			with self._get_cursor() as cursor:
-				cursor.execute(query, (token, expires_at, email))
-				self.connection.commit()
-				return cursor.rowcount > 0
-		except Exception as e:
-			self.connection.rollback()
-			logger.error(f"Error saving recovery token for email {email}: {str(e)}")
-			raise DatabaseException(f"Error saving recovery token: {e}")
-
-	def search_recovery_email(self, token: str) -> Dict[str, Any]:
-		"""Return True if email has matching non-expired token."""
-		query = f"""
-			SELECT email FROM {self.table_name}
-			WHERE recovery_token = %s
-			AND recovery_token_expires > NOW()
-		"""
-		try:
-			result = self.fetch_one(query, (token,))
-			return result
-		except Exception as e:
-			raise DatabaseException(f"Error getting email from recovery token: {e}")
-
-	def validate_recovery_code(self, email: str, code: str) -> bool:
-		"""Return True if email has matching non-expired code."""
-		query = f"""
-			SELECT 1 FROM {self.table_name}
-			WHERE email = %s
-			AND recovery_token = %s
-			AND recovery_token_expires > NOW()
-		"""
-		try:
-			result = self.fetch_one(query, (email, code))
-			return bool(result)
-		except Exception as e:
-			raise DatabaseException(f"Error validating recovery token: {e}")
-
-	def clear_recovery_code(self, email: str) -> None:
-		"""Clear recovery code fields after successful reset."""
-		query = f"""
-			UPDATE {self.table_name}
-			SET recovery_token = NULL,
-				recovery_token_expires = NULL,
-				recovery_attempts = 0
-			WHERE email = %s
-		"""
-		try:
-			with self._get_cursor() as cursor:
-				cursor.execute(query, (email,))
-				self.connection.commit()
-		except Exception as e:
-			self.connection.rollback()
-			raise DatabaseException(f"Error clearing recovery code: {e}")
-
 	def get_user_minimal_by_email(self, email: str) -> Optional[Dict[str, Any]]:
 		"""Get minimal fields to proceed with recovery by email."""
 		query = f"""
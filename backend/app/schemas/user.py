@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import Optional
+from typing import Optional, List
 
 from app.core.config import settings
 
@@ -35,6 +35,8 @@ class UserUpdate(BaseModel):
 class User(UserBase):
 	id: int
 	api_key: Optional[str] = None
+	# 'provisioning' until the APISIX consumer exists (the user cannot log in yet)
+	provision_state: str = Field(default='ready')
 	
 	class Config:
 		from_attributes = True
@@ -99,4 +101,35 @@ class PasswordRecoveryRequest(BaseModel):
 class PasswordRecoveryResponse(BaseModel):
 	success: bool
 	message: str = Field(max_length=settings.MESSAGE_MAX_LENGTH)
-	error: Optional[str] = None
\ No newline at end of file
+	error: Optional[str] = None
+
+class UserImportRowResult(BaseModel):
+	index: int
+	username: Optional[str] = None
+	status: str
+	error: Optional[str] = None
+
+
+class UserImportResponse(BaseModel):
+	dry_run: bool
+	total: int
+	created: int
+	failed: int
+	results: List[UserImportRowResult]
+
+
+class GroupMigrationRequest(BaseModel):
+	"""Users to move to target_group: the listed ids and/or those matching u_type / u_status."""
+	target_group: str = Field(min_length=1, max_length=20)
+	user_ids: Optional[List[int]] = Field(default=None, max_length=settings.BULK_JOB_MAX_IDS)
+	u_type: Optional[str] = None
+	u_status: Optional[str] = None
+	dry_run: bool = False
+
+
+class ApiKeyBulkRequest(BaseModel):
+	user_ids: List[int] = Field(min_length=1, max_length=settings.API_KEY_BULK_MAX_USERS)
+
+
+class ApiKeyLookupRequest(BaseModel):
+	api_key: str = Field(min_length=settings.API_KEY_LENGTH, max_length=settings.API_KEY_LENGTH, pattern=settings.API_KEY_PATTERN)
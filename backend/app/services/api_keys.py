@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from app.repositories.api_key import ApiKeyRepository, hash_api_key, api_key_preview
+from app.repositories.user import UserRepository
+from app.services.apisix import APISIXService
+from app.services.user import invalidate_user_caches
+from app.core.config import settings
+from app.core.security import generate_api_key
+from app.core import background
+from app.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class ApiKeyService:
+	"""Bulk rotation and revocation of API keys, and lookups in the hashed key index.
+
+	APISIX key-auth keeps checking keys at the gateway. For a batch of users the
+	consumers are updated first, with bounded concurrency; the users whose
+	consumer was updated then have their keys indexed (or revoked) and their
+	previews set in one transaction, a few statements for the whole batch.
+	"""
+
+	def __init__(self, api_key_repository: ApiKeyRepository):
+		self.api_key_repository = api_key_repository
+		self.user_repository = UserRepository(api_key_repository.uow)
+		self.apisix_service = APISIXService()
+
+	async def _update_consumers(self, usernames: Dict[int, str], keys: Dict[int, Optional[str]]) -> Dict[int, Optional[str]]:
+		"""Set (or, for None, remove) each user's key-auth key; the error of each user, or None."""
+		semaphore = asyncio.Semaphore(settings.BULK_JOB_CONCURRENCY)
+
+		async def update(user_id: int) -> Optional[str]:
+			async with semaphore:
+				try:
+					if await self.apisix_service.update_consumer(usernames[user_id], {"api_key": keys[user_id]}):
+						return None
+					return "Consumer not found"
+				except Exception as e:
+					return str(e) or type(e).__name__
+
+		user_ids = list(keys)
+		errors = await asyncio.gather(*(update(user_id) for user_id in user_ids))
+		return dict(zip(user_ids, errors))
+
+	async def _apply(self, user_ids: List[int], rotate: bool) -> Dict[str, Any]:
+		ids = list(dict.fromkeys(user_ids))
+		usernames = self.user_repository.get_usernames(ids)
+		keys = {user_id: generate_api_key() if rotate else None for user_id in ids if user_id in usernames}
+		errors = await self._update_consumers(usernames, keys)
+		done = [user_id for user_id in keys if errors[user_id] is None]
+		try:
+			if rotate:
+				self.api_key_repository.issue_many({user_id: keys[user_id] for user_id in done})
+			else:
+				self.api_key_repository.revoke_many(done)
+			self.user_repository.set_api_key_previews({
+				user_id: api_key_preview(keys[user_id]) if rotate else None for user_id in done
+			})
+			self.api_key_repository.commit()
+		except Exception:
+			self.api_key_repository.rollback()
+			# The gateway already holds the new state of these consumers
+			logger.error(f"API key {'rotation' if rotate else 'revocation'} of {len(done)} users applied in APISIX but not indexed")
+			raise
+		invalidate_user_caches(*(usernames[user_id] for user_id in done))
+
+		results = []
+		for user_id in ids:
+			error = "User not found" if user_id not in usernames else errors[user_id]
+			result = {"user_id": user_id, "username": usernames.get(user_id), "error": error}
+			if rotate:
+				result["api_key"] = keys.get(user_id) if error is None else None
+			results.append(result)
+		return {
+			"total": len(ids),
+			"succeeded": len(done),
+			"failed": len(ids) - len(done),
+			"results": results,
+		}
+
+	async def rotate(self, user_ids: List[int]) -> Dict[str, Any]:
+		"""Issue new keys to these users (the old ones stop working); the new keys are in the results."""
+		return await self._apply(user_ids, rotate=True)
+
+	async def revoke(self, user_ids: List[int]) -> Dict[str, Any]:
+		"""Remove the keys of these users from the gateway and mark them revoked."""
+		return await self._apply(user_ids, rotate=False)
+
+	def lookup(self, api_key: str) -> Optional[Dict[str, Any]]:
+		"""The indexed key and its owner; None for an unknown (or never indexed) key."""
+		return self.api_key_repository.lookup(api_key)
+
+	def list_keys(
+		self,
+		after_id: int = 0,
+		limit: int = 100,
+		user_id: Optional[int] = None,
+		active: Optional[bool] = None,
+		unused_since: Optional[datetime] = None
+	) -> List[Dict[str, Any]]:
+		return self.api_key_repository.list_keys(after_id, limit, user_id, active, unused_since)
+
+
+class ApiKeyUsage:
+	"""Last use of the API keys the backend sees, written to the index in batches.
+
+	Requests only add the key's hash to an in-memory set (bounded by
+	API_KEY_USAGE_MAX_PENDING); a background task writes the set every
+	API_KEY_USAGE_FLUSH_SECONDS with a few UPDATE ... WHERE key_hash IN (...)
+	statements, so last_used_at is accurate to the flush interval.
+	"""
+
+	def __init__(self, max_pending: int, chunk_size: int = 1000):
+		self.max_pending = max_pending
+		self.chunk_size = chunk_size
+		self._pending: Set[bytes] = set()
+		self._dropped = 0
+		# record() runs in the threadpool (sync dependency), flush() on the event loop
+		self._lock = threading.Lock()
+
+	def record(self, api_key: str) -> None:
+		key_hash = hash_api_key(api_key)
+		with self._lock:
+			if len(self._pending) < self.max_pending:
+				self._pending.add(key_hash)
+			else:
+				self._dropped += 1
+
+	def _write(self, key_hashes: List[bytes]) -> None:
+		with get_db() as conn:
+			repo = ApiKeyRepository(conn)
+			try:
+				for start in range(0, len(key_hashes), self.chunk_size):
+					repo.record_use(key_hashes[start:start + self.chunk_size])
+				repo.commit()
+			finally:
+				repo.close()
+
+	async def flush(self) -> None:
+		"""Background task body (and shutdown hook)."""
+		with self._lock:
+			if not self._pending:
+				return
+			pending, self._pending = self._pending, set()
+		try:
+			await asyncio.to_thread(self._write, list(pending))
+		except Exception as e:
+			logger.warning(f"Recording API key use failed: {str(e)}")
+			# Kept for the next flush
+			with self._lock:
+				self._pending |= pending
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {"pending": len(self._pending), "dropped": self._dropped}
+
+
+api_key_usage = ApiKeyUsage(settings.API_KEY_USAGE_MAX_PENDING)
+
+background.register(background.PeriodicTask(
+	"api-key-usage", settings.API_KEY_USAGE_FLUSH_SECONDS, api_key_usage.flush
+))
+background.on_shutdown(api_key_usage.flush)
@@ -1,4 +1,4 @@
-import requests
+import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta, timezone
 from jose import jwt
@@ -8,18 +8,24 @@ from app.core.security import get_password_hash, verify_password
 from app.core.exceptions import APISIXException
 from app.schemas.consumer import ConsumerCreate
 from app.services.consumer_group import ConsumerGroupService
+from app.services.consumer_cache import consumer_cache
+from app.services.profile_catalogue import profile_catalogue
+from app.services.apisix_client import apisix_admin
+from app.utils.locks import KeyedLocks
+from app.utils.merge_patch import merge_patch, is_applied
+
+logger = logging.getLogger(__name__)
+
+# Serializes read-modify-write updates of one consumer within this worker
+_consumer_locks = KeyedLocks()
 
-from app.core.config import settings
 
 class APISIXService:
 	"""Service for APISIX consumer management."""
 	
 	def __init__(self):
-		self.admin_url = settings.APISIX_ADMIN_URL
-		self.headers = {
-			"X-API-KEY": settings.APISIX_ADMIN_KEY,
-			"Content-Type": "application/json"
-		}
+		# Stateless: every instance shares the app-wide admin client and its connection pool
+		self.admin = apisix_admin
 	
 	@property
 	def consumer_groups(self) -> ConsumerGroupService:
@@ -28,160 +34,156 @@ class APISIXService:
 			self._consumer_groups = ConsumerGroupService()
 		return self._consumer_groups
 	
-	def get_consumer_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+	async def get_cached_consumer(self, username: str) -> Optional[Dict[str, Any]]:
+		"""Get consumer by username from the local consumer cache (admin API on a miss)."""
+		return await consumer_cache.get(username)
+
+	async def get_consumer_by_username(self, username: str) -> Optional[Dict[str, Any]]:
 		"""Get consumer from APISIX by username."""
-		try:
-			url = f"{self.admin_url}/consumers/{username}"
-			response = requests.get(url, headers=self.headers, timeout=10)
-			if response.status_code == 200:
-				data = response.json()
-				return data.get("value")
-			elif response.status_code == 404:
-				# Consumer not found
-				return None
-			else:
-				raise APISIXException(f"Status {response.status_code}: {response.text}")
-				
-		except requests.RequestException as e:
-			raise APISIXException(f"Connection error: {str(e)}")
+		response = await self.admin.get(f"/consumers/{username}")
+		if response.status_code == 200:
+			data = response.json()
+			return data.get("value")
+		elif response.status_code == 404:
+			# Consumer not found
+			return None
+		else:
+			raise APISIXException(f"Status {response.status_code}: {response.text}")
 	
-	def create_consumer(self, consumer: ConsumerCreate) -> bool:
+	async def create_consumer(self, consumer: ConsumerCreate) -> bool:
 		"""Create a new consumer in APISIX."""
-		try:
-			hashed_password = get_password_hash(consumer.password)
-			
-			# Prepare consumer data
-			consumer_data = {
-				"username": consumer.username,
-				"plugins": {
-					"jwt-auth": {
-						"key": consumer.username,
-						"secret": hashed_password,
-						"algorithm": settings.JWT_ALGORITHM
-					}
-				},
-				"group_id": consumer.u_type
-			}
-
-			# Create consumer
-			url = f"{self.admin_url}/consumers/{consumer.username}"
-			response = requests.put(url, headers=self.headers, json=consumer_data, timeout=20)
-			
-			if response.status_code not in [200, 201]:
-				raise APISIXException(f"Status {response.status_code}: {response.text}")
-			
-			return True
-				
-		except requests.RequestException as e:
-			raise APISIXException(f"Connection error: {str(e)}")
-
-	def update_consumer(self, username: str, data_to_update: Dict[str, Any]) -> bool:
-		try:
-			# Check data_to_update is not empty
-			if not data_to_update:
-				return False
+		# Hashing runs in the hashing pool
+		hashed_password = await get_password_hash(consumer.password)
+		return await self.put_consumer(consumer.username, hashed_password, consumer.u_type)
 
-			# 1. Get consumer data
-			get_response = requests.get(
-				f"{self.admin_url}/consumers/{username}",
-				headers=self.headers,
-				timeout=10
-			)
-			
-			if get_response.status_code != 200:
-				return False
-				
-			current_data = get_response.json()["value"]
-			
-			# 2. Update specific fields
-			old_username = current_data.get("username")
-			new_username = data_to_update.get("username")
+	async def put_consumer(self, username: str, hashed_password: str, u_type: str) -> bool:
+		"""Create (or replace) a consumer from an already hashed password; safe to repeat."""
+		# Prepare consumer data
+		consumer_data = {
+			"username": username,
+			"plugins": {
+				"jwt-auth": {
+					"key": username,
+					"secret": hashed_password,
+					"algorithm": settings.JWT_ALGORITHM
+				}
+			},
+			"group_id": u_type
+		}
+
+		# Create consumer
+		response = await self.admin.put(f"/consumers/{username}", json=consumer_data)
+		consumer_cache.invalidate(username)
+		
+		if response.status_code not in [200, 201]:
+			raise APISIXException(f"Status {response.status_code}: {response.text}")
+		
+		return True
+
+	async def update_consumer(self, username: str, data_to_update: Dict[str, Any]) -> bool:
+		"""Update a consumer in APISIX (a new password is hashed in the hashing pool).
+
+		The update is expressed as a JSON merge patch and applied to the consumer's
+		current document under a per-username lock, so concurrent updates from this
+		worker (e.g. key rotation racing a password reset) cannot overwrite each other.
+		APISIX consumers accept neither PATCH nor conditional writes; with
+		APISIX_CONSUMER_UPDATE_VERIFY the write is checked against the modifiedIndex
+		it produced and re-applied if another process overwrote it.
+		"""
+		# Check data_to_update is not empty
+		if not data_to_update:
+			return False
+
+		hashed_password = None
+		if data_to_update.get("password"):
+			hashed_password = await get_password_hash(data_to_update["password"])
+
+		new_username = data_to_update.get("username")
+		# If username changed, the consumer moves to the new key path and the old one is removed
+		target_username = new_username if new_username else username
+
+		def build_patch(current: Dict[str, Any]) -> Dict[str, Any]:
+			plugins: Dict[str, Any] = {}
+			patch: Dict[str, Any] = {}
 			if new_username:
-				current_data["username"] = new_username
+				patch["username"] = new_username
 				# Update key in jwt-auth if plugin exists
-				if "plugins" in current_data and "jwt-auth" in current_data["plugins"]:
-					current_data["plugins"]["jwt-auth"]["key"] = new_username
-				
+				if "jwt-auth" in current.get("plugins", {}):
+					plugins["jwt-auth"] = {"key": new_username}
 			# Accept either 'group' or 'u_type' to update group assignment
 			if "group" in data_to_update:
-				current_data["group_id"] = data_to_update["group"]
+				patch["group_id"] = data_to_update["group"]
 			if "u_type" in data_to_update:
-				current_data["group_id"] = data_to_update["u_type"]
-
+				patch["group_id"] = data_to_update["u_type"]
 			if "api_key" in data_to_update:
-				# Update plugin key-auth if exists
-				if "plugins" not in current_data:
-					current_data["plugins"] = {}
-				current_data["plugins"]["key-auth"] = {
-					"key": data_to_update["api_key"]
-				}
-			
-			if "password" in data_to_update:
-				# Update plugin jwt-auth
-				if "plugins" not in current_data:
-					current_data["plugins"] = {}
-				
-				hashed_password = get_password_hash(data_to_update["password"])
-				current_data["plugins"]["jwt-auth"] = {
-					"key": current_data["username"],
+				# A null key removes key-auth (revocation)
+				plugins["key-auth"] = {"key": data_to_update["api_key"]} if data_to_update["api_key"] else None
+			if hashed_password:
+				plugins["jwt-auth"] = {
+					"key": target_username,
 					"secret": hashed_password,
 					"algorithm": settings.JWT_ALGORITHM
 				}
-			
-			# 3. Make PUT with updated configuration
-			# If username changed, PUT to the new key path and remove the old one
-			target_username = new_username if new_username else username
-
-			# Remove APISIX-managed read-only fields that must not be sent back
-			for ro_field in ("create_time", "update_time"):
-				if ro_field in current_data:
-					current_data.pop(ro_field, None)
-
-			put_response = requests.put(
-				f"{self.admin_url}/consumers/{target_username}",
-				headers=self.headers,
-				json=current_data,
-				timeout=20
-			)
-			
-			if put_response.status_code not in [200, 201]:
-				raise APISIXException(f"Status {put_response.status_code}: {put_response.text}")
-			
-			# Clean up the old key if we renamed and the old key differs
-			if new_username and new_username != old_username and old_username != target_username:
-				try:
-					requests.delete(
-						f"{self.admin_url}/consumers/{old_username}",
-						headers=self.headers,
-						timeout=10
-					)
-				except requests.RequestException:
-					# Non-fatal: the new consumer is already updated; old key cleanup failed
-					pass
-			
-			return True
-		except requests.RequestException as e:
-			raise APISIXException(f"Connection error: {str(e)}")
-		except Exception as e:
-			# Do not silently swallow errors
-			raise APISIXException(str(e))
+			if plugins:
+				patch["plugins"] = plugins
+			return patch
 
-	
-	def delete_consumer(self, username: str) -> bool:
-		"""Delete a consumer from APISIX."""
-		try:
-			url = f"{self.admin_url}/consumers/{username}"
-			response = requests.delete(url, headers=self.headers, timeout=10)
-			
-			if response.status_code in [200, 404]:
-				return True
+		async with _consumer_locks.hold(username):
+			get_response = await self.admin.get(f"/consumers/{username}")
+			if get_response.status_code != 200:
+				return False
+			current = get_response.json()["value"]
+			for attempt in range(settings.APISIX_CONSUMER_UPDATE_RETRIES + 1):
+				patch = build_patch(current)
+				document = merge_patch(current, patch)
+				# Remove APISIX-managed read-only fields that must not be sent back
+				for ro_field in ("create_time", "update_time"):
+					document.pop(ro_field, None)
+
+				put_response = await self.admin.put(f"/consumers/{target_username}", json=document)
+				consumer_cache.invalidate(username, target_username)
+				if put_response.status_code not in [200, 201]:
+					raise APISIXException(f"Status {put_response.status_code}: {put_response.text}")
+				if not settings.APISIX_CONSUMER_UPDATE_VERIFY:
+					break
+
+				# Re-read: unchanged since our write, or still carrying the patch, means it was kept
+				check = await self.admin.get(f"/consumers/{target_username}")
+				if check.status_code != 200:
+					raise APISIXException(f"Consumer {target_username} disappeared during update")
+				data = check.json()
+				current = data.get("value") or {}
+				if data.get("modifiedIndex") == put_response.json().get("modifiedIndex") or is_applied(current, patch):
+					break
+				# Overwritten from a stale read elsewhere: apply the patch again on top of it
+				logger.warning(f"Concurrent update of consumer {target_username} detected, retrying ({attempt + 1})")
 			else:
-				raise APISIXException(f"Status {response.status_code}: {response.text}")
-				
-		except requests.RequestException as e:
-			raise APISIXException(f"Connection error: {str(e)}")
+				raise APISIXException(f"Consumer {target_username} kept changing, update not applied")
+
+		# Clean up the old key if we renamed and the old key differs
+		if new_username and new_username != username:
+			try:
+				response = await self.admin.delete(f"/consumers/{username}")
+				consumer_cache.invalidate(username)
+				if response.status_code not in [200, 404]:
+					logger.warning(f"Could not remove renamed consumer {username}: status {response.status_code}")
+			except APISIXException:
+				# Non-fatal: the new consumer is already updated; old key cleanup failed
+				pass
+
+		return True
+
+	async def delete_consumer(self, username: str) -> bool:
+		"""Delete a consumer from APISIX."""
+		response = await self.admin.delete(f"/consumers/{username}")
+		consumer_cache.invalidate(username)
+		
+		if response.status_code in [200, 404]:
+			return True
+		else:
+			raise APISIXException(f"Status {response.status_code}: {response.text}")
 	
-	def verify_jwt_auth_credentials(self, consumer_data: Dict[str, Any], password: str) -> bool:
+	async def verify_jwt_auth_credentials(self, consumer_data: Dict[str, Any], password: str) -> bool:
 		"""Verify JWT auth credentials."""
 		jwt_auth = consumer_data.get("plugins", {}).get("jwt-auth")
 		if not jwt_auth:
@@ -191,7 +193,7 @@ class APISIXService:
 		if not stored_secret:
 			return False
 		
-		return verify_password(password, stored_secret)
+		return await verify_password(password, stored_secret)
 	
 	def create_jwt_token(self, username: str, consumer_data: Dict[str, Any]) -> str:
 		"""Create JWT token using user's specific secret from APISIX."""
@@ -212,7 +214,7 @@ class APISIXService:
 		return jwt.encode(payload, user_secret, algorithm=settings.JWT_ALGORITHM)
 	
 
-	def profile_group_exists(self, u_type: str) -> bool:
-		"""Check if profile group exists for user type."""
-		group = self.consumer_groups.get_consumer_group(u_type)
+	async def profile_group_exists(self, u_type: str) -> bool:
+		"""Check if profile group exists for user type (from the profile catalogue)."""
+		group = await profile_catalogue.get_group(u_type)
 		return True if group else False
\ No newline at end of file
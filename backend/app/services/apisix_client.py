@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import random
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import APISIXException
+from app.core import background
+
+logger = logging.getLogger(__name__)
+
+# Methods whose repetition has no further effect: safe to retry after a failure
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE"})
+# Gateway answers that mean "try again", as opposed to a rejected request
+RETRY_STATUSES = frozenset({502, 503, 504})
+
+
+class APISIXAdminClient:
+	"""App-lifetime client for the APISIX admin API.
+
+	One keep-alive connection pool serves every service, so admin calls no longer
+	pay a TCP handshake each. Idempotent calls are retried on connection errors,
+	timeouts and 502/503/504, with exponential backoff and full jitter; POST and
+	PATCH are sent once. Connection failures surface as APISIXException, HTTP
+	answers are returned for the caller to interpret.
+	"""
+
+	def __init__(
+		self,
+		base_url: str,
+		api_key: Optional[str],
+		timeout: float,
+		retries: int,
+		backoff: float,
+		max_connections: int
+	):
+		self.base_url = base_url.rstrip("/")
+		self.headers = {"X-API-KEY": api_key or "", "Content-Type": "application/json"}
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+		self.max_connections = max_connections
+		self._client: Optional[httpx.AsyncClient] = None
+		self._requests = 0
+		self._retries = 0
+		self._failures = 0
+
+	def _get_client(self) -> httpx.AsyncClient:
+		if self._client is None:
+			# Created on first use, inside the running event loop
+			self._client = httpx.AsyncClient(
+				base_url=self.base_url,
+				headers=self.headers,
+				timeout=self.timeout,
+				limits=httpx.Limits(
+					max_connections=self.max_connections,
+					max_keepalive_connections=self.max_connections
+				)
+			)
+		return self._client
+
+	async def request(
+		self,
+		method: str,
+		path: str,
+		json: Any = None,
+		params: Optional[Dict[str, Any]] = None,
+		timeout: Optional[float] = None,
+		idempotent: Optional[bool] = None
+	) -> httpx.Response:
+		"""Send one admin API request; `path` is relative to APISIX_ADMIN_URL.
+
+		`idempotent` overrides the method's default, e.g. for a merge patch that only
+		sets values and can safely be sent twice.
+		"""
+		method = method.upper()
+		if idempotent is None:
+			idempotent = method in IDEMPOTENT_METHODS
+		attempts = 1 + (self.retries if idempotent else 0)
+		kwargs: Dict[str, Any] = {"json": json, "params": params}
+		if timeout is not None:
+			kwargs["timeout"] = timeout
+		attempt = 0
+		while True:
+			self._requests += 1
+			can_retry = attempt < attempts - 1
+			try:
+				response = await self._get_client().request(method, path, **kwargs)
+			except httpx.HTTPError as e:
+				if not can_retry:
+					self._failures += 1
+					raise APISIXException(f"Connection error: {str(e)}")
+				logger.warning(f"APISIX admin {method} {path} failed ({str(e)}), retrying")
+			else:
+				if not can_retry or response.status_code not in RETRY_STATUSES:
+					return response
+				logger.warning(f"APISIX admin {method} {path} returned {response.status_code}, retrying")
+			self._retries += 1
+			await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+			attempt += 1
+
+	async def get(self, path: str, **kwargs) -> httpx.Response:
+		return await self.request("GET", path, **kwargs)
+
+	async def put(self, path: str, json: Any, **kwargs) -> httpx.Response:
+		return await self.request("PUT", path, json=json, **kwargs)
+
+	async def patch(self, path: str, json: Any, **kwargs) -> httpx.Response:
+		return await self.request("PATCH", path, json=json, **kwargs)
+
+	async def delete(self, path: str, **kwargs) -> httpx.Response:
+		return await self.request("DELETE", path, **kwargs)
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"requests": self._requests,
+			"retries": self._retries,
+			"failures": self._failures,
+			"max_connections": self.max_connections,
+		}
+
+	async def close(self) -> None:
+		client, self._client = self._client, None
+		if client is not None:
+			await client.aclose()
+
+
+apisix_admin = APISIXAdminClient(
+	base_url=settings.APISIX_ADMIN_URL,
+	api_key=settings.APISIX_ADMIN_KEY,
+	timeout=settings.APISIX_ADMIN_TIMEOUT_SECONDS,
+	retries=settings.APISIX_ADMIN_RETRIES,
+	backoff=settings.APISIX_ADMIN_BACKOFF_SECONDS,
+	max_connections=settings.APISIX_ADMIN_MAX_CONNECTIONS,
+)
+
+background.on_shutdown(apisix_admin.close)
@@ -1,36 +1,64 @@
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, Optional
 from app.services.apisix import APISIXService
 from app.repositories.user import UserRepository
 from app.core.exceptions import InvalidCredentialsException, UserDisabledException, APISIXException
 from app.schemas.auth import UserLogin, FederatedLogin, Token
 from app.schemas.user import UserCreate
 from app.services.user import UserService
+from app.services.provisioning import provisioning_worker
+from app.utils.metrics import PhaseTimer, PhaseHistograms
+
+# Per-phase latency of /token logins (this worker)
+login_timings = PhaseHistograms()
 
 class AuthService:
 	"""Service for authentication operations."""
 	
 	def __init__(self, user_repository: UserRepository):
 		self.user_repository = user_repository
+		self.user_service = UserService(user_repository)
 		self.apisix_service = APISIXService()
 	
-	async def authenticate_user(self, credentials: UserLogin) -> Token:
+	async def authenticate_user(self, credentials: UserLogin, timer: Optional[PhaseTimer] = None) -> Token:
 		"""
 		Authenticate a user by:
 		1. Verifying they exist in APISIX
 		2. Checking credentials are correct
 		3. Verifying user is active in database
+
+		The database status check does not depend on the consumer, so it runs
+		concurrently with steps 1 and 2; failures are still reported in that order.
 		"""
-		# Check consumer exists in APISIX
-		consumer_data = self.apisix_service.get_consumer_by_username(credentials.username)
-		if not consumer_data or consumer_data.get("status") == 0:
-			raise InvalidCredentialsException()
-		
-		# Verify credentials in APISIX
-		if not self.apisix_service.verify_jwt_auth_credentials(consumer_data, credentials.password):
-			raise InvalidCredentialsException()
-		
-		# Check user status in database
-		user_status = self.user_repository.get_user_status(credentials.username)
+		timer = timer or PhaseTimer()
+
+		async def check_credentials() -> Dict[str, Any]:
+			# Check consumer exists in APISIX (local consumer cache)
+			with timer.phase("consumer"):
+				consumer_data = await self.apisix_service.get_cached_consumer(credentials.username)
+			if not consumer_data or consumer_data.get("status") == 0:
+				raise InvalidCredentialsException()
+
+			# Verify credentials in APISIX
+			with timer.phase("verify"):
+				if not await self.apisix_service.verify_jwt_auth_credentials(consumer_data, credentials.password):
+					raise InvalidCredentialsException()
+			return consumer_data
+
+		async def check_status() -> Optional[str]:
+			# Check user status (status cache, then database in a worker thread)
+			with timer.phase("status"):
+				return await asyncio.to_thread(self.user_service.get_user_status, credentials.username)
+
+		# Both always complete, so nothing is left running on the request's connection
+		consumer_data, user_status = await asyncio.gather(
+			check_credentials(), check_status(), return_exceptions=True
+		)
+		if isinstance(consumer_data, BaseException):
+			raise consumer_data
+		if isinstance(user_status, BaseException):
+			raise user_status
+
 		if not user_status:
 			raise InvalidCredentialsException()
 		
@@ -38,7 +66,8 @@ class AuthService:
 			raise UserDisabledException()
 		
 		# Generate token
-		access_token = self.apisix_service.create_jwt_token(credentials.username, consumer_data)
+		with timer.phase("sign"):
+			access_token = self.apisix_service.create_jwt_token(credentials.username, consumer_data)
 		
 		token_data = {
 			"access_token": access_token,
@@ -53,8 +82,6 @@ class AuthService:
 		If not, register the user.
 		"""
 
-		user_service = UserService(self.user_repository)
-
 		# Check if user exists in database
 		user = self.user_repository.get_by_username(credentials.username)
 
@@ -70,17 +97,19 @@ class AuthService:
 				u_status=user_status,
 				isFederated=True
 			)
-			await user_service.create_user(user)
+			created = await self.user_service.create_user(user)
+			# The token is issued now: create the consumer here rather than in the background
+			await provisioning_worker.provision_user(created.id)
 
 			# Get consumer data after user creation
-			consumer_data = self.apisix_service.get_consumer_by_username(credentials.username)
+			consumer_data = await self.apisix_service.get_cached_consumer(credentials.username)
 			if not consumer_data or consumer_data.get("status") == 0:
 				raise APISIXException("Failed to retrieve consumer data after user creation")
 
 		else:
 			
-			# Check user status in database
-			user_status = self.user_repository.get_user_status(credentials.username)
+			# Check user status (status cache, then database)
+			user_status = self.user_service.get_user_status(credentials.username)
 
 			if not user_status:
 				raise InvalidCredentialsException()
@@ -89,7 +118,7 @@ class AuthService:
 				raise UserDisabledException()
 			
 			# Check consumer exists in APISIX
-			consumer_data = self.apisix_service.get_consumer_by_username(credentials.username)
+			consumer_data = await self.apisix_service.get_cached_consumer(credentials.username)
 
 			if not consumer_data or consumer_data.get("status") == 0:
 				raise APISIXException("Consumer not found in APISIX")
@@ -0,0 +1,226 @@
+import asyncio
+import bisect
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.repositories.bulk_job import BulkJobRepository, GROUP_MIGRATION
+from app.repositories.provisioning import ProvisioningOutboxRepository, PROVISIONING
+from app.repositories.user import UserRepository
+from app.services.apisix import APISIXService
+from app.services.user import invalidate_user_caches
+from app.core.config import settings
+from app.core.exceptions import BulkJobInProgressException, ProfileNotFoundException
+from app.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class BulkJobService:
+	"""Resumable bulk operations on users, run in the background and tracked in bulk_jobs.
+
+	A group migration moves the selected users (an id list and/or a u_type /
+	u_status filter) to another consumer group, BULK_JOB_BATCH_SIZE users at a
+	time: the batch's consumers are updated in APISIX with bounded concurrency,
+	then the users that made it are moved in the DB with one UPDATE, and the
+	batch's errors and the job's cursor are committed with it. A consumer is
+	updated before its user, so a job interrupted between the two redoes that
+	batch on resume (the consumer update is idempotent) instead of leaving a
+	user whose consumer was never moved.
+
+	Users already in the target group are never selected, so a failed user can be
+	retried by starting a new job over the same selection. A dry run goes through
+	the same selection and reports the users whose consumer is missing, without
+	writing anything.
+
+	A job is run by one process at a time: resuming claims its row, which only
+	succeeds once it is no longer running, or its process has made no progress for
+	BULK_JOB_STALE_SECONDS.
+	"""
+
+	def __init__(self):
+		self.apisix_service = APISIXService()
+		self.batch_size = settings.BULK_JOB_BATCH_SIZE
+		self.concurrency = settings.BULK_JOB_CONCURRENCY
+
+	async def start_group_migration(
+		self,
+		target_group: str,
+		user_ids: Optional[List[int]] = None,
+		u_type: Optional[str] = None,
+		u_status: Optional[str] = None,
+		dry_run: bool = False
+	) -> int:
+		"""Check the target group and record the job; returns its id (run it with `run`)."""
+		if not await self.apisix_service.profile_group_exists(target_group):
+			raise ProfileNotFoundException(target_group)
+		params = {
+			"target_group": target_group,
+			"user_ids": sorted(set(user_ids)) if user_ids is not None else None,
+			"u_type": u_type,
+			"u_status": u_status,
+		}
+		return await asyncio.to_thread(self._create, params, dry_run)
+
+	def _create(self, params: Dict[str, Any], dry_run: bool) -> int:
+		with get_db() as conn:
+			repo = BulkJobRepository(conn)
+			try:
+				job_id = repo.create(GROUP_MIGRATION, params, dry_run)
+				repo.commit()
+				return job_id
+			finally:
+				repo.close()
+
+	@staticmethod
+	def get_job(job_id: int, errors_after: int = 0) -> Optional[Dict[str, Any]]:
+		"""A job with a page of its per-user errors; None if there is no such job."""
+		with get_db() as conn:
+			repo = BulkJobRepository(conn)
+			try:
+				job = repo.get(job_id, settings.BULK_JOB_STALE_SECONDS)
+				if job is None:
+					return None
+				job["errors"] = repo.get_errors(job_id, settings.BULK_JOB_ERRORS_PAGE_SIZE, errors_after)
+				return job
+			finally:
+				repo.close()
+
+	async def resume(self, job_id: int) -> None:
+		"""Claim a stored job for this process and mark it running again."""
+		if not await asyncio.to_thread(self._claim, job_id):
+			raise BulkJobInProgressException(job_id)
+
+	def _claim(self, job_id: int) -> bool:
+		with get_db() as conn:
+			repo = BulkJobRepository(conn)
+			try:
+				claimed = repo.claim(job_id, settings.BULK_JOB_STALE_SECONDS)
+				repo.commit()
+				return claimed
+			finally:
+				repo.close()
+
+	def _set_status(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+		with get_db() as conn:
+			repo = BulkJobRepository(conn)
+			try:
+				repo.set_status(job_id, status, error)
+				repo.commit()
+			finally:
+				repo.close()
+
+	def _load(self, job_id: int) -> Dict[str, Any]:
+		with get_db() as conn:
+			repo = BulkJobRepository(conn)
+			try:
+				return repo.get(job_id, settings.BULK_JOB_STALE_SECONDS)
+			finally:
+				repo.close()
+
+	def _next_batch(self, params: Dict[str, Any], cursor_id: int) -> Tuple[List[Dict[str, Any]], int, bool]:
+		"""The next users to migrate, the cursor after them, and whether the selection is exhausted."""
+		user_ids = params["user_ids"]
+		chunk = None
+		if user_ids is not None:
+			start = bisect.bisect_right(user_ids, cursor_id)
+			chunk = user_ids[start:start + self.batch_size]
+			if not chunk:
+				return [], cursor_id, True
+		with get_db() as conn:
+			repo = UserRepository(conn)
+			try:
+				rows = repo.list_for_migration(
+					cursor_id, self.batch_size, params["target_group"],
+					user_ids=chunk, u_type=params["u_type"], u_status=params["u_status"]
+				)
+			finally:
+				repo.close()
+		if chunk is not None:
+			# Ids of the chunk that no longer match the filter are skipped with it
+			return rows, chunk[-1], len(chunk) < self.batch_size
+		if not rows:
+			return [], cursor_id, True
+		return rows, rows[-1]["id"], len(rows) < self.batch_size
+
+	async def _update_consumers(
+		self,
+		rows: List[Dict[str, Any]],
+		target_group: str,
+		dry_run: bool
+	) -> List[Optional[str]]:
+		"""Move each user's consumer to the target group; the error of each user, or None."""
+		semaphore = asyncio.Semaphore(self.concurrency)
+
+		async def update(row: Dict[str, Any]) -> Optional[str]:
+			# The consumer of a user still being provisioned is created from its outbox entry
+			if row["provision_state"] == PROVISIONING:
+				return None
+			async with semaphore:
+				try:
+					if dry_run:
+						found = await self.apisix_service.get_consumer_by_username(row["username"]) is not None
+					else:
+						found = await self.apisix_service.update_consumer(row["username"], {"u_type": target_group})
+					return None if found else "Consumer not found"
+				except Exception as e:
+					return str(e) or type(e).__name__
+
+		return await asyncio.gather(*(update(row) for row in rows))
+
+	def _record_batch(
+		self,
+		job_id: int,
+		target_group: str,
+		moved: List[Dict[str, Any]],
+		errors: List[Tuple[int, str, str]],
+		cursor_id: int,
+		dry_run: bool
+	) -> None:
+		"""Move the users whose consumer was moved and record the batch, in one transaction."""
+		with get_db() as conn:
+			jobs = BulkJobRepository(conn)
+			users = UserRepository(jobs.uow)
+			outbox = ProvisioningOutboxRepository(jobs.uow)
+			try:
+				if not dry_run:
+					user_ids = [row["id"] for row in moved]
+					users.set_u_type_many(user_ids, target_group)
+					outbox.set_u_type_many(
+						[row["id"] for row in moved if row["provision_state"] == PROVISIONING], target_group
+					)
+				jobs.record_batch(job_id, cursor_id, len(moved) + len(errors), len(moved), errors)
+				jobs.commit()
+			except Exception:
+				jobs.rollback()
+				raise
+			finally:
+				jobs.close()
+
+	async def run(self, job_id: int) -> None:
+		"""Carry out a claimed job from its cursor to the end of its selection."""
+		try:
+			job = await asyncio.to_thread(self._load, job_id)
+			params, cursor_id, dry_run = job["params"], job["cursor_id"], job["dry_run"]
+			target_group = params["target_group"]
+			done = False
+			while not done:
+				rows, next_cursor, done = await asyncio.to_thread(self._next_batch, params, cursor_id)
+				if rows:
+					results = await self._update_consumers(rows, target_group, dry_run)
+					moved = [row for row, error in zip(rows, results) if error is None]
+					errors = [(row["id"], row["username"], error) for row, error in zip(rows, results) if error is not None]
+				else:
+					moved, errors = [], []
+				if rows or next_cursor != cursor_id:
+					await asyncio.to_thread(self._record_batch, job_id, target_group, moved, errors, next_cursor, dry_run)
+				if not dry_run:
+					invalidate_user_caches(*(row["username"] for row in moved))
+				cursor_id = next_cursor
+			await asyncio.to_thread(self._set_status, job_id, "completed")
+			logger.info(f"Bulk job {job_id} ({GROUP_MIGRATION} to {target_group}, dry_run={dry_run}) completed")
+		except Exception as e:
+			logger.error(f"Bulk job {job_id} failed: {str(e)}")
+			try:
+				await asyncio.to_thread(self._set_status, job_id, "failed", str(e))
+			except Exception as status_error:
+				logger.error(f"Recording failure of bulk job {job_id} failed: {str(status_error)}")
@@ -0,0 +1,314 @@
+import base64
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.exceptions import APISIXException
+from app.core import background
+from app.services.apisix_client import apisix_admin
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "poll", "watch")
+
+
+def _b64(value: str) -> str:
+	return base64.b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def _range_end(prefix: str) -> str:
+	# etcd range covering every key that starts with `prefix`
+	return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class ConsumerCache:
+	"""In-process copy of the APISIX consumers, so logins do not call the admin API.
+
+	The cache is loaded in full from the admin list API and kept current either by
+	listing again every poll interval (an entry is replaced only when its
+	modifiedIndex changed) or by watching the consumers prefix in etcd. A watch event
+	only says which consumer changed; the consumer is then read through the admin
+	API, which returns plugin secrets decrypted whatever the data encryption setting.
+
+	Before the first load, and for usernames it does not hold, lookups go to the
+	admin API. A username the admin API does not know is remembered for
+	not_found_ttl seconds (at most not_found_max of them, oldest dropped first), so
+	logins for unknown users, most of credential-stuffing traffic, do not each
+	cost an admin call. Writes made by this worker invalidate their entry at once;
+	writes from elsewhere arrive with the next poll or watch event, or once the
+	not-found entry expires. With mode "off" every lookup goes to the admin API,
+	as before.
+	"""
+
+	def __init__(
+		self,
+		mode: str,
+		etcd_url: str,
+		etcd_prefix: str,
+		page_size: int,
+		not_found_ttl: float = 0,
+		not_found_max: int = 0,
+		timeout: float = 10
+	):
+		if mode not in MODES:
+			raise ValueError(f"Unknown consumer cache mode {mode!r}, expected one of {MODES}")
+		self.mode = mode
+		self.etcd_url = etcd_url.rstrip("/")
+		self.consumers_key = f"{etcd_prefix.rstrip('/')}/consumers/"
+		self.page_size = page_size
+		self.not_found_ttl = not_found_ttl
+		self.not_found_max = not_found_max
+		self.timeout = timeout
+		# Own client for the long-lived etcd watch; admin calls go through apisix_admin
+		self._client: Optional[httpx.AsyncClient] = None
+		self._consumers: Dict[str, Dict[str, Any]] = {}
+		self._indexes: Dict[str, Any] = {}
+		# Unknown usernames and when that answer expires, in insertion (so expiry) order
+		self._not_found: Dict[str, float] = {}
+		self._loaded = False
+		# Invalidations by this worker, so a read that was in flight cannot store stale data
+		self._epoch = 0
+		self._invalidated: Dict[str, int] = {}
+		self._revision = 0
+		self._loaded_at: Optional[float] = None
+		self._hits = 0
+		self._misses = 0
+		self._not_found_hits = 0
+		self._reloads = 0
+		self._events = 0
+		self._last_error: Optional[str] = None
+
+	@property
+	def enabled(self) -> bool:
+		return self.mode != "off"
+
+	def _get_client(self) -> httpx.AsyncClient:
+		if self._client is None:
+			self._client = httpx.AsyncClient(timeout=self.timeout)
+		return self._client
+
+	async def get(self, username: str) -> Optional[Dict[str, Any]]:
+		"""Return the consumer's APISIX configuration, or None if it does not exist."""
+		if self._loaded:
+			consumer = self._consumers.get(username)
+			if consumer is not None:
+				self._hits += 1
+				return consumer
+		expires = self._not_found.get(username)
+		if expires is not None and expires > time.monotonic():
+			self._not_found_hits += 1
+			return None
+		self._misses += 1
+		epoch = self._epoch
+		consumer, index = await self._fetch(username)
+		if consumer is None:
+			if self.enabled:
+				self._store_not_found(username, epoch)
+		elif self._loaded:
+			self._store(username, consumer, index, epoch)
+		return consumer
+
+	def invalidate(self, *usernames: str) -> None:
+		"""Forget consumers this worker just wrote; safe to call from worker threads."""
+		self._epoch += 1
+		for username in usernames:
+			if username:
+				self._invalidated[username] = self._epoch
+				self._consumers.pop(username, None)
+				self._indexes.pop(username, None)
+				self._not_found.pop(username, None)
+
+	def _store_not_found(self, username: str, epoch: int) -> None:
+		if self.not_found_ttl <= 0 or self.not_found_max <= 0 or self._invalidated.get(username, -1) > epoch:
+			return
+		now = time.monotonic()
+		self._not_found.pop(username, None)
+		# Entries share one TTL, so the oldest are the first to expire
+		while self._not_found and (
+			len(self._not_found) >= self.not_found_max or next(iter(self._not_found.values())) <= now
+		):
+			del self._not_found[next(iter(self._not_found))]
+		self._not_found[username] = now + self.not_found_ttl
+
+	def _store(self, username: str, consumer: Optional[Dict[str, Any]], index: Any, epoch: int) -> None:
+		if self._invalidated.get(username, -1) > epoch:
+			# Written by this worker after the read started: the next lookup refetches
+			return
+		if consumer is None:
+			self._consumers.pop(username, None)
+			self._indexes.pop(username, None)
+		else:
+			self._consumers[username] = consumer
+			self._indexes[username] = index
+			self._not_found.pop(username, None)
+
+	async def _admin_get(self, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+		return await apisix_admin.get(path, params=params)
+
+	async def _fetch(self, username: str) -> Tuple[Optional[Dict[str, Any]], Any]:
+		response = await self._admin_get(f"/consumers/{username}")
+		if response.status_code == 404:
+			return None, None
+		if response.status_code != 200:
+			raise APISIXException(f"Status {response.status_code}: {response.text}")
+		data = response.json()
+		return data.get("value"), data.get("modifiedIndex")
+
+	async def _list(self) -> Dict[str, Tuple[Dict[str, Any], Any]]:
+		consumers: Dict[str, Tuple[Dict[str, Any], Any]] = {}
+		page = 1
+		while True:
+			response = await self._admin_get("/consumers", {"page": page, "page_size": self.page_size})
+			if response.status_code != 200:
+				raise APISIXException(f"Status {response.status_code}: {response.text}")
+			data = response.json()
+			# An empty listing is encoded as {} by APISIX
+			items = data.get("list") or []
+			for item in items:
+				value = item.get("value") or {}
+				if value.get("username"):
+					consumers[value["username"]] = (value, item.get("modifiedIndex"))
+			if not items or page * self.page_size >= int(data.get("total", 0)):
+				return consumers
+			page += 1
+
+	async def load(self) -> None:
+		"""Bring the cache in line with a full listing; unchanged entries are kept."""
+		epoch = self._epoch
+		# Read before listing, so the watch replays anything the listing may have missed
+		revision = await self._etcd_revision() if self.mode == "watch" else self._revision
+		listing = await self._list()
+		for username in self._consumers.keys() - listing.keys():
+			self._store(username, None, None, epoch)
+		changed = 0
+		for username, (consumer, index) in listing.items():
+			if username not in self._consumers or self._indexes.get(username) != index:
+				self._store(username, consumer, index, epoch)
+				changed += 1
+		self._invalidated = {u: e for u, e in self._invalidated.items() if e > epoch}
+		self._revision = revision
+		self._loaded = True
+		self._loaded_at = time.time()
+		self._reloads += 1
+		if changed:
+			logger.info(f"Consumer cache: {changed} consumers loaded or changed, {len(self._consumers)} cached")
+
+	async def _etcd_post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+		try:
+			response = await self._get_client().post(f"{self.etcd_url}{path}", json=payload)
+		except httpx.HTTPError as e:
+			raise APISIXException(f"etcd connection error: {str(e)}")
+		if response.status_code != 200:
+			raise APISIXException(f"etcd status {response.status_code}: {response.text}")
+		return response.json()
+
+	async def _etcd_revision(self) -> int:
+		data = await self._etcd_post("/v3/kv/range", {
+			"key": _b64(self.consumers_key),
+			"range_end": _b64(_range_end(self.consumers_key)),
+			"count_only": True
+		})
+		return int(data["header"]["revision"])
+
+	async def watch(self) -> None:
+		"""Apply etcd changes under the consumers prefix until the stream ends or fails."""
+		request = {"create_request": {
+			"key": _b64(self.consumers_key),
+			"range_end": _b64(_range_end(self.consumers_key)),
+			"start_revision": self._revision + 1
+		}}
+		try:
+			async with self._get_client().stream(
+				"POST", f"{self.etcd_url}/v3/watch", json=request,
+				timeout=httpx.Timeout(self.timeout, read=None)
+			) as response:
+				if response.status_code != 200:
+					raise APISIXException(f"etcd status {response.status_code}")
+				async for line in response.aiter_lines():
+					if not line.strip():
+						continue
+					message = json.loads(line)
+					if "error" in message:
+						raise APISIXException(f"etcd watch error: {message['error']}")
+					result = message.get("result") or {}
+					if int(result.get("compact_revision", 0)) > 0:
+						# The revisions we missed are compacted away: start over from a listing
+						logger.warning("Consumer cache: etcd history compacted, reloading")
+						await self.load()
+						return
+					for event in result.get("events", []):
+						await self._apply(event)
+		except httpx.HTTPError as e:
+			raise APISIXException(f"etcd connection error: {str(e)}")
+
+	async def _apply(self, event: Dict[str, Any]) -> None:
+		kv = event.get("kv") or {}
+		key = base64.b64decode(kv.get("key", "")).decode("utf-8")
+		username = key[len(self.consumers_key):]
+		if username and "/" not in username:
+			epoch = self._epoch
+			if event.get("type") == "DELETE":
+				self._store(username, None, None, epoch)
+			else:
+				consumer, index = await self._fetch(username)
+				self._store(username, consumer, index, epoch)
+			self._events += 1
+		# Only advanced once applied, so a failed event is replayed on reconnect
+		self._revision = max(self._revision, int(kv.get("mod_revision", 0)))
+
+	async def run(self) -> None:
+		"""Background task body: the first load, then one poll or one watch session."""
+		try:
+			if self.mode == "poll" or not self._loaded:
+				await self.load()
+			if self.mode == "watch":
+				await self.watch()
+			self._last_error = None
+		except Exception as e:
+			self._last_error = str(e)
+			raise
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"mode": self.mode,
+			"loaded": self._loaded,
+			"size": len(self._consumers),
+			"hits": self._hits,
+			"misses": self._misses,
+			"not_found": len(self._not_found),
+			"not_found_hits": self._not_found_hits,
+			"reloads": self._reloads,
+			"watch_events": self._events,
+			"revision": self._revision,
+			"loaded_at": self._loaded_at,
+			"last_error": self._last_error,
+		}
+
+	async def close(self) -> None:
+		client, self._client = self._client, None
+		if client is not None:
+			await client.aclose()
+
+
+consumer_cache = ConsumerCache(
+	mode=settings.CONSUMER_CACHE_MODE,
+	etcd_url=settings.ETCD_URL,
+	etcd_prefix=settings.ETCD_PREFIX,
+	page_size=settings.CONSUMER_CACHE_PAGE_SIZE,
+	not_found_ttl=settings.CONSUMER_CACHE_NOT_FOUND_SECONDS,
+	not_found_max=settings.CONSUMER_CACHE_NOT_FOUND_MAX,
+)
+
+if consumer_cache.enabled:
+	# Poll mode runs a listing per interval; watch mode reconnects after the interval
+	background.register(background.PeriodicTask(
+		"consumer-cache",
+		settings.CONSUMER_CACHE_POLL_SECONDS if consumer_cache.mode == "poll" else settings.CONSUMER_CACHE_RETRY_SECONDS,
+		consumer_cache.run,
+		run_immediately=True
+	))
+background.on_shutdown(consumer_cache.close)
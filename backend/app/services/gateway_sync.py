@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import APISIXException
+from app.services.apisix_client import apisix_admin
+from app.services.profile_catalogue import profile_catalogue
+
+logger = logging.getLogger(__name__)
+
+# Resource kinds the spec can hold, in the order they are written; deletes go the
+# other way round, so a route never points at an upstream or group that is missing
+KINDS = ("upstreams", "consumer_groups", "routes")
+_PHASES = (
+	("put", ("upstreams", "consumer_groups")),
+	("put", ("routes",)),
+	("delete", ("routes",)),
+	("delete", ("upstreams", "consumer_groups")),
+)
+
+# Set by APISIX on every object, never part of a spec
+SERVER_FIELDS = frozenset({"id", "create_time", "update_time"})
+# Values APISIX fills in when the object leaves them out
+DEFAULTS: Dict[str, Dict[str, Any]] = {
+	"upstreams": {"type": "roundrobin", "scheme": "http", "pass_host": "pass", "hash_on": "vars"},
+	"consumer_groups": {},
+	"routes": {"priority": 0, "status": 1},
+}
+
+_MISSING = object()
+
+
+def changed_fields(kind: str, desired: Dict[str, Any], live: Dict[str, Any]) -> List[str]:
+	"""Top-level fields in which a live object differs from its spec; empty if it is up to date.
+
+	A field the spec leaves out matches when the live value is APISIX's default
+	for it. Plugins must be the same set, but each plugin's config is compared
+	only on the keys the spec sets, as APISIX stores every plugin with its
+	schema defaults filled in.
+	"""
+	defaults = DEFAULTS[kind]
+	fields = []
+	for key in sorted((desired.keys() | live.keys()) - SERVER_FIELDS):
+		want = desired.get(key, defaults.get(key, _MISSING))
+		have = live.get(key, defaults.get(key, _MISSING))
+		if key == "plugins" and isinstance(want, dict) and isinstance(have, dict):
+			if want.keys() != have.keys() or any(
+				not isinstance(have[name], dict)
+				or any(have[name].get(k, _MISSING) != v for k, v in (config or {}).items())
+				for name, config in want.items()
+			):
+				fields.append(key)
+		elif want != have:
+			fields.append(key)
+	return fields
+
+
+class Operation:
+	"""One admin write of a plan; `error` is set if it failed when applied."""
+
+	def __init__(
+		self,
+		method: str,
+		kind: str,
+		object_id: str,
+		fields: Optional[List[str]] = None,
+		body: Optional[Dict[str, Any]] = None
+	):
+		self.method = method
+		self.kind = kind
+		self.id = object_id
+		self.fields = fields or []
+		self.body = body
+		self.error: Optional[str] = None
+
+	def to_dict(self) -> Dict[str, Any]:
+		return {"method": self.method, "kind": self.kind, "id": self.id, "fields": self.fields, "error": self.error}
+
+
+class GatewaySyncService:
+	"""Bring APISIX routes, upstreams and consumer groups in line with a declarative spec.
+
+	The spec maps each kind to {id: object} in the admin API's own format, e.g.
+	{"upstreams": {"backend": {"nodes": {"backend:8000": 1}}}, "routes": {...}}.
+	Every kind present in the spec is owned by it: live objects that differ are
+	PUT, missing ones created and (unless delete is False) objects the spec does
+	not list are deleted. Kinds left out of the spec are not touched. Objects
+	that already match are not written, so a re-run with no changes sends no
+	write at all.
+
+	Writes go in dependency phases (upstreams and groups, then routes, then route
+	deletes, then upstream and group deletes), each phase in parallel with up to
+	GATEWAY_SYNC_CONCURRENCY requests; a phase with a failed operation stops the
+	ones after it.
+	"""
+
+	def __init__(self, spec: Dict[str, Any], delete: bool = True, concurrency: Optional[int] = None):
+		unknown = set(spec) - set(KINDS)
+		if unknown:
+			raise ValueError(f"Unknown resource kinds in spec: {', '.join(sorted(unknown))}")
+		self.spec = spec
+		self.delete = delete
+		self.concurrency = concurrency or settings.GATEWAY_SYNC_CONCURRENCY
+
+	@staticmethod
+	async def list_live(kind: str) -> Dict[str, Dict[str, Any]]:
+		"""Every object of a kind in APISIX, by id."""
+		response = await apisix_admin.get(f"/{kind}")
+		if response.status_code != 200:
+			raise APISIXException(f"Listing {kind}: status {response.status_code}: {response.text}")
+		objects = {}
+		# An empty listing is encoded as {} by APISIX
+		for item in response.json().get("list") or []:
+			if isinstance(item, dict) and "value" in item:
+				objects[item.get("key", "").split("/")[-1]] = item["value"]
+		return objects
+
+	@classmethod
+	async def export(cls, kinds: Tuple[str, ...] = KINDS) -> Dict[str, Any]:
+		"""The live state as a spec, e.g. to start one from what the dashboard holds."""
+		lists = await asyncio.gather(*(cls.list_live(kind) for kind in kinds))
+		return {
+			kind: {
+				object_id: {k: v for k, v in value.items() if k not in SERVER_FIELDS}
+				for object_id, value in sorted(objects.items())
+			}
+			for kind, objects in zip(kinds, lists)
+		}
+
+	async def plan(self) -> List[Operation]:
+		"""The PUTs and DELETEs that would make APISIX match the spec, in phase order."""
+		kinds = [kind for kind in KINDS if kind in self.spec]
+		lists = dict(zip(kinds, await asyncio.gather(*(self.list_live(kind) for kind in kinds))))
+		operations = []
+		for method, phase_kinds in _PHASES:
+			for kind in phase_kinds:
+				if kind not in lists:
+					continue
+				desired, live = self.spec[kind] or {}, lists[kind]
+				if method == "put":
+					for object_id in sorted(desired):
+						body = {k: v for k, v in desired[object_id].items() if k not in SERVER_FIELDS}
+						if object_id not in live:
+							operations.append(Operation("put", kind, object_id, ["(new)"], body))
+						elif fields := changed_fields(kind, body, live[object_id]):
+							operations.append(Operation("put", kind, object_id, fields, body))
+				elif self.delete:
+					operations.extend(
+						Operation("delete", kind, object_id) for object_id in sorted(live.keys() - desired.keys())
+					)
+		return operations
+
+	async def _apply_one(self, operation: Operation, semaphore: asyncio.Semaphore) -> None:
+		path = f"/{operation.kind}/{operation.id}"
+		async with semaphore:
+			try:
+				if operation.method == "put":
+					response = await apisix_admin.put(path, json=operation.body)
+					ok = response.status_code in (200, 201)
+				else:
+					response = await apisix_admin.delete(path)
+					# Already gone counts as done
+					ok = response.status_code in (200, 404)
+				if not ok:
+					operation.error = f"Status {response.status_code}: {response.text}"
+			except Exception as e:
+				operation.error = str(e)
+		if operation.error:
+			logger.warning(f"Gateway sync {operation.method.upper()} {path} failed: {operation.error}")
+
+	async def apply(self, operations: List[Operation]) -> bool:
+		"""Carry out a plan phase by phase; False if an operation failed (later phases are skipped)."""
+		semaphore = asyncio.Semaphore(self.concurrency)
+		try:
+			for method, phase_kinds in _PHASES:
+				phase = [op for op in operations if op.method == method and op.kind in phase_kinds]
+				await asyncio.gather(*(self._apply_one(op, semaphore) for op in phase))
+				if any(op.error for op in phase):
+					return False
+			return True
+		finally:
+			if any(op.kind == "consumer_groups" for op in operations):
+				profile_catalogue.invalidate()
+
+	async def sync(self, dry_run: bool = True) -> Dict[str, Any]:
+		"""Plan and, unless dry_run, apply; returns the operations and their outcome."""
+		operations = await self.plan()
+		applied = None if dry_run else await self.apply(operations)
+		return {
+			"dry_run": dry_run,
+			"operations": [op.to_dict() for op in operations],
+			"puts": sum(1 for op in operations if op.method == "put"),
+			"deletes": sum(1 for op in operations if op.method == "delete"),
+			"failed": sum(1 for op in operations if op.error),
+			"applied": applied,
+		}
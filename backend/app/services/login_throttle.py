@@ -1,37 +1,78 @@
-from datetime import datetime, timedelta
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
 from typing import Optional
 
 from app.repositories.login_attempt import LoginAttemptRepository
+from app.services.throttle_store import ThrottleStore
 from app.core.config import settings
+from app.core import background
+from app.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class AttemptLogWriter:
+    """Buffers raw login attempts in memory and writes them in batches off the request path."""
+
+    def __init__(self, max_pending: int, batch_size: int):
+        # Oldest entries are dropped when the buffer is full: the log is best-effort
+        self.pending = deque(maxlen=max_pending)
+        self.batch_size = batch_size
+
+    def enqueue(self, username: str, ip: str, success: bool) -> None:
+        self.pending.append((username, ip, datetime.now(), success))
+
+    def flush(self) -> None:
+        while self.pending:
+            batch = []
+            while self.pending and len(batch) < self.batch_size:
+                batch.append(self.pending.popleft())
+            try:
+                with get_db() as conn:
+                    repo = LoginAttemptRepository(conn)
+                    repo.record_attempts(batch)
+                    repo.commit()
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} login attempts: {str(e)}")
+                return
+
+
+attempt_log = AttemptLogWriter(
+    max_pending=settings.LOGIN_ATTEMPT_LOG_MAX_PENDING,
+    batch_size=settings.LOGIN_ATTEMPT_LOG_BATCH_SIZE,
+)
+
+if settings.LOGIN_ATTEMPT_LOG_ENABLED:
+    async def _flush_attempt_log() -> None:
+        await asyncio.to_thread(attempt_log.flush)
+
+    background.register(background.PeriodicTask(
+        "login-attempt-log", settings.LOGIN_ATTEMPT_LOG_FLUSH_SECONDS, _flush_attempt_log
+    ))
+    background.on_shutdown(_flush_attempt_log)
 
 
 class LoginThrottleService:
     """Service implementing login attempt limiting per (username, ip)."""
 
-    def __init__(self, repo: LoginAttemptRepository):
-        self.repo = repo
+    def __init__(self, store: ThrottleStore):
+        self.store = store
 
     def is_locked(self, username: str, ip: str) -> Optional[datetime]:
-        return self.repo.get_lock_until(username, ip)
+        return self.store.get_lock_until(username, ip)
 
     def register_failure_and_lock_if_needed(self, username: str, ip: str) -> Optional[datetime]:
-        now = datetime.now()
-        window_since = now - timedelta(minutes=settings.LOGIN_WINDOW_MINUTES)
-
-        # Count current failures in window
-        failures = self.repo.get_failed_count(username, ip, window_since)
-
-        # Record this failure
-        self.repo.record_attempt(username, ip, success=False)
-
-        # If this failure reaches the threshold, set lock
-        if failures + 1 >= settings.LOGIN_MAX_ATTEMPTS:
-            locked_until = now + timedelta(minutes=settings.LOGIN_LOCKOUT_MINUTES)
-            self.repo.set_lock_until(username, ip, locked_until)
-            return locked_until
-        return None
+        _, locked_until = self.store.register_failure(username, ip)
+        self._log(username, ip, success=False)
+        return locked_until
 
     def on_success(self, username: str, ip: str) -> None:
-        # Record success and clear any existing lock
-        self.repo.record_attempt(username, ip, success=True)
-        self.repo.clear_lock(username, ip)
+        # Clear the counter (and any lock)
+        self.store.reset(username, ip)
+        self._log(username, ip, success=True)
+
+    def _log(self, username: str, ip: str, success: bool) -> None:
+        if settings.LOGIN_ATTEMPT_LOG_ENABLED:
+            attempt_log.enqueue(username, ip, success)
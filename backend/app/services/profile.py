@@ -1,6 +1,7 @@
 from typing import List, Dict, Any
 
 from app.services.consumer_group import ConsumerGroupService
+from app.services.profile_catalogue import profile_catalogue
 from app.schemas.profile import Profile, ProfileCreate, ProfileUpdate
 from app.core.exceptions import ProfileNotFoundException, ProfileAlreadyExistsException, DatabaseException
 
@@ -14,7 +15,7 @@ class ProfileService:
 	async def create_profile(self, profile_data: ProfileCreate) -> Profile:
 		"""Create a new profile using Consumer Groups."""
 		# Check if profile group already exists
-		existing_group = self.consumer_group_service.get_consumer_group(profile_data.u_type)
+		existing_group = await self.consumer_group_service.get_consumer_group(profile_data.u_type)
 		if existing_group:
 			# Check if it's a profile group (has limit-count plugin)
 			if "limit-count" in existing_group.get("plugins", {}):
@@ -25,7 +26,7 @@ class ProfileService:
 		
 		try:
 			# Create consumer group
-			success = self.consumer_group_service.create_profile_group(
+			success = await self.consumer_group_service.create_profile_group(
 				u_type=profile_data.u_type,
 				count=profile_data.count,
 				time_window=profile_data.time_window,
@@ -39,7 +40,7 @@ class ProfileService:
 				raise DatabaseException("Failed to create consumer group")
 			
 			# Return created profile
-			created_group = self.consumer_group_service.get_consumer_group(profile_data.u_type)
+			created_group = await self.consumer_group_service.get_consumer_group(profile_data.u_type)
 			if not created_group:
 				raise DatabaseException("Failed to retrieve created group")
 			
@@ -62,37 +63,19 @@ class ProfileService:
 			raise e
 	
 	async def get_profile(self, profile_id: str) -> Profile:
-		"""Get a profile by ID (u_type)."""
-		# Convert ID to string for group lookup
-		u_type = profile_id
-		
-		group = self.consumer_group_service.get_consumer_group(u_type)
-		if not group:
+		"""Get a profile by ID (u_type), from the profile catalogue."""
+		profile = await profile_catalogue.get_profile(profile_id)
+		# Only groups with the limit-count plugin are profiles
+		if not profile:
 			raise ProfileNotFoundException(profile_id)
-		
-		# Check if it has limit-count plugin (is a profile group)
-		plugins = group.get("plugins", {})
-		if "limit-count" not in plugins:
-			raise ProfileNotFoundException(profile_id)
-		
-		limit_config = plugins["limit-count"]
-		return Profile(
-			id=u_type,
-			u_type=u_type,
-			count=limit_config.get("count", 0),
-			time_window=limit_config.get("time_window", 60),
-			rejected_code=limit_config.get("rejected_code", 429),
-			rejected_msg=limit_config.get("rejected_msg", "Rate limit exceeded"),
-			policy=limit_config.get("policy", "local"),
-			show_limit_quota_header=limit_config.get("show_limit_quota_header", True)
-		)
+		return Profile(**profile)
 	
 	async def update_profile(self, profile_id: str, profile_update: ProfileUpdate) -> Profile:
 		"""Update a profile."""
 		u_type = profile_id
 		
 		# Get existing group
-		existing_group = self.consumer_group_service.get_consumer_group(u_type)
+		existing_group = await self.consumer_group_service.get_consumer_group(u_type)
 		if not existing_group:
 			raise ProfileNotFoundException(profile_id)
 		
@@ -121,7 +104,7 @@ class ProfileService:
 				new_u_type = None
 
 			# Update group
-			success = self.consumer_group_service.update_profile_group(
+			success = await self.consumer_group_service.update_profile_group(
 				u_type=u_type,
 				new_group_name=new_u_type,
 				count=count,
@@ -145,13 +128,13 @@ class ProfileService:
 		u_type = profile_id
 		
 		# Check if group exists
-		group = self.consumer_group_service.get_consumer_group(u_type)
+		group = await self.consumer_group_service.get_consumer_group(u_type)
 		if not group:
 			raise ProfileNotFoundException(profile_id)
 		
 		try:
 			# Delete consumer group
-			success = self.consumer_group_service.delete_consumer_group(u_type)
+			success = await self.consumer_group_service.delete_consumer_group(u_type)
 			
 			if not success:
 				raise DatabaseException("Failed to delete consumer group")
@@ -162,8 +145,8 @@ class ProfileService:
 			raise e
 	
 	async def list_profiles(self) -> List[Profile]:
-		"""List all profiles."""
-		profile_groups = self.consumer_group_service.get_profile_groups()
+		"""List all profiles (from the profile catalogue)."""
+		profile_groups = await profile_catalogue.profiles()
 		
 		profiles = []
 		for group_data in profile_groups:
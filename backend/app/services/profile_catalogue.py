@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import APISIXException
+from app.core import background
+from app.services.apisix_client import apisix_admin
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_KEY = "catalogue"
+
+
+def profile_from_group(group_id: str, group: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+	"""Profile view of a consumer group (its parsed limit-count config); None if it is not a profile."""
+	limit_config = (group.get("plugins") or {}).get("limit-count")
+	if limit_config is None:
+		return None
+	return {
+		"id": group_id,
+		"u_type": group_id,
+		"count": limit_config.get("count", 0),
+		"time_window": limit_config.get("time_window", 60),
+		"rejected_code": limit_config.get("rejected_code", 429),
+		"rejected_msg": limit_config.get("rejected_msg", "Rate limit exceeded"),
+		"policy": limit_config.get("policy", "local"),
+		"show_limit_quota_header": limit_config.get("show_limit_quota_header", True)
+	}
+
+
+class ProfileCatalogue:
+	"""In-process copy of the APISIX consumer groups and the profiles they define.
+
+	The whole catalogue is one entry of a TTLCache: it is loaded at startup,
+	reloaded in the background every PROFILE_CATALOGUE_REFRESH_SECONDS, and dropped
+	by every consumer group write of this worker (ConsumerGroupService), so the next
+	read lists the groups again. PROFILE_CATALOGUE_TTL_SECONDS bounds how stale it
+	can get when the background reload fails; writes by other processes show up
+	within the refresh interval. A name the catalogue does not hold is looked up in
+	the admin API, so a group created elsewhere is found at once.
+	"""
+
+	def __init__(self, cache: TTLCache):
+		self.cache = cache
+		self._lock = asyncio.Lock()
+		self._loads = 0
+		self._lookups = 0
+		self._loaded_at: Optional[float] = None
+		self._sizes = (0, 0)
+		self._last_error: Optional[str] = None
+
+	async def _list(self) -> Dict[str, Dict[str, Any]]:
+		response = await apisix_admin.get("/consumer_groups")
+		if response.status_code != 200:
+			raise APISIXException(f"Status {response.status_code}: {response.text}")
+		groups = {}
+		# An empty listing is encoded as {} by APISIX
+		for item in response.json().get("list") or []:
+			if isinstance(item, dict) and "value" in item:
+				group_id = item.get("key", "").split("/")[-1]
+				groups[group_id] = item["value"]
+		return groups
+
+	async def load(self) -> Dict[str, Any]:
+		"""List the groups now and store the result (unless a write invalidated it meanwhile)."""
+		version = self.cache.version()
+		try:
+			groups = await self._list()
+		except Exception as e:
+			self._last_error = str(e)
+			raise
+		catalogue = {
+			"groups": groups,
+			"profiles": {
+				group_id: profile
+				for group_id, group in groups.items()
+				if (profile := profile_from_group(group_id, group)) is not None
+			},
+		}
+		self.cache.set(_KEY, catalogue, version=version)
+		self._loads += 1
+		self._loaded_at = time.time()
+		self._sizes = (len(groups), len(catalogue["profiles"]))
+		self._last_error = None
+		return catalogue
+
+	async def snapshot(self) -> Dict[str, Any]:
+		"""The current catalogue: {"groups": {id: group}, "profiles": {id: profile}}."""
+		catalogue = self.cache.get(_KEY)
+		if catalogue is not None:
+			return catalogue
+		# One listing for all the readers that found the catalogue missing
+		async with self._lock:
+			catalogue = self.cache.get(_KEY)
+			if catalogue is not None:
+				return catalogue
+			return await self.load()
+
+	async def _fetch_group(self, group_id: str) -> Optional[Dict[str, Any]]:
+		self._lookups += 1
+		response = await apisix_admin.get(f"/consumer_groups/{group_id}")
+		if response.status_code == 404:
+			return None
+		if response.status_code != 200:
+			raise APISIXException(f"Status {response.status_code}: {response.text}")
+		return response.json().get("value")
+
+	async def get_group(self, group_id: str) -> Optional[Dict[str, Any]]:
+		"""A consumer group by name, or None if APISIX has no such group."""
+		if self.cache.enabled:
+			group = (await self.snapshot())["groups"].get(group_id)
+			if group is not None:
+				return group
+		return await self._fetch_group(group_id)
+
+	async def get_profile(self, u_type: str) -> Optional[Dict[str, Any]]:
+		"""The profile of a user type, or None if there is no such profile group."""
+		if self.cache.enabled:
+			profile = (await self.snapshot())["profiles"].get(u_type)
+			if profile is not None:
+				return profile
+		group = await self._fetch_group(u_type)
+		return profile_from_group(u_type, group) if group is not None else None
+
+	async def profiles(self) -> List[Dict[str, Any]]:
+		"""Every profile group, parsed."""
+		catalogue = await self.snapshot() if self.cache.enabled else await self.load()
+		return list(catalogue["profiles"].values())
+
+	def invalidate(self) -> None:
+		"""Drop the catalogue after a consumer group write; the next read lists again."""
+		self.cache.invalidate(_KEY)
+
+	async def refresh(self) -> None:
+		"""Background task body."""
+		if self.cache.enabled:
+			await self.load()
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			**self.cache.stats(),
+			"groups": self._sizes[0],
+			"profiles": self._sizes[1],
+			"loads": self._loads,
+			"admin_lookups": self._lookups,
+			"loaded_at": self._loaded_at,
+			"last_error": self._last_error,
+		}
+
+
+profile_catalogue = ProfileCatalogue(
+	TTLCache("profile_catalogue", 1, settings.PROFILE_CATALOGUE_TTL_SECONDS)
+)
+
+background.register(background.PeriodicTask(
+	"profile-catalogue", settings.PROFILE_CATALOGUE_REFRESH_SECONDS, profile_catalogue.refresh, run_immediately=True
+))
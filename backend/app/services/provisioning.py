@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import random
+from typing import Any, Dict, List, Optional
+
+from app.repositories.provisioning import ProvisioningOutboxRepository
+from app.repositories.user import UserRepository
+from app.services.apisix import APISIXService
+from app.core.config import settings
+from app.core import background
+from app.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+
+class ProvisioningWorker:
+	"""Creates the APISIX consumers of newly registered users from the provisioning outbox.
+
+	Registration commits the user (provision_state 'provisioning') and its outbox
+	row in one transaction and returns; the consumer is created here, so an APISIX
+	outage delays logins of new accounts instead of failing registrations. Rows are
+	claimed with SELECT ... FOR UPDATE SKIP LOCKED and leased, so several workers
+	(or processes) never work on the same row at once, and a row whose worker died
+	is picked up again when its lease runs out.
+
+	The consumer PUT is idempotent; on a retry the consumer is read first and left
+	alone if it already carries this registration's secret. Failures are retried
+	with capped exponential backoff until they succeed. A user deleted while its
+	consumer was being created has the consumer removed again.
+	"""
+
+	def __init__(
+		self,
+		batch_size: int,
+		concurrency: int,
+		lease_seconds: float,
+		backoff_seconds: float,
+		max_backoff_seconds: float
+	):
+		self.batch_size = batch_size
+		self.concurrency = concurrency
+		self.lease_seconds = lease_seconds
+		self.backoff_seconds = backoff_seconds
+		self.max_backoff_seconds = max_backoff_seconds
+		self.apisix_service = APISIXService()
+		self._provisioned = 0
+		self._failures = 0
+		self._orphans_removed = 0
+		self._last_error: Optional[str] = None
+
+	def _claim(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
+		with get_db() as conn:
+			repo = ProvisioningOutboxRepository(conn)
+			try:
+				rows = repo.claim(self.batch_size, self.lease_seconds, user_id)
+				repo.commit()
+				return rows
+			finally:
+				repo.close()
+
+	def _complete(self, row: Dict[str, Any]) -> bool:
+		"""True if the user is now ready; False if it no longer exists."""
+		with get_db() as conn:
+			repo = ProvisioningOutboxRepository(conn)
+			users = UserRepository(repo.uow)
+			try:
+				completed = repo.complete(row["id"], row["user_id"])
+				repo.commit()
+				# Without the row: deleted with its user, or completed by another worker
+				return completed or users.get_by_id(row["user_id"]) is not None
+			finally:
+				repo.close()
+
+	def _retry_later(self, row: Dict[str, Any], error: str) -> None:
+		delay = min(self.max_backoff_seconds, self.backoff_seconds * (2 ** (row["attempts"] - 1)))
+		with get_db() as conn:
+			repo = ProvisioningOutboxRepository(conn)
+			try:
+				repo.retry_later(row["id"], random.uniform(delay / 2, delay), error)
+				repo.commit()
+			finally:
+				repo.close()
+
+	async def _already_applied(self, row: Dict[str, Any]) -> bool:
+		consumer = await self.apisix_service.get_consumer_by_username(row["username"])
+		if consumer is None:
+			return False
+		secret = (consumer.get("plugins") or {}).get("jwt-auth", {}).get("secret")
+		return secret == row["secret_hash"] and consumer.get("group_id") == row["u_type"]
+
+	async def _provision(self, row: Dict[str, Any]) -> bool:
+		try:
+			# A first attempt always writes: an old consumer of the same name must not survive
+			if row["attempts"] == 1 or not await self._already_applied(row):
+				await self.apisix_service.put_consumer(row["username"], row["secret_hash"], row["u_type"])
+		except Exception as e:
+			self._failures += 1
+			self._last_error = str(e)
+			logger.warning(f"Provisioning consumer {row['username']} failed (attempt {row['attempts']}): {str(e)}")
+			await asyncio.to_thread(self._retry_later, row, str(e))
+			return False
+
+		if not await asyncio.to_thread(self._complete, row):
+			logger.info(f"User {row['username']} was deleted during provisioning, removing its consumer")
+			await self.apisix_service.delete_consumer(row["username"])
+			self._orphans_removed += 1
+			return False
+		self._provisioned += 1
+		return True
+
+	async def _provision_all(self, rows: List[Dict[str, Any]]) -> int:
+		semaphore = asyncio.Semaphore(self.concurrency)
+
+		async def provision(row: Dict[str, Any]) -> bool:
+			async with semaphore:
+				try:
+					return await self._provision(row)
+				except Exception as e:
+					# The lease runs out and the row is retried
+					logger.error(f"Provisioning consumer {row['username']} failed: {str(e)}")
+					return False
+
+		return sum(await asyncio.gather(*(provision(row) for row in rows)))
+
+	async def run_once(self) -> int:
+		"""Provision every due entry, a batch at a time; returns how many consumers were created."""
+		provisioned = 0
+		while True:
+			rows = await asyncio.to_thread(self._claim)
+			if not rows:
+				return provisioned
+			provisioned += await self._provision_all(rows)
+			if len(rows) < self.batch_size:
+				return provisioned
+
+	async def provision_user(self, user_id: int) -> bool:
+		"""Provision one user now (e.g. a federated login that needs its consumer at once).
+
+		Returns False if the attempt failed or another worker holds the entry; True
+		if the consumer was created or the user had no pending entry.
+		"""
+		rows = await asyncio.to_thread(self._claim, user_id)
+		if not rows:
+			return True
+		return await self._provision_all(rows) == len(rows)
+
+	def stats(self) -> Dict[str, Any]:
+		return {
+			"provisioned": self._provisioned,
+			"failures": self._failures,
+			"orphans_removed": self._orphans_removed,
+			"last_error": self._last_error,
+		}
+
+	def backlog(self) -> Dict[str, Any]:
+		with get_db() as conn:
+			repo = ProvisioningOutboxRepository(conn)
+			try:
+				return repo.backlog()
+			finally:
+				repo.close()
+
+
+provisioning_worker = ProvisioningWorker(
+	batch_size=settings.PROVISIONING_BATCH_SIZE,
+	concurrency=settings.PROVISIONING_CONCURRENCY,
+	lease_seconds=settings.PROVISIONING_LEASE_SECONDS,
+	backoff_seconds=settings.PROVISIONING_BACKOFF_SECONDS,
+	max_backoff_seconds=settings.PROVISIONING_MAX_BACKOFF_SECONDS,
+)
+
+background.register(background.PeriodicTask(
+	"provisioning-outbox", settings.PROVISIONING_POLL_SECONDS, provisioning_worker.run_once, run_immediately=True
+))
@@ -0,0 +1,402 @@
+import asyncio
+import heapq
+import logging
+import secrets
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.repositories.user import UserRepository
+from app.repositories.reconcile import ReconcileRunRepository, FULL, INCREMENTAL
+from app.repositories.provisioning import PROVISIONING
+from app.services.apisix import APISIXService
+from app.schemas.consumer import ConsumerCreate
+from app.core.config import settings
+from app.core.exceptions import APISIXException, ReconcileInProgressException
+from app.db.database import get_db
+from app.utils.external_sort import ExternalSorter
+
+logger = logging.getLogger(__name__)
+
+MISSING_CONSUMER = "missing_consumer"
+ORPHAN_CONSUMER = "orphan_consumer"
+GROUP_MISMATCH = "group_mismatch"
+KINDS = (MISSING_CONSUMER, ORPHAN_CONSUMER, GROUP_MISMATCH)
+
+
+def merge_join(
+	users: Iterator[Dict[str, Any]],
+	consumers: Iterator[Dict[str, Any]]
+) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+	"""Pair two streams sorted by username: yields (username, user or None, consumer or None)."""
+	tagged = heapq.merge(
+		((user["username"], 0, user) for user in users),
+		((consumer["username"], 1, consumer) for consumer in consumers),
+		key=itemgetter(0, 1)
+	)
+	for username, group in groupby(tagged, key=itemgetter(0)):
+		sides: List[Optional[Dict[str, Any]]] = [None, None]
+		for _, side, record in group:
+			sides[side] = record
+		yield username, sides[0], sides[1]
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+	return value.timestamp() if value else 0
+
+
+class ReconcileReport:
+	"""What a run found and repaired: counts per kind and a bounded sample of discrepancies."""
+
+	def __init__(self, sample_size: int):
+		self.sample_size = sample_size
+		self.users = 0
+		self.consumers = 0
+		self.skipped = 0
+		self.lookup_failures = 0
+		self.spilled_runs = 0
+		self.found = dict.fromkeys(KINDS, 0)
+		self.repaired = dict.fromkeys(KINDS, 0)
+		self.failed = dict.fromkeys(KINDS, 0)
+		self.samples: List[Dict[str, Any]] = []
+		self.orphan_repair = True
+		self.error: Optional[str] = None
+
+	def record(self, discrepancy: Dict[str, Any]) -> None:
+		self.found[discrepancy["kind"]] += 1
+		if len(self.samples) < self.sample_size:
+			# Kept by reference: the repair outcome shows up in the sample
+			self.samples.append(discrepancy)
+
+	def to_dict(self) -> Dict[str, Any]:
+		return {
+			"users": self.users,
+			"consumers": self.consumers,
+			"skipped_recent": self.skipped,
+			"lookup_failures": self.lookup_failures,
+			"spilled_runs": self.spilled_runs,
+			"found": self.found,
+			"repaired": self.repaired,
+			"failed": self.failed,
+			"samples": self.samples,
+			"orphan_repair": self.orphan_repair,
+			"error": self.error,
+		}
+
+
+class ReconciliationService:
+	"""Finds, and unless dry_run repairs, drift between MySQL users and APISIX consumers.
+
+	A full run reads users in id-ordered keyset batches and consumers in admin API
+	pages into two external sorters keyed by username, then merge-joins the sorted
+	streams: memory is bounded by RECONCILE_RUN_SIZE, not by the number of accounts.
+	Users are read before consumers. A new user's consumer is created after the user
+	commits, by the provisioning worker; until then the user is in provision_state
+	'provisioning' and skipped, so a ready user without consumer is real drift.
+
+	An incremental run reads only users updated since the last completed repairing
+	run and looks their consumers up one by one. It cannot see consumers whose user
+	is gone; full runs find those.
+
+	- missing_consumer: repaired by creating the consumer in the user's group with a
+	  random secret. Passwords exist only in APISIX, so the user gets back in through
+	  password recovery.
+	- orphan_consumer: a consumer without user (e.g. a user deleted from the database
+	  directly); repaired by deleting it. Service consumers have no user either, so
+	  orphans are only deleted once RECONCILE_IGNORE_CONSUMERS lists them; while the
+	  list is empty orphans are reported and left alone.
+	- group_mismatch: the consumer's group_id differs from u_type; repaired by
+	  setting the group from the database.
+
+	Accounts created or changed within RECONCILE_GRACE_SECONDS before the run may be
+	halfway through a write and are skipped, as are users still being provisioned.
+	Before a consumer is created or deleted the other side is read again. Repairs
+	run on RECONCILE_CONCURRENCY workers fed by a bounded queue.
+	"""
+
+	def __init__(self, dry_run: bool = True, incremental: bool = False):
+		self.dry_run = dry_run
+		self.incremental = incremental
+		self.since: Optional[datetime] = None
+		self.apisix_service = APISIXService()
+		self.batch_size = settings.RECONCILE_BATCH_SIZE
+		self.concurrency = settings.RECONCILE_CONCURRENCY
+		self.ignored = set(settings.RECONCILE_IGNORE_CONSUMERS) | {settings.CRUD_ADMIN}
+		self.report = ReconcileReport(settings.RECONCILE_SAMPLE_SIZE)
+		self.report.orphan_repair = bool(settings.RECONCILE_IGNORE_CONSUMERS)
+		self.cutoff = 0.0
+
+	async def begin(self) -> int:
+		"""Record the run, unless one is running already (in any process); returns its id.
+
+		One run at a time, as a run competes with logins for the admin API. An
+		incremental run without a watermark (no completed repairing run yet) is
+		carried out as a full run.
+		"""
+		run_id = await asyncio.to_thread(self._record_start)
+		if run_id is None:
+			raise ReconcileInProgressException()
+		return run_id
+
+	def _record_start(self) -> Optional[int]:
+		with get_db() as conn:
+			repo = ReconcileRunRepository(conn)
+			try:
+				if self.incremental:
+					watermark = repo.last_watermark()
+					if watermark is None:
+						logger.info("Reconciliation: no previous run to continue from, running in full")
+						self.incremental = False
+					else:
+						# Users the previous run skipped as too recent are looked at again
+						self.since = watermark - timedelta(seconds=settings.RECONCILE_GRACE_SECONDS)
+				run_id = repo.start(
+					INCREMENTAL if self.incremental else FULL, self.dry_run, self.since, settings.RECONCILE_STALE_SECONDS
+				)
+				if run_id is None:
+					repo.rollback()
+				else:
+					repo.commit()
+				return run_id
+			finally:
+				repo.close()
+
+	def _record_finish(self, run_id: int, status: str, summary: Dict[str, Any]) -> None:
+		with get_db() as conn:
+			repo = ReconcileRunRepository(conn)
+			try:
+				repo.finish(run_id, status, summary)
+				repo.commit()
+			finally:
+				repo.close()
+
+	async def run(self, run_id: Optional[int] = None) -> Dict[str, Any]:
+		"""Run the reconciliation and return its summary (also stored on the run row).
+
+		`run_id` is the id returned by `begin()`; without it the run is begun here.
+		"""
+		if run_id is None:
+			run_id = await self.begin()
+		status = "failed"
+		started = time.monotonic()
+		if not self.dry_run and not self.incremental and not self.report.orphan_repair:
+			logger.warning("Reconciliation: RECONCILE_IGNORE_CONSUMERS is empty, orphan consumers will not be deleted")
+		self.cutoff = time.time() - settings.RECONCILE_GRACE_SECONDS
+		try:
+			if self.incremental:
+				await self._run_incremental()
+			else:
+				await self._run_full()
+			status = "completed"
+		except Exception as e:
+			logger.error(f"Reconciliation run {run_id} failed: {str(e)}")
+			self.report.error = str(e)
+		summary = self.report.to_dict()
+		summary.update({
+			"id": run_id,
+			"status": status,
+			"mode": INCREMENTAL if self.incremental else FULL,
+			"dry_run": self.dry_run,
+			"seconds": round(time.monotonic() - started, 1),
+		})
+		try:
+			await asyncio.to_thread(self._record_finish, run_id, status, summary)
+		except Exception as e:
+			logger.error(f"Error recording reconciliation run {run_id}: {str(e)}")
+		logger.info(
+			f"Reconciliation run {run_id} {status}: {summary['users']} users, "
+			f"{summary['consumers']} consumers, found {summary['found']}, repaired {summary['repaired']}"
+		)
+		return summary
+
+	def _user_batch(self, after_id: int) -> List[Dict[str, Any]]:
+		with get_db() as conn:
+			repo = UserRepository(conn)
+			try:
+				return repo.list_after(after_id, self.batch_size, self.since)
+			finally:
+				repo.close()
+
+	async def _user_batches(self) -> AsyncIterator[List[Dict[str, Any]]]:
+		after_id = 0
+		while True:
+			rows = await asyncio.to_thread(self._user_batch, after_id)
+			if rows:
+				self.report.users += len(rows)
+				yield [{
+					"id": row["id"],
+					"username": row["username"],
+					"u_type": row["u_type"],
+					"provisioning": row["provision_state"] == PROVISIONING,
+					"changed": max(_timestamp(row["created_at"]), _timestamp(row["updated_at"])),
+				} for row in rows]
+			if len(rows) < self.batch_size:
+				return
+			after_id = rows[-1]["id"]
+
+	@staticmethod
+	def _consumer_record(value: Dict[str, Any]) -> Dict[str, Any]:
+		return {
+			"username": value["username"],
+			"group_id": value.get("group_id"),
+			"changed": max(value.get("create_time") or 0, value.get("update_time") or 0),
+		}
+
+	async def _consumer_pages(self) -> AsyncIterator[List[Dict[str, Any]]]:
+		# The admin API caps page_size; the consumer cache's page size is within the cap
+		page_size = settings.CONSUMER_CACHE_PAGE_SIZE
+		page = 1
+		while True:
+			response = await self.apisix_service.admin.get("/consumers", params={"page": page, "page_size": page_size})
+			if response.status_code != 200:
+				raise APISIXException(f"Status {response.status_code}: {response.text}")
+			data = response.json()
+			# An empty listing is encoded as {} by APISIX
+			items = data.get("list") or []
+			records = [self._consumer_record(item["value"]) for item in items if (item.get("value") or {}).get("username")]
+			self.report.consumers += len(records)
+			yield records
+			if not items or page * page_size >= int(data.get("total", 0)):
+				return
+			page += 1
+
+	def _classify(
+		self,
+		username: str,
+		user: Optional[Dict[str, Any]],
+		consumer: Optional[Dict[str, Any]]
+	) -> Optional[Dict[str, Any]]:
+		if user is None:
+			if username in self.ignored:
+				return None
+			if consumer["changed"] >= self.cutoff:
+				self.report.skipped += 1
+				return None
+			return {"kind": ORPHAN_CONSUMER, "username": username, "group_id": consumer["group_id"]}
+		if user["changed"] >= self.cutoff or user["provisioning"]:
+			# The provisioning worker creates (and retries) the consumer of a new user
+			self.report.skipped += 1
+			return None
+		if consumer is None:
+			return {"kind": MISSING_CONSUMER, "username": username, "user_id": user["id"], "u_type": user["u_type"]}
+		if consumer["group_id"] != user["u_type"]:
+			return {
+				"kind": GROUP_MISMATCH, "username": username, "user_id": user["id"],
+				"u_type": user["u_type"], "group_id": consumer["group_id"]
+			}
+		return None
+
+	def _user_exists(self, username: str) -> bool:
+		with get_db() as conn:
+			repo = UserRepository(conn)
+			try:
+				return repo.get_by_username(username) is not None
+			finally:
+				repo.close()
+
+	async def _repair(self, discrepancy: Dict[str, Any]) -> None:
+		kind, username = discrepancy["kind"], discrepancy["username"]
+		try:
+			if kind == MISSING_CONSUMER:
+				if await self.apisix_service.get_consumer_by_username(username) is not None:
+					discrepancy["repair"] = "resolved meanwhile"
+					return
+				await self.apisix_service.create_consumer(ConsumerCreate(
+					username=username,
+					password=secrets.token_urlsafe(32),
+					u_type=discrepancy["u_type"]
+				))
+			elif kind == ORPHAN_CONSUMER:
+				if await asyncio.to_thread(self._user_exists, username):
+					discrepancy["repair"] = "resolved meanwhile"
+					return
+				await self.apisix_service.delete_consumer(username)
+			elif not await self.apisix_service.update_consumer(username, {"u_type": discrepancy["u_type"]}):
+				raise APISIXException("Consumer not found")
+			self.report.repaired[kind] += 1
+			discrepancy["repair"] = "done"
+		except Exception as e:
+			self.report.failed[kind] += 1
+			discrepancy["repair"] = f"failed: {str(e)}"
+			logger.warning(f"Reconciliation: could not repair {kind} {username}: {str(e)}")
+
+	async def _found(self, discrepancy: Optional[Dict[str, Any]], submit: Callable[[Any], Awaitable[None]]) -> None:
+		if discrepancy is None:
+			return
+		self.report.record(discrepancy)
+		if self.dry_run:
+			return
+		if discrepancy["kind"] == ORPHAN_CONSUMER and not self.report.orphan_repair:
+			discrepancy["repair"] = "not attempted: RECONCILE_IGNORE_CONSUMERS is empty"
+			return
+		await submit(partial(self._repair, discrepancy))
+
+	@asynccontextmanager
+	async def _workers(self) -> AsyncIterator[Callable[[Any], Awaitable[None]]]:
+		"""Yield `submit(job)`: jobs run on a fixed set of workers, and submit waits while the queue is full."""
+		queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+		async def worker() -> None:
+			while True:
+				job = await queue.get()
+				if job is None:
+					return
+				await job()
+
+		tasks = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+		try:
+			yield queue.put
+		except BaseException:
+			for task in tasks:
+				task.cancel()
+			await asyncio.gather(*tasks, return_exceptions=True)
+			raise
+		for _ in tasks:
+			await queue.put(None)
+		await asyncio.gather(*tasks)
+
+	async def _run_full(self) -> None:
+		run_size = settings.RECONCILE_RUN_SIZE
+		with ExternalSorter("username", run_size) as users, ExternalSorter("username", run_size) as consumers:
+			async for batch in self._user_batches():
+				for user in batch:
+					users.add(user)
+			async for records in self._consumer_pages():
+				for consumer in records:
+					consumers.add(consumer)
+			self.report.spilled_runs = users.spilled_runs + consumers.spilled_runs
+
+			async with self._workers() as submit:
+				for i, (username, user, consumer) in enumerate(merge_join(iter(users), iter(consumers))):
+					await self._found(self._classify(username, user, consumer), submit)
+					if i % 1000 == 999:
+						# The join itself never awaits in a dry run: let other requests in
+						await asyncio.sleep(0)
+
+	async def _check_user(self, user: Dict[str, Any]) -> None:
+		try:
+			value = await self.apisix_service.get_consumer_by_username(user["username"])
+		except Exception as e:
+			self.report.lookup_failures += 1
+			logger.warning(f"Reconciliation: could not look up consumer {user['username']}: {str(e)}")
+			return
+		consumer = None
+		if value is not None:
+			self.report.consumers += 1
+			consumer = self._consumer_record(value)
+		discrepancy = self._classify(user["username"], user, consumer)
+		if discrepancy is not None:
+			self.report.record(discrepancy)
+			if not self.dry_run:
+				# Already on a worker
+				await self._repair(discrepancy)
+
+	async def _run_incremental(self) -> None:
+		async with self._workers() as submit:
+			async for batch in self._user_batches():
+				for user in batch:
+					await submit(partial(self._check_user, user))
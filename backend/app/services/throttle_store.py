@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from app.repositories.login_attempt import LoginAttemptRepository
+from app.core.config import settings
+from app.core import background
+from app.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]
+
+
+class ThrottleStore(ABC):
+	"""Storage for failed-login counters and locks keyed by (username, ip)."""
+
+	def __init__(self, window_minutes: int, max_attempts: int, lockout_minutes: int):
+		self.window_minutes = window_minutes
+		self.max_attempts = max_attempts
+		self.lockout_minutes = lockout_minutes
+
+	@abstractmethod
+	def get_lock_until(self, username: str, ip: str) -> Optional[datetime]:
+		"""Return the end of an active lock, or None."""
+		pass
+
+	@abstractmethod
+	def register_failure(self, username: str, ip: str) -> Tuple[int, Optional[datetime]]:
+		"""Count a failed login; return (failures in window, lock end if now locked)."""
+		pass
+
+	@abstractmethod
+	def reset(self, username: str, ip: str) -> None:
+		"""Forget counter and lock after a successful login."""
+		pass
+
+
+class MySQLThrottleStore(ThrottleStore):
+	"""Counters kept in the login_counters table; shared by every backend node."""
+
+	def __init__(self, repo: LoginAttemptRepository, **limits):
+		super().__init__(**limits)
+		self.repo = repo
+
+	def get_lock_until(self, username: str, ip: str) -> Optional[datetime]:
+		return self.repo.get_lock_until(username, ip)
+
+	def register_failure(self, username: str, ip: str) -> Tuple[int, Optional[datetime]]:
+		now = datetime.now()
+		failures = self.repo.register_failure(
+			username,
+			ip,
+			window_minutes=self.window_minutes,
+			max_attempts=self.max_attempts,
+			lockout_minutes=self.lockout_minutes,
+		)
+		self.repo.commit()
+		# The upsert has already set the lock when the threshold was reached
+		if failures >= self.max_attempts:
+			return failures, now + timedelta(minutes=self.lockout_minutes)
+		return failures, None
+
+	def reset(self, username: str, ip: str) -> None:
+		self.repo.reset(username, ip)
+		self.repo.commit()
+
+
+class _TimeWheel:
+	"""Hashed timing wheel: keys are bucketed by expiry second and swept as time advances."""
+
+	def __init__(self, slots: int, resolution: float):
+		self.slots = slots
+		self.resolution = resolution
+		self.buckets: List[Set[Key]] = [set() for _ in range(slots)]
+		self.current_tick = int(time.time() / resolution)
+
+	def schedule(self, key: Key, expires_at: float) -> None:
+		# Deadlines beyond the wheel horizon land in an earlier lap and are re-scheduled when swept
+		tick = max(int(expires_at / self.resolution), self.current_tick + 1)
+		self.buckets[tick % self.slots].add(key)
+
+	def advance(self, now: float) -> Iterator[Key]:
+		"""Yield the keys whose bucket came due since the previous call."""
+		target = int(now / self.resolution)
+		# After a long idle period every bucket is due once, no need to spin through whole laps
+		start = max(self.current_tick + 1, target - self.slots + 1)
+		for tick in range(start, target + 1):
+			bucket = self.buckets[tick % self.slots]
+			if bucket:
+				self.buckets[tick % self.slots] = set()
+				yield from bucket
+		self.current_tick = max(self.current_tick, target)
+
+
+class _Shard:
+	__slots__ = ("lock", "entries", "wheel")
+
+	def __init__(self, wheel_slots: int):
+		self.lock = threading.Lock()
+		# key -> [window_start, failures, locked_until] (epoch seconds)
+		self.entries: Dict[Key, list] = {}
+		self.wheel = _TimeWheel(wheel_slots, resolution=1.0)
+
+
+class ShardedMemoryThrottleStore(ThrottleStore):
+	"""In-process counters striped over independently locked shards.
+
+	Only valid for a single backend node (or as the local tier of the hybrid store).
+	Entries expire through a timing wheel, so memory is bounded by the keys seen
+	within the last window/lockout period.
+	"""
+
+	def __init__(self, shards: int, **limits):
+		super().__init__(**limits)
+		horizon = max(self.window_minutes, self.lockout_minutes) * 60 + 1
+		self.shards = [_Shard(wheel_slots=horizon) for _ in range(shards)]
+
+	def _shard(self, key: Key) -> _Shard:
+		return self.shards[hash(key) % len(self.shards)]
+
+	def _expires_at(self, entry: list) -> float:
+		return max(entry[0] + self.window_minutes * 60, entry[2])
+
+	def _expire(self, shard: _Shard, now: float) -> None:
+		for key in shard.wheel.advance(now):
+			entry = shard.entries.get(key)
+			if entry is None:
+				continue
+			expires_at = self._expires_at(entry)
+			if expires_at <= now:
+				del shard.entries[key]
+			else:
+				shard.wheel.schedule(key, expires_at)
+
+	def get_lock_until(self, username: str, ip: str) -> Optional[datetime]:
+		key = (username, ip)
+		shard = self._shard(key)
+		now = time.time()
+		with shard.lock:
+			self._expire(shard, now)
+			entry = shard.entries.get(key)
+			if entry and entry[2] > now:
+				return datetime.fromtimestamp(entry[2])
+		return None
+
+	def register_failure(self, username: str, ip: str) -> Tuple[int, Optional[datetime]]:
+		key = (username, ip)
+		shard = self._shard(key)
+		now = time.time()
+		with shard.lock:
+			self._expire(shard, now)
+			entry = shard.entries.get(key)
+			if entry is None or entry[0] <= now - self.window_minutes * 60:
+				entry = [now, 0, entry[2] if entry else 0.0]
+				shard.entries[key] = entry
+			entry[1] += 1
+			if entry[1] >= self.max_attempts:
+				entry[2] = now + self.lockout_minutes * 60
+			shard.wheel.schedule(key, self._expires_at(entry))
+			locked_until = datetime.fromtimestamp(entry[2]) if entry[2] > now else None
+			return entry[1], locked_until
+
+	def lock(self, username: str, ip: str, until: datetime) -> None:
+		"""Apply a lock decided elsewhere (e.g. by another node)."""
+		key = (username, ip)
+		shard = self._shard(key)
+		until_ts = until.timestamp()
+		with shard.lock:
+			entry = shard.entries.setdefault(key, [time.time(), 0, 0.0])
+			if until_ts > entry[2]:
+				entry[2] = until_ts
+				shard.wheel.schedule(key, self._expires_at(entry))
+
+	def reset(self, username: str, ip: str) -> None:
+		key = (username, ip)
+		shard = self._shard(key)
+		with shard.lock:
+			shard.entries.pop(key, None)
+
+
+class HybridThrottleStore(ThrottleStore):
+	"""Local counters absorb bursts; deltas and resets are synced to MySQL periodically.
+
+	Lock checks are answered from memory. Each sync pushes the failures counted since
+	the previous one, applies the resulting MySQL lock state locally and pulls the
+	locks set by other nodes, so the fleet converges within one sync interval.
+	"""
+
+	def __init__(self, local: ShardedMemoryThrottleStore, **limits):
+		super().__init__(**limits)
+		self.local = local
+		self._pending_lock = threading.Lock()
+		self._deltas: Dict[Key, int] = {}
+		self._resets: Set[Key] = set()
+
+	def get_lock_until(self, username: str, ip: str) -> Optional[datetime]:
+		return self.local.get_lock_until(username, ip)
+
+	def register_failure(self, username: str, ip: str) -> Tuple[int, Optional[datetime]]:
+		with self._pending_lock:
+			key = (username, ip)
+			self._deltas[key] = self._deltas.get(key, 0) + 1
+		return self.local.register_failure(username, ip)
+
+	def reset(self, username: str, ip: str) -> None:
+		with self._pending_lock:
+			key = (username, ip)
+			self._deltas.pop(key, None)
+			self._resets.add(key)
+		self.local.reset(username, ip)
+
+	def sync(self) -> None:
+		with self._pending_lock:
+			deltas, self._deltas = self._deltas, {}
+			resets, self._resets = self._resets, set()
+		committed = False
+		try:
+			with get_db() as conn:
+				repo = LoginAttemptRepository(conn)
+				for username, ip in resets:
+					repo.reset(username, ip)
+				for (username, ip), delta in deltas.items():
+					failures = repo.register_failure(
+						username,
+						ip,
+						window_minutes=self.window_minutes,
+						max_attempts=self.max_attempts,
+						lockout_minutes=self.lockout_minutes,
+						increment=delta,
+					)
+					if failures >= self.max_attempts:
+						self.local.lock(username, ip, datetime.now() + timedelta(minutes=self.lockout_minutes))
+				repo.commit()
+				committed = True
+				for row in repo.get_active_locks():
+					self.local.lock(row["username"], row["ip"], row["locked_until"])
+		except Exception:
+			if committed:
+				# Only pulling the locks failed; replaying committed work would count it twice
+				raise
+			# Put unsynced work back so the next run retries it
+			with self._pending_lock:
+				for key, delta in deltas.items():
+					if key not in self._resets:
+						self._deltas[key] = self._deltas.get(key, 0) + delta
+				self._resets.update(resets)
+			raise
+
+
+def _limits() -> dict:
+	return {
+		"window_minutes": settings.LOGIN_WINDOW_MINUTES,
+		"max_attempts": settings.LOGIN_MAX_ATTEMPTS,
+		"lockout_minutes": settings.LOGIN_LOCKOUT_MINUTES,
+	}
+
+
+_shared_store: Optional[ThrottleStore] = None
+
+if settings.LOGIN_THROTTLE_BACKEND in ("memory", "hybrid"):
+	_shared_store = ShardedMemoryThrottleStore(shards=settings.LOGIN_THROTTLE_SHARDS, **_limits())
+
+if settings.LOGIN_THROTTLE_BACKEND == "hybrid":
+	_shared_store = HybridThrottleStore(_shared_store, **_limits())
+
+	async def _sync_hybrid_store() -> None:
+		await asyncio.to_thread(_shared_store.sync)
+
+	background.register(background.PeriodicTask(
+		"login-throttle-sync", settings.LOGIN_THROTTLE_SYNC_SECONDS, _sync_hybrid_store
+	))
+	background.on_shutdown(_sync_hybrid_store)
+
+
+def get_throttle_store(repo: LoginAttemptRepository) -> ThrottleStore:
+	"""Return the configured store; the in-process ones are shared across requests."""
+	if _shared_store is not None:
+		return _shared_store
+	return MySQLThrottleStore(repo, **_limits())
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+
+from app.repositories.token import TokenRepository
+from app.core.config import settings
+from app.core import background
+from app.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_expired_tokens() -> int:
+	"""Delete expired verification/recovery tokens in bounded batches."""
+	removed = 0
+	try:
+		with get_db() as conn:
+			repo = TokenRepository(conn)
+			try:
+				while True:
+					deleted = repo.delete_expired(settings.TOKEN_SWEEP_BATCH_SIZE)
+					repo.commit()
+					removed += deleted
+					if deleted < settings.TOKEN_SWEEP_BATCH_SIZE:
+						break
+			finally:
+				repo.close()
+	except Exception as e:
+		logger.error(f"Error sweeping expired tokens: {str(e)}")
+	if removed:
+		logger.info(f"Removed {removed} expired tokens")
+	return removed
+
+
+async def _sweep() -> None:
+	await asyncio.to_thread(sweep_expired_tokens)
+
+
+background.register(background.PeriodicTask("token-sweeper", settings.TOKEN_SWEEP_SECONDS, _sweep))
@@ -1,29 +1,32 @@
 from typing import List, Optional, Dict, Any, Generator
+import asyncio
 import logging
 from datetime import datetime, timedelta
 import secrets
 import mysql.connector
 
 from app.repositories.user import UserRepository
+from app.repositories.token import TokenRepository, hash_token, VERIFICATION, RECOVERY
+from app.repositories.provisioning import ProvisioningOutboxRepository, PROVISIONING
+from app.repositories.api_key import ApiKeyRepository, api_key_preview
 from app.services.apisix import APISIXService
+from app.services.provisioning import provisioning_worker
 from app.services.email import EmailService
 from app.schemas.user import (
 	User, UserCreate, UserUpdate, UserProfile, GenerateApiKeyResponse,
 	SendPasswordRecoveryRequest, SendPasswordRecoveryResponse,
 	PasswordRecoveryRequest, PasswordRecoveryResponse
 )
-from app.schemas.consumer import ConsumerCreate
 from app.core.exceptions import (
 	UserNotFoundException, UserAlreadyExistsException, 
 	EmailAlreadyExistsException, DatabaseException,
-	PasswordNotSecureException
+	PasswordNotSecureException, APISIXException, HashingOverloadedException
 )
 from app.services.consumer_group import ConsumerGroupService
 from app.core.config import settings
 from app.db.database import get_db
-from app.core.security import check_pwd_security
-
-import subprocess
+from app.utils.cache import TTLCache
+from app.core.security import check_pwd_security, get_password_hash, generate_api_key
 
 from app.core.config import settings
 DEFAULT_U_TYPE = settings.DEFAULT_U_TYPE
@@ -32,82 +35,135 @@ DEFAULT_U_TYPE = settings.DEFAULT_U_TYPE
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# UserProfile by username; invalidated by every write path that changes what it shows
+profile_cache = TTLCache("user_profile", settings.PROFILE_CACHE_MAX_ENTRIES, settings.PROFILE_CACHE_TTL_SECONDS)
+# u_status by username for the login path; same invalidation points, shorter TTL
+status_cache = TTLCache("user_status", settings.STATUS_CACHE_MAX_ENTRIES, settings.STATUS_CACHE_TTL_SECONDS)
+
+
+def invalidate_user_caches(*usernames: Optional[str]) -> None:
+	"""Drop cached profile/status after a committed change to these users."""
+	keys = [u for u in usernames if u]
+	profile_cache.invalidate(*keys)
+	status_cache.invalidate(*keys)
+
 class UserService:
 	"""Service for user management operations."""
 	def __init__(self, user_repository: UserRepository):
 		self.user_repository = user_repository
 		self.apisix_service = APISIXService()
 		self.consumer_group_service = ConsumerGroupService()
+
+	@property
+	def outbox_repository(self) -> ProvisioningOutboxRepository:
+		"""Provisioning outbox repository sharing the user repository's unit of work."""
+		if not hasattr(self, '_outbox_repository'):
+			self._outbox_repository = ProvisioningOutboxRepository(self.user_repository.uow)
+		return self._outbox_repository
+
+	@property
+	def api_key_repository(self) -> ApiKeyRepository:
+		"""API key index repository sharing the user repository's unit of work."""
+		if not hasattr(self, '_api_key_repository'):
+			self._api_key_repository = ApiKeyRepository(self.user_repository.uow)
+		return self._api_key_repository
+
+	@property
+	def token_repository(self) -> TokenRepository:
+		"""Token repository sharing the user repository's unit of work."""
+		if not hasattr(self, '_token_repository'):
+			self._token_repository = TokenRepository(self.user_repository.uow)
+		return self._token_repository
 	
 	async def create_user(self, user_data: UserCreate) -> User:
-		"""Create a new user in database and its APISIX consumer."""
-		# Check if user already exists
-		existing_user = self.user_repository.get_by_username(user_data.username)
-		if existing_user:
-			raise UserAlreadyExistsException(user_data.username)
-
-		# Check if email already exists
-		existing_user = self.user_repository.get_by_email(user_data.email)
-		if existing_user:
-			raise EmailAlreadyExistsException(user_data.email)
-
-		# Check if password is secure
-		is_secure, count = check_pwd_security(user_data.password)
-		if not is_secure:
-			raise PasswordNotSecureException(count)
+		"""Create a new user in database and queue the creation of its APISIX consumer.
+
+		The user row and its provisioning outbox entry commit together; the consumer
+		is created by the provisioning worker (app/services/provisioning.py), so the
+		user is returned in provision_state 'provisioning' without waiting for APISIX.
+		"""
+		u_type = user_data.u_type or settings.DEFAULT_U_TYPE
+		await self._validate_new_user(user_data, u_type)
 
 		# Prepare database user data
+		now = datetime.now()
 		db_user_data = {
 			"username": user_data.username,
 			"email": user_data.email,
-			"u_type": user_data.u_type or settings.DEFAULT_U_TYPE,
+			"u_type": u_type,
 			"u_status": user_data.u_status,
 			"isFederated": user_data.isFederated,
 			"api_key_preview": None,
 			"email_verified": 1 if user_data.u_status == 'active' else 0,
-			"created_at": datetime.now(),
-			"updated_at": datetime.now()
+			"provision_state": PROVISIONING,
+			"created_at": now,
+			"updated_at": now
 		}
 
 		try:
-			# Ensure profile group exists for this u_type
-			if not self.apisix_service.profile_group_exists(db_user_data["u_type"]):
-				raise DatabaseException(f"Failed to ensure profile group exists for {db_user_data['u_type']}")
-			
-			# Create user in database
-			user_id = self.user_repository.create(db_user_data)
+			# The consumer's jwt-auth secret; hashing runs in the hashing pool
+			hashed_password = await get_password_hash(user_data.password)
 
+			# User and outbox entry commit together: a committed user always gets its consumer
+			user_id = self.user_repository.create(db_user_data)
 			if not user_id:
 				raise DatabaseException("Failed to create user")
-			
-			# Create APISIX consumer
-			consumer_data = ConsumerCreate(
-				username=user_data.username,
-				password=user_data.password,
-				u_type=user_data.u_type or settings.DEFAULT_U_TYPE
-			)
-			self.apisix_service.create_consumer(consumer_data)
-			
-			# Get the created user
-			created_user = self.user_repository.get_by_id(user_id)
-			if not created_user:
-				raise DatabaseException("Failed to retrieve created user")
-				
-			return User(**created_user)
+			self.outbox_repository.enqueue(user_id, user_data.username, db_user_data["u_type"], hashed_password)
+			self.user_repository.commit()
+
+			return User(id=user_id, **{k: db_user_data[k] for k in (
+				"username", "email", "u_type", "u_status", "isFederated", "email_verified", "provision_state"
+			)})
 		
 		except Exception as e:
-			if user_id:
-				# If APISIX consumer creation fails, we should clean up the database user
-				await self.delete_user(user_id)
+			self.user_repository.rollback()
 
 			logger.error(f"Error creating user: {str(e)}")
-			if not isinstance(e, (UserAlreadyExistsException, EmailAlreadyExistsException, DatabaseException)):
+			if not isinstance(e, (
+				UserAlreadyExistsException, EmailAlreadyExistsException, DatabaseException, HashingOverloadedException
+			)):
 				raise DatabaseException("An error occurred while creating the user")
 			raise e
 		
 		finally:
 			self.user_repository.close()
 
+	async def _validate_new_user(self, user_data: UserCreate, u_type: str) -> None:
+		"""Run the checks that precede a registration concurrently; the first failure wins.
+
+		Username and email uniqueness is one query (on a worker thread), awaited
+		alongside the breached-password and profile group checks. When a check fails
+		the others are cancelled, except the query: it holds the request's connection,
+		so it is always waited for.
+		"""
+		async def check_unique() -> None:
+			taken_usernames, taken_emails = await asyncio.to_thread(
+				self.user_repository.find_existing, [user_data.username], [user_data.email]
+			)
+			if taken_usernames:
+				raise UserAlreadyExistsException(user_data.username)
+			if taken_emails:
+				raise EmailAlreadyExistsException(user_data.email)
+
+		async def check_password() -> None:
+			is_secure, count = await check_pwd_security(user_data.password)
+			if not is_secure:
+				raise PasswordNotSecureException(count)
+
+		async def check_group() -> None:
+			if not await self.apisix_service.profile_group_exists(u_type):
+				raise DatabaseException(f"Failed to ensure profile group exists for {u_type}")
+
+		unique = asyncio.create_task(check_unique())
+		cancellable = [asyncio.create_task(check_password()), asyncio.create_task(check_group())]
+		try:
+			for check in asyncio.as_completed([unique, *cancellable]):
+				await check
+		finally:
+			for task in cancellable:
+				task.cancel()
+			await asyncio.gather(unique, *cancellable, return_exceptions=True)
+
 	async def send_password_recovery(self, email: str) -> Dict[str, Any]:
 		"""Initiate password recovery by email without revealing account existence."""
 		try:
@@ -124,18 +180,14 @@ class UserService:
 			if user.get("isFederated") or user.get('u_status') != "active":
 				return generic_response
 
-			if not self.user_repository.can_send_password_recovery(email):
+			if not self._cooldown_passed(user['id'], RECOVERY):
 				# Still send generic response
 				return generic_response
 
-			# Generate secure token and expiry
+			# Generate secure token and expiry; only its hash is stored
 			token = secrets.token_urlsafe(32)
 			expires_at = datetime.now() + timedelta(minutes=settings.PASSWORD_RECOVERY_EXPIRE_MINUTES)
-
-			if not self.user_repository.save_password_recovery_token(email, token, expires_at):
-				# Do not leak info, still generic
-				return generic_response
-
+			self.token_repository.issue(user['id'], RECOVERY, hash_token(RECOVERY, token), expires_at)
 			self.user_repository.commit()
 
 			# Build recovery link and send email
@@ -162,27 +214,10 @@ class UserService:
 	async def reset_password_with_token(self, code: str, new_password: str) -> Dict[str, Any]:
 		"""Validate code and reset password in APISIX consumer."""
 		try:
-			# Validate code
-			email_result = self.user_repository.search_recovery_email(code)
-			if not email_result:
-				return {
-					"success": False,
-					"message": "Invalid or expired code"
-				}
-			email = email_result.get('email')
-			if not email:
-				return {
-					"success": False,
-					"message": "Invalid or expired code"
-				}
-			if not self.user_repository.validate_recovery_code(email, code):
-				return {
-					"success": False,
-					"message": "Invalid or expired code"
-				}
-
-			user = self.user_repository.get_user_minimal_by_email(email)
-			if not user or user.get('u_status') == 'disabled':
+			# Validate and consume the code: one locking lookup by hash plus its delete.
+			# The delete is only committed once the password has been changed.
+			user = self.token_repository.redeem(hash_token(RECOVERY, code), RECOVERY)
+			if not user:
 				return {
 					"success": False,
 					"message": "Invalid or expired code"
@@ -192,14 +227,16 @@ class UserService:
 			updates = UserUpdate(password=new_password)
 			await self.update_user(user_id=user['id'], user_update=updates)
 
-			# Clear code
-			self.user_repository.clear_recovery_code(email)
 			self.user_repository.commit()
 
 			return {
 				"success": True,
 				"message": "Password has been reset successfully"
 			}
+		except HashingOverloadedException:
+			# The code is not consumed (rolled back): 429 with Retry-After, the user retries with it
+			self.user_repository.rollback()
+			raise
 		except Exception as e:
 			self.user_repository.rollback()
 			logger.error(f"Error resetting password: {str(e)}", exc_info=True)
@@ -248,25 +285,36 @@ class UserService:
 				if field == 'password':
 					pass
 				elif field == 'api_key':
-					user_updates['api_key_preview'] = value[:3] + '...' + value[-3:]
+					user_updates['api_key_preview'] = api_key_preview(value)
 				else:
 					user_updates[field] = value
 			else:
 				user_updates[field] = value
 		# Update consumer if needed
 		if consumer_updates:
-			self.apisix_service.update_consumer(user['username'], consumer_updates)
+			# The outbox entry still holds the registration's name, group and secret:
+			# create the consumer from it first, so the update lands on top of it
+			if user.get('provision_state') == PROVISIONING and not await provisioning_worker.provision_user(user_id):
+				raise APISIXException(
+					f"Consumer of {user['username']} is still being provisioned, try again later",
+					status_code=503
+				)
+			if not await self.apisix_service.update_consumer(user['username'], consumer_updates):
+				raise APISIXException(f"Consumer {user['username']} not found")
 
 		# Update user in database
 		if user_updates:
 			self.user_repository.update(user_id, user_updates)
+			if consumer_updates.get('api_key'):
+				self.api_key_repository.issue_many({user_id: consumer_updates['api_key']})
 			self.user_repository.commit()
+		invalidate_user_caches(user['username'], user_updates.get('username'))
 		
 		return User(**user)
 
 		
 
-	def _create_consumer_config_for_groups(
+	async def _create_consumer_config_for_groups(
 		self, 
 		current_consumer: Dict[str, Any], 
 		new_username: Optional[str] = None,
@@ -288,7 +336,7 @@ class UserService:
 		
 		# Handle jwt-auth
 		if new_password:
-			hashed_password = get_password_hash(new_password)
+			hashed_password = await get_password_hash(new_password)
 			merged_consumer["plugins"]["jwt-auth"] = {
 				"key": merged_consumer["username"],
 				"secret": hashed_password,
@@ -322,11 +370,12 @@ class UserService:
 		
 		try:
 			# Delete from APISIX first
-			self.apisix_service.delete_consumer(username)
+			await self.apisix_service.delete_consumer(username)
 			
 			# Delete from database
 			self.user_repository.delete(user_id)
 			self.user_repository.commit()
+			invalidate_user_caches(username)
 			
 			return {"message": f"User {user_id} deleted"}
 			
@@ -345,24 +394,62 @@ class UserService:
 		email_verified: Optional[bool] = None
 	) -> List[User]:
 		"""List users with optional filters."""
-		users = self.user_repository.list_users(
+		rows = await self.list_user_rows(
+			u_type=u_type,
+			u_status=u_status,
+			email_contains=email_contains,
+			is_federated=is_federated,
+			email_verified=email_verified
+		)
+		# Rows come from our own table with the schema's columns: skip re-validation
+		return [User.model_construct(**row) for row in rows]
+
+	async def list_user_rows(
+		self,
+		u_type: Optional[str] = None,
+		u_status: Optional[str] = None,
+		email_contains: Optional[str] = None,
+		is_federated: Optional[bool] = None,
+		email_verified: Optional[bool] = None
+	) -> List[Dict[str, Any]]:
+		"""List users as plain dicts shaped like the User schema, ready to serialize."""
+		rows = self.user_repository.list_users(
 			u_type=u_type,
 			u_status=u_status,
 			email_contains=email_contains,
 			is_federated=is_federated,
 			email_verified=email_verified
 		)
-		return [User(**user) for user in users]
+		for row in rows:
+			row['api_key'] = None
+		return rows
 
 	async def get_user_profile_by_username(self, username: str) -> UserProfile:
-		"""Get user profile by username."""
+		"""Get user profile by username (cache-aside)."""
+		profile = profile_cache.get(username)
+		if profile is not None:
+			return profile
+		version = profile_cache.version()
 		profile_data = self.user_repository.get_user_profile(username)
 		if not profile_data:
 			raise HTTPException(
 				status_code=404, 
 				detail="User profile not found or account is disabled"
 			)
-		return UserProfile(**profile_data)
+		profile = UserProfile(**profile_data)
+		profile_cache.set(username, profile, version=version)
+		return profile
+
+	def get_user_status(self, username: str) -> Optional[str]:
+		"""Get u_status by username, served from the status cache when possible."""
+		user_status = status_cache.get(username)
+		if user_status is not None:
+			return user_status
+		version = status_cache.version()
+		user_status = self.user_repository.get_user_status(username)
+		if user_status:
+			status_cache.set(username, user_status, version=version)
+		return user_status
 
 	async def send_verification_email(self, username: str) -> Dict[str, Any]:
 		"""Send verification email to user."""
@@ -391,18 +478,20 @@ class UserService:
 				}
 			
 			# Check cooldown period
-			if not self.user_repository.can_send_verification(username):
+			if not self._cooldown_passed(user_status['id'], VERIFICATION):
 				return {
 					"success": False,
 					"message": f"Please wait {settings.VERIFICATION_COOLDOWN_MINUTES} minutes before requesting another verification code."
 				}
 			
-			# Generate and save verification code
+			# Generate and save verification code (hashed, scoped to the user)
 			email_service = EmailService()
 			verification_code = email_service.generate_verification_code()
-			
-			if not self.user_repository.save_verification_code(username, verification_code):
-				raise DatabaseException("Failed to save verification code")
+			expires_at = datetime.now() + timedelta(minutes=settings.EMAIL_VERIFICATION_EXPIRE_MINUTES)
+			self.token_repository.issue(
+				user_status['id'], VERIFICATION,
+				hash_token(VERIFICATION, verification_code, user_status['id']), expires_at
+			)
 			
 			self.user_repository.commit()
 			
@@ -429,24 +518,16 @@ class UserService:
 	async def verify_email(self, username: str, code: str) -> bool:
 		"""Verify user's email with provided code and update user status to 'active' if currently 'pending'."""
 		try:
-			# Check if user status is 'pending'
-			current_status = self.user_repository.get_user_status(username)
-			if current_status != 'pending':
-				return False
-			
-			# First increment attempts
-			self.user_repository.increment_verification_attempts(username)
-			
-			# Try to verify
-			success = self.user_repository.verify_email_code(username, code)
-			
-			# If verification was successful, update user status to 'active'
-			if success:
-				user = self.user_repository.get_by_username(username)
-				if user:
-					self.user_repository.update(user['id'], {'u_status': 'active'})
+			# Single conditional update: pending user, live code, attempts left
+			success = self.user_repository.verify_email_code(
+				username, code, settings.EMAIL_VERIFICATION_MAX_ATTEMPTS
+			)
+			if not success:
+				self.user_repository.increment_verification_attempts(username)
 			
 			self.user_repository.commit()
+			if success:
+				invalidate_user_caches(username)
 			return success
 			
 		except Exception as e:
@@ -464,12 +545,17 @@ class UserService:
 		
 		return {
 			"username": username,
-			"email_verified": user_status.get("email_verified", False),
-			"has_pending_code": bool(
-				user_status.get("verification_code_expires") and 
-				user_status["verification_code_expires"] > datetime.now()
-			)
+			"email_verified": bool(user_status.get("email_verified", False)),
+			"has_pending_code": self.token_repository.get_active(user_status['id'], VERIFICATION) is not None
 		}
+
+	def _cooldown_passed(self, user_id: int, purpose: str) -> bool:
+		"""Check if enough time has passed since the user's last token of this purpose."""
+		token = self.token_repository.get_active(user_id, purpose)
+		if not token:
+			return True
+		cooldown = timedelta(minutes=settings.VERIFICATION_COOLDOWN_MINUTES)
+		return datetime.now() - token['created_at'] > cooldown
 	
 	async def generate_apiKey(self, username: str) -> Dict[str, Any]:
 		"""Generate a new API key for the user.
@@ -484,8 +570,7 @@ class UserService:
 			DatabaseException: If there's an error generating the key
 		"""
 		# Generate a secure random API key
-		api_key = subprocess.check_output(["openssl", "rand", "-base64", "24"]).decode().strip()
-		api_key_preview = api_key[:3] + '...' + api_key[-3:]
+		api_key = generate_api_key()
 
 		# Get the user details
 		user = self.user_repository.get_by_username(username)
@@ -514,18 +599,16 @@ class UserService:
 					"error": "User not found"
 				}
 			
+			# Drop the cached profile so the new preview shows up
+			profile_cache.invalidate(username)
 			return {
 				"success": True,
 				"message": "API key generated successfully",
 				"api_key": api_key,
-				"api_key_preview": api_key_preview,
+				"api_key_preview": api_key_preview(api_key),
 				"error": None
 			}
 			
-		except subprocess.CalledProcessError as e:
-			error_msg = f"Failed to generate secure random data: {str(e)}"
-			logger.error(error_msg)
-			raise DatabaseException(error_msg)
 		except Exception as e:
 			error_msg = f"Unexpected error generating API key: {str(e)}"
 			logger.error(error_msg, exc_info=True)
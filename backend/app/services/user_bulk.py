@@ -0,0 +1,227 @@
+import asyncio
+import csv
+import io
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import orjson
+from pydantic import ValidationError
+
+from app.repositories.user import UserRepository
+from app.repositories.provisioning import ProvisioningOutboxRepository, PROVISIONING
+from app.services.apisix import APISIXService
+from app.schemas.user import UserCreate
+from app.core.config import settings
+from app.core.exceptions import ImportTooLargeException
+from app.core.security import check_pwd_security, get_password_hash
+from app.db.database import get_db
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "csv")
+
+
+class UserBulkService:
+	"""Streaming export and batched import of users."""
+
+	def __init__(self, user_repository: UserRepository):
+		self.user_repository = user_repository
+		self.outbox_repository = ProvisioningOutboxRepository(user_repository.uow)
+		self.apisix_service = APISIXService()
+
+	@staticmethod
+	def export_users(fmt: str = "ndjson", **filters) -> Iterator[bytes]:
+		"""Yield the listed users as NDJSON lines or CSV, one encoded chunk per batch.
+
+		Runs on its own connection with an unbuffered cursor, so memory stays bounded
+		by USER_EXPORT_BATCH_SIZE whatever the size of the table.
+		"""
+		columns = UserRepository.LIST_COLUMNS
+		with get_db() as conn:
+			repo = UserRepository(conn)
+			try:
+				if fmt == "csv":
+					yield (",".join(columns) + "\r\n").encode()
+				for batch in repo.stream_users(settings.USER_EXPORT_BATCH_SIZE, **filters):
+					if fmt == "csv":
+						buffer = io.StringIO()
+						writer = csv.writer(buffer)
+						writer.writerows([row[c] for c in columns] for row in batch)
+						yield buffer.getvalue().encode()
+					else:
+						yield b"".join(orjson.dumps(row) + b"\n" for row in batch)
+			finally:
+				repo.close()
+
+	async def import_users(self, rows: List[Dict[str, Any]], dry_run: bool = False) -> Dict[str, Any]:
+		"""Create users in batches and report the outcome of every row.
+
+		Each batch is validated, checked for duplicates with a single query and
+		inserted with one executemany. As at registration, the users are created in
+		provision_state 'provisioning' and commit together with their provisioning
+		outbox entries, so no lock is held while APISIX is called: the consumers are
+		created by the provisioning worker. A lookup that fails fails the rows it
+		was for, not the import.
+		"""
+		if len(rows) > settings.USER_IMPORT_MAX_ROWS:
+			raise ImportTooLargeException(settings.USER_IMPORT_MAX_ROWS)
+
+		results: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+		seen_usernames = set()
+		seen_emails = set()
+		group_exists: Dict[str, bool] = {}
+		semaphore = asyncio.Semaphore(settings.USER_IMPORT_CONCURRENCY)
+		batch_size = settings.USER_IMPORT_BATCH_SIZE
+		try:
+			for start in range(0, len(rows), batch_size):
+				await self._import_batch(
+					rows[start:start + batch_size], start, results,
+					seen_usernames, seen_emails, group_exists, semaphore, dry_run
+				)
+		finally:
+			self.user_repository.close()
+
+		created = sum(1 for r in results if r["status"] in ("created", "valid"))
+		return {
+			"dry_run": dry_run,
+			"total": len(rows),
+			"created": created,
+			"failed": len(rows) - created,
+			"results": results,
+		}
+
+	async def _import_batch(
+		self,
+		batch: List[Dict[str, Any]],
+		offset: int,
+		results: List[Optional[Dict[str, Any]]],
+		seen_usernames: set,
+		seen_emails: set,
+		group_exists: Dict[str, bool],
+		semaphore: asyncio.Semaphore,
+		dry_run: bool
+	) -> None:
+		def report(index: int, username: Optional[str], status: str, error: Optional[str] = None) -> None:
+			results[index] = {"index": index, "username": username, "status": status, "error": error}
+
+		# Validation, and duplicates within the import itself
+		candidates: List[tuple] = []
+		for i, raw in enumerate(batch):
+			index = offset + i
+			try:
+				user = UserCreate.model_validate(raw)
+			except ValidationError as e:
+				first = e.errors()[0]
+				field = ".".join(str(loc) for loc in first["loc"])
+				report(index, raw.get("username") if isinstance(raw, dict) else None, "invalid", f"{field}: {first['msg']}")
+				continue
+			username_key, email_key = user.username.lower(), user.email.lower()
+			if username_key in seen_usernames or email_key in seen_emails:
+				report(index, user.username, "duplicate", "Username or email repeated in this import")
+				continue
+			seen_usernames.add(username_key)
+			seen_emails.add(email_key)
+			candidates.append((index, user))
+		if not candidates:
+			return
+
+		# Duplicates against the table: one query for the whole batch
+		try:
+			taken_usernames, taken_emails = self.user_repository.find_existing(
+				[user.username for _, user in candidates],
+				[user.email for _, user in candidates]
+			)
+		except Exception as e:
+			logger.error(f"Error checking import batch at row {offset} for existing users: {str(e)}")
+			for index, user in candidates:
+				report(index, user.username, "failed", "Database error")
+			return
+		remaining = []
+		for index, user in candidates:
+			if user.username.lower() in taken_usernames:
+				report(index, user.username, "exists", f"User with username {user.username} already exists")
+			elif user.email.lower() in taken_emails:
+				report(index, user.username, "exists", f"The email {user.email} is already associated with an existing user.")
+			else:
+				remaining.append((index, user))
+
+		# Profile groups are checked once per u_type for the whole import; a check
+		# that fails is retried with the next batch
+		group_errors: Dict[str, str] = {}
+		for u_type in {user.u_type or settings.DEFAULT_U_TYPE for _, user in remaining} - group_exists.keys():
+			try:
+				group_exists[u_type] = await self.apisix_service.profile_group_exists(u_type)
+			except Exception as e:
+				logger.warning(f"Error checking profile group {u_type} for import: {str(e)}")
+				group_errors[u_type] = f"Profile group {u_type} could not be checked"
+
+		async def password_is_secure(user: UserCreate) -> tuple:
+			async with semaphore:
+				return await check_pwd_security(user.password)
+
+		checks = await asyncio.gather(*(password_is_secure(user) for _, user in remaining))
+		accepted = []
+		for (index, user), (is_secure, count) in zip(remaining, checks):
+			u_type = user.u_type or settings.DEFAULT_U_TYPE
+			if u_type in group_errors:
+				report(index, user.username, "failed", group_errors[u_type])
+			elif not group_exists[u_type]:
+				report(index, user.username, "failed", f"Profile group {user.u_type} does not exist")
+			elif not is_secure:
+				report(index, user.username, "insecure_password", f"PasswordNotSecure;{count}")
+			else:
+				accepted.append((index, user))
+
+		if dry_run:
+			for index, user in accepted:
+				report(index, user.username, "valid")
+			return
+
+		# The consumers' jwt-auth secrets, hashed in the hashing pool before any row is written
+		async def hash_password(user: UserCreate) -> Optional[str]:
+			async with semaphore:
+				try:
+					return await get_password_hash(user.password)
+				except Exception as e:
+					logger.warning(f"Error hashing the password of imported user {user.username}: {str(e)}")
+					return None
+
+		hashes = await asyncio.gather(*(hash_password(user) for _, user in accepted))
+		hashed = []
+		for (index, user), secret_hash in zip(accepted, hashes):
+			if secret_hash is None:
+				report(index, user.username, "failed", "Password could not be hashed, retry later")
+			else:
+				hashed.append((index, user, secret_hash))
+		if not hashed:
+			return
+
+		now = datetime.now()
+		try:
+			ids = self.user_repository.create_many([{
+				"username": user.username,
+				"email": user.email,
+				"u_type": user.u_type or settings.DEFAULT_U_TYPE,
+				"u_status": user.u_status,
+				"isFederated": user.isFederated,
+				"api_key_preview": None,
+				"email_verified": 1 if user.u_status == 'active' else 0,
+				"provision_state": PROVISIONING,
+				"created_at": now,
+				"updated_at": now
+			} for _, user, _ in hashed])
+			self.outbox_repository.enqueue_many([
+				(ids[user.username.lower()], user.username, user.u_type or settings.DEFAULT_U_TYPE, secret_hash)
+				for _, user, secret_hash in hashed
+			])
+			self.user_repository.commit()
+		except Exception as e:
+			self.user_repository.rollback()
+			logger.error(f"Error inserting import batch at row {offset}: {str(e)}")
+			for index, user, _ in hashed:
+				report(index, user.username, "failed", "Database error")
+			return
+
+		for index, user, _ in hashed:
+			report(index, user.username, "created")
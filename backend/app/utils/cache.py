@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+_MISSING = object()
+
+# Every cache created in the process, by name (for the admin metrics endpoint)
+_registry: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+	"""Thread-safe, size-bounded LRU cache whose entries expire after `ttl` seconds.
+
+	A `ttl` of 0 disables the cache (every lookup misses, nothing is stored).
+	Hits, misses, evictions, expirations and invalidations are counted for `stats()`.
+
+	Invalidation is versioned: a reader takes `version()` before loading a value
+	and passes it to `set()`. If the key was invalidated in between, the (possibly
+	stale) value is discarded instead of being cached until the TTL runs out.
+	"""
+
+	def __init__(self, name: str, maxsize: int, ttl: float):
+		self.name = name
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._lock = threading.Lock()
+		self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+		# Generation at which each recently invalidated key was invalidated; keys that
+		# fall out of this bounded map are covered by _floor (the newest dropped one)
+		self._generation = 0
+		self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+		self._floor = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+		self.invalidations = 0
+		_registry[name] = self
+
+	@property
+	def enabled(self) -> bool:
+		return self.ttl > 0 and self.maxsize > 0
+
+	def get(self, key: Hashable, default: Any = None) -> Any:
+		with self._lock:
+			entry = self._data.get(key, _MISSING)
+			if entry is _MISSING:
+				self.misses += 1
+				return default
+			value, expires_at = entry
+			if expires_at <= time.monotonic():
+				del self._data[key]
+				self.expirations += 1
+				self.misses += 1
+				return default
+			self._data.move_to_end(key)
+			self.hits += 1
+			return value
+
+	def version(self) -> int:
+		"""Token to pass to `set()` for a value loaded after this call."""
+		with self._lock:
+			return self._generation
+
+	def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, version: Optional[int] = None) -> None:
+		if not self.enabled:
+			return
+		with self._lock:
+			if version is not None and self._invalidated.get(key, self._floor) > version:
+				return
+			self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+			self._data.move_to_end(key)
+			while len(self._data) > self.maxsize:
+				self._data.popitem(last=False)
+				self.evictions += 1
+
+	def invalidate(self, *keys: Hashable) -> None:
+		with self._lock:
+			self._generation += 1
+			for key in keys:
+				self._invalidated[key] = self._generation
+				self._invalidated.move_to_end(key)
+				if self._data.pop(key, _MISSING) is not _MISSING:
+					self.invalidations += 1
+			while len(self._invalidated) > self.maxsize:
+				_, self._floor = self._invalidated.popitem(last=False)
+
+	def clear(self) -> None:
+		with self._lock:
+			self._generation += 1
+			self._floor = self._generation
+			self._invalidated.clear()
+			self.invalidations += len(self._data)
+			self._data.clear()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"name": self.name,
+				"size": len(self._data),
+				"maxsize": self.maxsize,
+				"ttl": self.ttl,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": round(self.hits / lookups, 4) if lookups else None,
+				"evictions": self.evictions,
+				"expirations": self.expirations,
+				"invalidations": self.invalidations,
+			}
+
+
+def get_cache(name: str) -> Optional[TTLCache]:
+	return _registry.get(name)
+
+
+def all_cache_stats() -> List[Dict[str, Any]]:
+	return [cache.stats() for cache in _registry.values()]
@@ -0,0 +1,68 @@
+import heapq
+import tempfile
+from operator import itemgetter
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+import orjson
+
+
+class ExternalSorter:
+	"""Sort more records than should be held in memory, by one key.
+
+	Records (JSON-serializable dicts) are buffered up to `run_size`; each full
+	buffer is sorted and spilled to an anonymous temporary file as one sorted run.
+	Iterating merges the runs with heapq.merge, so memory stays bounded by
+	`run_size` records plus one record per run. A sorter is iterated once.
+	"""
+
+	def __init__(self, key: str, run_size: int, directory: Optional[str] = None):
+		self.key = key
+		self.run_size = run_size
+		self.directory = directory
+		self.count = 0
+		self._buffer: List[Dict[str, Any]] = []
+		self._runs: List[IO[bytes]] = []
+
+	def add(self, record: Dict[str, Any]) -> None:
+		self._buffer.append(record)
+		self.count += 1
+		if len(self._buffer) >= self.run_size:
+			self._spill()
+
+	def _spill(self) -> None:
+		self._buffer.sort(key=itemgetter(self.key))
+		run = tempfile.TemporaryFile(dir=self.directory)
+		run.write(b"".join(orjson.dumps(record) + b"\n" for record in self._buffer))
+		run.seek(0)
+		self._runs.append(run)
+		self._buffer = []
+
+	@staticmethod
+	def _read(run: IO[bytes]) -> Iterator[Dict[str, Any]]:
+		for line in run:
+			yield orjson.loads(line)
+
+	def __iter__(self) -> Iterator[Dict[str, Any]]:
+		if not self._runs:
+			# Everything fit in one buffer: no file round trip
+			self._buffer.sort(key=itemgetter(self.key))
+			return iter(self._buffer)
+		if self._buffer:
+			self._spill()
+		return heapq.merge(*(self._read(run) for run in self._runs), key=itemgetter(self.key))
+
+	@property
+	def spilled_runs(self) -> int:
+		return len(self._runs)
+
+	def close(self) -> None:
+		for run in self._runs:
+			run.close()
+		self._runs = []
+		self._buffer = []
+
+	def __enter__(self) -> "ExternalSorter":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
@@ -0,0 +1,27 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable
+
+
+class KeyedLocks:
+	"""One asyncio.Lock per key, created on demand and dropped once nobody holds or awaits it."""
+
+	def __init__(self):
+		self._locks: Dict[Hashable, asyncio.Lock] = {}
+		self._waiters: Dict[Hashable, int] = {}
+
+	@asynccontextmanager
+	async def hold(self, key: Hashable) -> AsyncIterator[None]:
+		lock = self._locks.setdefault(key, asyncio.Lock())
+		self._waiters[key] = self._waiters.get(key, 0) + 1
+		try:
+			async with lock:
+				yield
+		finally:
+			self._waiters[key] -= 1
+			if not self._waiters[key]:
+				del self._waiters[key]
+				del self._locks[key]
+
+	def __len__(self) -> int:
+		return len(self._locks)
@@ -0,0 +1,23 @@
+from typing import Any
+
+
+def merge_patch(target: Any, patch: Any) -> Any:
+	"""Apply a JSON merge patch (RFC 7386) and return the result; inputs are not modified.
+
+	Objects in the patch are merged key by key, a null value removes the key and
+	any other value replaces the target's.
+	"""
+	if not isinstance(patch, dict):
+		return patch
+	result = dict(target) if isinstance(target, dict) else {}
+	for key, value in patch.items():
+		if value is None:
+			result.pop(key, None)
+		else:
+			result[key] = merge_patch(result.get(key), value)
+	return result
+
+
+def is_applied(target: Any, patch: Any) -> bool:
+	"""Whether applying the patch to `target` would leave it unchanged."""
+	return merge_patch(target, patch) == target
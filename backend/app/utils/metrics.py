@@ -0,0 +1,97 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class Histogram:
+	"""Fixed-bucket latency histogram (milliseconds); not thread-safe, callers hold their own lock."""
+
+	__slots__ = ("count", "total_ms", "max_ms", "buckets")
+
+	def __init__(self):
+		self.count = 0
+		self.total_ms = 0.0
+		self.max_ms = 0.0
+		self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+	def observe(self, elapsed_ms: float) -> None:
+		self.count += 1
+		self.total_ms += elapsed_ms
+		self.max_ms = max(self.max_ms, elapsed_ms)
+		self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+	def percentile(self, fraction: float) -> Optional[float]:
+		"""Upper bound of the bucket holding the given fraction of observations."""
+		if not self.count:
+			return None
+		threshold = fraction * self.count
+		seen = 0
+		for i, n in enumerate(self.buckets):
+			seen += n
+			if seen >= threshold:
+				return float(LATENCY_BUCKETS_MS[i]) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+		return self.max_ms
+
+	def as_dict(self) -> Dict[str, Any]:
+		return {
+			"count": self.count,
+			"total_ms": round(self.total_ms, 3),
+			"avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+			"max_ms": round(self.max_ms, 3),
+			"p50_ms": self.percentile(0.50),
+			"p95_ms": self.percentile(0.95),
+			"p99_ms": self.percentile(0.99),
+		}
+
+
+class PhaseTimer:
+	"""Wall-clock duration of the named phases of one request.
+
+	Phases may overlap (concurrent I/O), so they need not add up to the total.
+	`header()` renders them for a Server-Timing response header.
+	"""
+
+	def __init__(self):
+		self.started = time.perf_counter()
+		self.phases: Dict[str, float] = {}
+
+	@contextmanager
+	def phase(self, name: str) -> Iterator[None]:
+		started = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.phases[name] = self.phases.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+	def total_ms(self) -> float:
+		return (time.perf_counter() - self.started) * 1000
+
+	def header(self) -> str:
+		timings = [*self.phases.items(), ("total", self.total_ms())]
+		return ", ".join(f"{name};dur={elapsed_ms:.1f}" for name, elapsed_ms in timings)
+
+
+class PhaseHistograms:
+	"""Thread-safe latency histograms keyed by phase name, fed from PhaseTimers."""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._histograms: Dict[str, Histogram] = {}
+
+	def record(self, timer: PhaseTimer) -> None:
+		total_ms = timer.total_ms()
+		with self._lock:
+			for name, elapsed_ms in [*timer.phases.items(), ("total", total_ms)]:
+				histogram = self._histograms.get(name)
+				if histogram is None:
+					histogram = self._histograms[name] = Histogram()
+				histogram.observe(elapsed_ms)
+
+	def as_dict(self) -> Dict[str, Any]:
+		with self._lock:
+			return {name: histogram.as_dict() for name, histogram in self._histograms.items()}
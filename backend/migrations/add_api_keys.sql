@@ -0,0 +1,21 @@
+-- API key index (app/repositories/api_key.py). APISIX key-auth still checks keys
+-- at the gateway; this table lets the backend look a key up, audit keys and
+-- revoke them without scanning every consumer. Keys are stored only as
+-- HMAC-SHA256 of "api_key:<key>" (keyed with TOKEN_HASH_KEY), so a lookup is
+-- one unique-index read.
+-- A user has at most one active key (revoked_at NULL); rotated and revoked keys
+-- are kept for audit. Keys issued before this table existed are not indexed
+-- until they are rotated.
+CREATE TABLE IF NOT EXISTS user_db.api_keys (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  key_hash BINARY(32) NOT NULL,
+  user_id INT NOT NULL,
+  key_preview VARCHAR(16) NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  last_used_at DATETIME NULL,
+  revoked_at DATETIME NULL,
+  UNIQUE KEY uniq_key_hash (key_hash),
+  INDEX idx_user_revoked (user_id, revoked_at),
+  INDEX idx_revoked_last_used (revoked_at, last_used_at),
+  CONSTRAINT fk_api_keys_user FOREIGN KEY (user_id) REFERENCES user_db.users (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,29 @@
+-- Resumable bulk operations on users (app/services/bulk_jobs.py).
+-- cursor_id is the last user id handled, so an interrupted job resumes after it.
+CREATE TABLE IF NOT EXISTS user_db.bulk_jobs (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  kind ENUM('group_migration') NOT NULL,
+  params JSON NOT NULL,
+  dry_run BOOLEAN NOT NULL,
+  status ENUM('running', 'completed', 'failed') NOT NULL DEFAULT 'running',
+  cursor_id INT NOT NULL DEFAULT 0,
+  processed INT UNSIGNED NOT NULL DEFAULT 0,
+  succeeded INT UNSIGNED NOT NULL DEFAULT 0,
+  failed INT UNSIGNED NOT NULL DEFAULT 0,
+  error VARCHAR(255) NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  finished_at DATETIME NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- One row per user a job could not handle
+CREATE TABLE IF NOT EXISTS user_db.bulk_job_errors (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  job_id INT NOT NULL,
+  user_id INT NOT NULL,
+  username VARCHAR(100) NOT NULL,
+  error VARCHAR(255) NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX idx_job_id (job_id, id),
+  CONSTRAINT fk_bulk_job_errors_job FOREIGN KEY (job_id) REFERENCES user_db.bulk_jobs (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,13 @@
+-- Fixed-window failure counters and locks per (username, ip).
+-- Replaces the per-attempt COUNT(*) over login_attempts and the separate
+-- login_locks table: one upsert both increments the counter and sets the lock.
+CREATE TABLE IF NOT EXISTS user_db.login_counters (
+  username VARCHAR(191) NOT NULL,
+  ip VARCHAR(45) NOT NULL,
+  window_start DATETIME NOT NULL,
+  failures INT UNSIGNED NOT NULL DEFAULT 0,
+  locked_until DATETIME NULL,
+  PRIMARY KEY (username, ip),
+  INDEX idx_window_start (window_start),
+  INDEX idx_locked_until (locked_until)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,37 @@
+-- Asynchronous consumer provisioning (app/services/provisioning.py).
+-- Registration commits the user in state 'provisioning' together with an
+-- outbox row; a background worker creates the APISIX consumer from the row,
+-- then marks the user 'ready' and deletes the row. Existing users are ready.
+-- MySQL has no ADD COLUMN IF NOT EXISTS: the column is only added when
+-- INFORMATION_SCHEMA does not list it, so the file can be run again.
+SET @provision_state_exists := (
+  SELECT COUNT(*) FROM INFORMATION_SCHEMA.COLUMNS
+  WHERE TABLE_SCHEMA = 'user_db' AND TABLE_NAME = 'users' AND COLUMN_NAME = 'provision_state'
+);
+SET @add_provision_state := IF(
+  @provision_state_exists = 0,
+  'ALTER TABLE user_db.users ADD COLUMN provision_state ENUM(''provisioning'', ''ready'') NOT NULL DEFAULT ''ready''',
+  'DO 0'
+);
+PREPARE add_provision_state FROM @add_provision_state;
+EXECUTE add_provision_state;
+DEALLOCATE PREPARE add_provision_state;
+
+-- secret_hash is the bcrypt hash of the chosen password (the consumer's jwt-auth
+-- secret); it only lives here until the consumer exists.
+-- next_attempt_at doubles as the lease of a claimed row: claiming moves it
+-- forward, so a worker that dies mid-way leaves the row to be retried.
+CREATE TABLE IF NOT EXISTS user_db.provisioning_outbox (
+  id BIGINT AUTO_INCREMENT PRIMARY KEY,
+  user_id INT NOT NULL,
+  username VARCHAR(100) NOT NULL,
+  u_type VARCHAR(20) NOT NULL,
+  secret_hash VARCHAR(255) NOT NULL,
+  attempts INT UNSIGNED NOT NULL DEFAULT 0,
+  next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  last_error VARCHAR(255) NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE KEY uniq_user (user_id),
+  INDEX idx_next_attempt_at (next_attempt_at),
+  CONSTRAINT fk_provisioning_outbox_user FOREIGN KEY (user_id) REFERENCES user_db.users (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
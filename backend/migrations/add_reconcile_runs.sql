@@ -0,0 +1,29 @@
+-- History of DB-to-APISIX reconciliation runs (app/services/reconcile.py).
+-- The start time of the last completed non-dry run is the watermark of
+-- incremental runs, which only look at users updated since then.
+CREATE TABLE IF NOT EXISTS user_db.reconcile_runs (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  mode ENUM('full', 'incremental') NOT NULL,
+  dry_run BOOLEAN NOT NULL,
+  since DATETIME NULL,
+  status ENUM('running', 'completed', 'failed') NOT NULL DEFAULT 'running',
+  started_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  finished_at DATETIME NULL,
+  summary JSON NULL,
+  INDEX idx_status_dry_run (status, dry_run)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Incremental runs select users by updated_at. MySQL has no CREATE INDEX IF NOT
+-- EXISTS: the index is only created when INFORMATION_SCHEMA does not list it.
+SET @users_updated_at_exists := (
+  SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS
+  WHERE TABLE_SCHEMA = 'user_db' AND TABLE_NAME = 'users' AND INDEX_NAME = 'idx_users_updated_at'
+);
+SET @add_users_updated_at := IF(
+  @users_updated_at_exists = 0,
+  'CREATE INDEX idx_users_updated_at ON user_db.users (updated_at)',
+  'DO 0'
+);
+PREPARE add_users_updated_at FROM @add_users_updated_at;
+EXECUTE add_users_updated_at;
+DEALLOCATE PREPARE add_users_updated_at;
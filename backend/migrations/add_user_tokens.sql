@@ -0,0 +1,51 @@
+-- One-time tokens (email verification codes, password recovery tokens).
+-- Tokens are stored only as HMAC-SHA256 of "<purpose>:<token>" keyed with the
+-- TOKEN_HASH_KEY server secret (verification codes also include the user id, as
+-- six digits are not unique), so redeeming one is a primary-key lookup and a
+-- leaked table cannot be brute-forced back to codes without the secret.
+-- One active token per (user, purpose): issuing a new one replaces the old.
+CREATE TABLE IF NOT EXISTS user_db.user_tokens (
+  token_hash BINARY(32) NOT NULL,
+  purpose ENUM('verification', 'recovery') NOT NULL,
+  user_id INT NOT NULL,
+  expires_at DATETIME NOT NULL,
+  attempts INT UNSIGNED NOT NULL DEFAULT 0,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (token_hash),
+  UNIQUE KEY uniq_user_purpose (user_id, purpose),
+  INDEX idx_expires_at (expires_at),
+  CONSTRAINT fk_user_tokens_user FOREIGN KEY (user_id) REFERENCES user_db.users (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Plaintext token columns (and their indexes) move out of users.
+-- Codes pending at migration time are dropped: users request a new one.
+-- MySQL has no DROP ... IF EXISTS: each ALTER lists only what INFORMATION_SCHEMA
+-- still has, so the file can be run again.
+SET @drop_token_indexes := (
+  SELECT GROUP_CONCAT(DISTINCT CONCAT('DROP INDEX ', INDEX_NAME) SEPARATOR ', ')
+  FROM INFORMATION_SCHEMA.STATISTICS
+  WHERE TABLE_SCHEMA = 'user_db' AND TABLE_NAME = 'users'
+  AND INDEX_NAME IN ('idx_users_recovery', 'idx_users_verification', 'idx_verification')
+);
+SET @drop_token_indexes := IF(
+  @drop_token_indexes IS NULL, 'DO 0', CONCAT('ALTER TABLE user_db.users ', @drop_token_indexes)
+);
+PREPARE drop_token_indexes FROM @drop_token_indexes;
+EXECUTE drop_token_indexes;
+DEALLOCATE PREPARE drop_token_indexes;
+
+SET @drop_token_columns := (
+  SELECT GROUP_CONCAT(CONCAT('DROP COLUMN ', COLUMN_NAME) SEPARATOR ', ')
+  FROM INFORMATION_SCHEMA.COLUMNS
+  WHERE TABLE_SCHEMA = 'user_db' AND TABLE_NAME = 'users'
+  AND COLUMN_NAME IN (
+    'verification_code', 'verification_code_expires', 'verification_attempts', 'last_verification_sent',
+    'recovery_token', 'recovery_token_expires', 'recovery_attempts', 'last_recovery_sent'
+  )
+);
+SET @drop_token_columns := IF(
+  @drop_token_columns IS NULL, 'DO 0', CONCAT('ALTER TABLE user_db.users ', @drop_token_columns)
+);
+PREPARE drop_token_columns FROM @drop_token_columns;
+EXECUTE drop_token_columns;
+DEALLOCATE PREPARE drop_token_columns;
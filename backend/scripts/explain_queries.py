@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""Query-plan regression check for the repository layer.
+
+Seeds the configured database with synthetic users, tokens and login counters,
+runs every UserRepository / TokenRepository / LoginAttemptRepository method
+inside a transaction that is rolled back, captures the statements they issue
+and EXPLAINs each one.
+
+Full table scans (type ALL), full index scans (type index) and filesorts are
+flagged. The plans are compared with a baseline file; a statement whose access
+type gets worse, that stops using an index, or that gains a new flag is a
+regression, and so is a baseline statement the run no longer issues (a broken
+or renamed scenario). Without a baseline, any flagged statement fails. A
+scenario that raises or a statement that cannot be EXPLAINed also fails the
+run (and no baseline is written). Any failure exits with status 1.
+
+Seeded rows use the "plan_seed_" prefix; --cleanup removes them.
+
+Usage:
+	python scripts/explain_queries.py [--rows 20000] [--no-seed] [--cleanup]
+		[--baseline scripts/query_plans.json] [--update-baseline]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import get_db_config
+from app.db.instrumentation import fingerprint
+from app.db.unit_of_work import UnitOfWork
+from app.repositories.user import UserRepository
+from app.repositories.login_attempt import LoginAttemptRepository
+from app.repositories.token import TokenRepository, hash_token, RECOVERY, VERIFICATION
+
+SEED_PREFIX = "plan_seed_"
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans.json")
+
+# Access types from best to worst (MySQL EXPLAIN "type" column)
+ACCESS_TYPES = [
+	"system", "const", "eq_ref", "ref", "fulltext", "ref_or_null", "index_merge",
+	"unique_subquery", "index_subquery", "range", "index", "ALL",
+]
+
+
+class CapturingCursor:
+	"""Cursor proxy that records every statement (with its first parameter set)."""
+
+	def __init__(self, cursor, statements):
+		self._cursor = cursor
+		self._statements = statements
+
+	def __getattr__(self, name):
+		return getattr(self._cursor, name)
+
+	def __iter__(self):
+		return iter(self._cursor)
+
+	def execute(self, query, params=None):
+		self._statements.append((query, params))
+		return self._cursor.execute(query, params)
+
+	def executemany(self, query, seq_params):
+		seq_params = list(seq_params)
+		if seq_params:
+			self._statements.append((query, seq_params[0]))
+		return self._cursor.executemany(query, seq_params)
+
+
+class CapturingConnection:
+	"""Connection proxy whose cursors record the statements they run."""
+
+	def __init__(self, connection):
+		self._connection = connection
+		self.statements = []
+
+	def __getattr__(self, name):
+		return getattr(self._connection, name)
+
+	def cursor(self, *args, **kwargs):
+		return CapturingCursor(self._connection.cursor(*args, **kwargs), self.statements)
+
+
+def seed(conn, rows: int) -> None:
+	"""Insert synthetic users/tokens/counters until `rows` seeded users exist."""
+	cursor = conn.cursor()
+	cursor.execute("SELECT COUNT(*) FROM user_db.users WHERE username LIKE %s", (f"{SEED_PREFIX}%",))
+	existing = cursor.fetchone()[0]
+	if existing >= rows:
+		print(f"→ {existing} seeded users already present")
+		cursor.close()
+		return
+
+	rng = random.Random(42)
+	now = datetime.now()
+	batch = []
+	counters = []
+	for n in range(existing, rows):
+		username = f"{SEED_PREFIX}{n}"
+		status = rng.choice(["active", "active", "active", "pending", "disabled"])
+		batch.append((
+			username, f"{username}@example.com", rng.choice(["basic", "pro"]), status,
+			rng.random() < 0.2, status == "active",
+		))
+		if rng.random() < 0.3:
+			counters.append((username, f"10.0.{n // 256 % 256}.{n % 256}", now, rng.randrange(1, 4)))
+		if len(batch) >= 1000:
+			_insert_seed(cursor, batch, counters)
+			conn.commit()
+			batch, counters = [], []
+	_insert_seed(cursor, batch, counters)
+	conn.commit()
+
+	# Live tokens for a slice of the seeded users
+	cursor.execute(
+		"SELECT id FROM user_db.users WHERE username LIKE %s AND MOD(id, 10) = 0", (f"{SEED_PREFIX}%",)
+	)
+	tokens = []
+	for (user_id,) in cursor.fetchall():
+		purpose = RECOVERY if user_id % 20 == 0 else VERIFICATION
+		token = f"{SEED_PREFIX}token_{user_id}"
+		tokens.append((
+			hash_token(purpose, token, user_id if purpose == VERIFICATION else None),
+			purpose, user_id, now + timedelta(minutes=30),
+		))
+	cursor.executemany(
+		"""
+		INSERT IGNORE INTO user_db.user_tokens (token_hash, purpose, user_id, expires_at)
+		VALUES (%s, %s, %s, %s)
+		""",
+		tokens
+	)
+	conn.commit()
+
+	cursor.execute("ANALYZE TABLE user_db.users, user_db.user_tokens, user_db.login_counters")
+	cursor.fetchall()
+	cursor.close()
+	print(f"✓ Seeded {rows - existing} users")
+
+
+def _insert_seed(cursor, users, counters) -> None:
+	if users:
+		cursor.executemany(
+			"""
+			INSERT INTO user_db.users (username, email, u_type, u_status, isFederated, email_verified)
+			VALUES (%s, %s, %s, %s, %s, %s)
+			""",
+			users
+		)
+	if counters:
+		cursor.executemany(
+			"""
+			INSERT IGNORE INTO user_db.login_counters (username, ip, window_start, failures)
+			VALUES (%s, %s, %s, %s)
+			""",
+			counters
+		)
+
+
+def cleanup(conn) -> None:
+	cursor = conn.cursor()
+	cursor.execute("DELETE FROM user_db.login_counters WHERE username LIKE %s", (f"{SEED_PREFIX}%",))
+	# Seeded tokens go with their users (ON DELETE CASCADE)
+	cursor.execute("DELETE FROM user_db.users WHERE username LIKE %s", (f"{SEED_PREFIX}%",))
+	conn.commit()
+	cursor.close()
+	print("✓ Removed seeded rows")
+
+
+def scenarios(rows: int):
+	"""(name, repository class, call) for every repository method worth checking."""
+	n = rows // 2
+	username = f"{SEED_PREFIX}{n}"
+	email = f"{username}@example.com"
+	token_user = n - n % 20
+	now = datetime.now()
+	return [
+		("user.get_by_id", UserRepository, lambda r: r.get_by_id(n)),
+		("user.get_by_username", UserRepository, lambda r: r.get_by_username(username)),
+		("user.get_by_email", UserRepository, lambda r: r.get_by_email(email)),
+		("user.create", UserRepository, lambda r: r.create({"username": f"{SEED_PREFIX}new", "email": "new@example.com"})),
+		("user.update", UserRepository, lambda r: r.update(n, {"u_type": "pro"})),
+		("user.delete", UserRepository, lambda r: r.delete(n)),
+		("user.list_users", UserRepository, lambda r: r.list_users(u_type="pro", u_status="active")),
+		("user.list_users.email_contains", UserRepository, lambda r: r.list_users(email_contains="example")),
+		("user.list_after", UserRepository, lambda r: r.list_after(n, 1000)),
+		("user.list_after.updated_since", UserRepository, lambda r: r.list_after(0, 1000, updated_since=now - timedelta(hours=1))),
+		("user.list_for_migration", UserRepository, lambda r: r.list_for_migration(0, 500, "pro", u_type="basic", u_status="active")),
+		("user.list_for_migration.user_ids", UserRepository, lambda r: r.list_for_migration(0, 500, "pro", user_ids=[n, n + 1, n + 2])),
+		("user.set_u_type_many", UserRepository, lambda r: r.set_u_type_many([n, n + 1], "pro")),
+		("user.find_existing", UserRepository, lambda r: r.find_existing([username], [email])),
+		("user.create_many", UserRepository, lambda r: r.create_many([{"username": f"{SEED_PREFIX}bulk", "email": "bulk@example.com"}])),
+		("user.get_usernames", UserRepository, lambda r: r.get_usernames([n, n + 1])),
+		("user.set_api_key_previews", UserRepository, lambda r: r.set_api_key_previews({n: "abc...xyz", n + 1: None})),
+		("user.get_user_status", UserRepository, lambda r: r.get_user_status(username)),
+		("user.get_user_profile", UserRepository, lambda r: r.get_user_profile(username)),
+		("user.get_user_email_status", UserRepository, lambda r: r.get_user_email_status(username)),
+		("user.verify_email_code", UserRepository, lambda r: r.verify_email_code(username, "123456", 5)),
+		("user.increment_verification_attempts", UserRepository, lambda r: r.increment_verification_attempts(username)),
+		("user.get_user_minimal_by_email", UserRepository, lambda r: r.get_user_minimal_by_email(email)),
+		("token.issue", TokenRepository, lambda r: r.issue(n, VERIFICATION, hash_token(VERIFICATION, "123456", n), now)),
+		("token.redeem", TokenRepository, lambda r: r.redeem(hash_token(RECOVERY, f"{SEED_PREFIX}token_{token_user}"), RECOVERY)),
+		("token.get_active", TokenRepository, lambda r: r.get_active(n, VERIFICATION)),
+		("token.delete_expired", TokenRepository, lambda r: r.delete_expired(1000)),
+		("login.register_failure", LoginAttemptRepository, lambda r: r.register_failure(username, "10.0.0.1", 10, 3, 15)),
+		("login.get_lock_until", LoginAttemptRepository, lambda r: r.get_lock_until(username, "10.0.0.1")),
+		("login.get_active_locks", LoginAttemptRepository, lambda r: r.get_active_locks()),
+		("login.reset", LoginAttemptRepository, lambda r: r.reset(username, "10.0.0.1")),
+		("login.record_attempts", LoginAttemptRepository, lambda r: r.record_attempts([(username, "10.0.0.1", now, False)])),
+	]
+
+
+def capture(conn, rows: int):
+	"""Run every scenario in one rolled-back transaction.
+
+	Returns [(name, query, params)] and the names of the scenarios that raised.
+	"""
+	captured = []
+	failed = []
+	proxy = CapturingConnection(conn)
+	uow = UnitOfWork(proxy)
+	uow.begin()
+	try:
+		for name, repository_class, call in scenarios(rows):
+			start = len(proxy.statements)
+			try:
+				call(repository_class(uow))
+			except Exception as e:
+				print(f"✗ {name} raised {e}")
+				failed.append(name)
+			captured.extend((name, query, params) for query, params in proxy.statements[start:])
+	finally:
+		uow.close()
+	return captured, failed
+
+
+def explain(conn, query, params):
+	cursor = conn.cursor(dictionary=True)
+	try:
+		cursor.execute(f"EXPLAIN {query}", params)
+		rows = cursor.fetchall()
+	finally:
+		cursor.close()
+	plan = []
+	for row in rows:
+		extra = row.get("Extra") or ""
+		flags = []
+		if row.get("type") == "ALL":
+			flags.append("full_scan")
+		elif row.get("type") == "index":
+			flags.append("index_scan")
+		if "Using filesort" in extra:
+			flags.append("filesort")
+		plan.append({
+			"table": row.get("table"),
+			"type": row.get("type"),
+			"key": row.get("key"),
+			"rows": row.get("rows"),
+			"flags": flags,
+		})
+	return plan
+
+
+def regressions(key, plan, baseline_plan):
+	found = []
+	if baseline_plan is None:
+		return [f"{key}: new statement flagged {step['flags']} on {step['table']}" for step in plan if step["flags"]]
+	before = {step["table"]: step for step in baseline_plan}
+	for step in plan:
+		old = before.get(step["table"])
+		if old is None:
+			if step["flags"]:
+				found.append(f"{key}: {step['table']} flagged {step['flags']}")
+			continue
+		new_flags = set(step["flags"]) - set(old["flags"])
+		if new_flags:
+			found.append(f"{key}: {step['table']} now {sorted(new_flags)}")
+		if old["key"] and not step["key"]:
+			found.append(f"{key}: {step['table']} no longer uses index {old['key']}")
+		if step["type"] in ACCESS_TYPES and old["type"] in ACCESS_TYPES \
+				and ACCESS_TYPES.index(step["type"]) > ACCESS_TYPES.index(old["type"]):
+			found.append(f"{key}: {step['table']} access {old['type']} -> {step['type']}")
+	return found
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--rows", type=int, default=20000, help="Synthetic users to seed")
+	parser.add_argument("--no-seed", action="store_true", help="Use the data already in the database")
+	parser.add_argument("--cleanup", action="store_true", help="Remove seeded rows and exit")
+	parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline plans file")
+	parser.add_argument("--update-baseline", action="store_true", help="Write current plans as the new baseline")
+	args = parser.parse_args()
+
+	config = get_db_config()
+	config.pop("pool_size", None)
+	config.pop("pool_reset_session", None)
+	conn = mysql.connector.connect(**config)
+	try:
+		if args.cleanup:
+			cleanup(conn)
+			return 0
+		if not args.no_seed:
+			seed(conn, args.rows)
+
+		plans = {}
+		captured, errors = capture(conn, args.rows)
+		errors = [f"{name} raised" for name in errors]
+		for name, query, params in captured:
+			key = f"{name} :: {fingerprint(query)}"
+			try:
+				plans[key] = explain(conn, query, params)
+			except mysql.connector.Error as e:
+				print(f"✗ Cannot explain {key}: {e}")
+				errors.append(f"{key} cannot be explained")
+	finally:
+		conn.close()
+
+	for key, plan in sorted(plans.items()):
+		marks = ", ".join(f"{s['table']}:{s['type']}/{s['key'] or '-'} {' '.join(s['flags'])}".strip() for s in plan)
+		print(f"{'⚠' if any(s['flags'] for s in plan) else '✓'} {key}\n    {marks}")
+
+	if errors:
+		print("\nScenario errors:")
+		for line in errors:
+			print(f"  ✗ {line}")
+		return 1
+
+	if args.update_baseline:
+		with open(args.baseline, "w") as f:
+			json.dump(plans, f, indent=2, sort_keys=True)
+		print(f"\nBaseline written to {args.baseline} ({len(plans)} statements)")
+		return 0
+
+	baseline = {}
+	if os.path.exists(args.baseline):
+		with open(args.baseline) as f:
+			baseline = json.load(f)
+	found = []
+	for key, plan in plans.items():
+		found.extend(regressions(key, plan, baseline.get(key)))
+	# A scenario that stopped issuing a statement (or was renamed) must not drop out silently
+	found.extend(f"{key}: not issued by this run" for key in sorted(baseline.keys() - plans.keys()))
+
+	if found:
+		print("\nPlan regressions:")
+		for line in found:
+			print(f"  ✗ {line}")
+		return 1
+	print(f"\nNo plan regressions ({len(plans)} statements)")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
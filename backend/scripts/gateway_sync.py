@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Sync APISIX routes, upstreams and consumer groups with a declarative JSON spec.
+
+The spec maps "upstreams", "consumer_groups" and/or "routes" to {id: object},
+objects in the admin API's format. Only the objects that differ are written,
+and objects of a kind in the spec that the spec does not list are deleted
+(unless --no-delete); see app/services/gateway_sync.py. Without --apply the
+plan is printed and nothing is changed. --export writes the live state as a
+spec, to start one from what the dashboard holds.
+
+Exits with status 1 when an operation fails, or when a dry run finds changes.
+
+Usage:
+	python scripts/gateway_sync.py spec.json [--apply] [--no-delete] [--json]
+	python scripts/gateway_sync.py --export spec.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import orjson
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import background
+from app.services.gateway_sync import GatewaySyncService
+
+
+async def run(args) -> dict:
+	try:
+		if args.export:
+			return await GatewaySyncService.export()
+		with open(args.spec, "rb") as f:
+			spec = orjson.loads(f.read())
+		service = GatewaySyncService(spec, delete=not args.no_delete, concurrency=args.concurrency)
+		return await service.sync(dry_run=not args.apply)
+	finally:
+		# Closes the shared admin API client
+		await background.stop_all()
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("spec", help="Spec file to apply (or to write, with --export)")
+	parser.add_argument("--apply", action="store_true", help="Carry out the plan (default: print it only)")
+	parser.add_argument("--no-delete", action="store_true", help="Keep live objects the spec does not list")
+	parser.add_argument("--concurrency", type=int, help="Admin writes in flight at once")
+	parser.add_argument("--export", action="store_true", help="Write the live state to the spec file")
+	parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+	args = parser.parse_args()
+
+	result = asyncio.run(run(args))
+	if args.export:
+		with open(args.spec, "wb") as f:
+			f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS))
+		print(f"Wrote {', '.join(f'{len(objects)} {kind}' for kind, objects in result.items())} to {args.spec}")
+		return 0
+
+	if args.json:
+		print(json.dumps(result, indent=2))
+	else:
+		for op in result["operations"]:
+			line = f"  {op['method'].upper():6} {op['kind']}/{op['id']}"
+			if op["fields"]:
+				line += f" ({', '.join(op['fields'])})"
+			if op["error"]:
+				line += f": FAILED {op['error']}"
+			print(line)
+		mode = "dry run" if result["dry_run"] else ("applied" if result["applied"] else "failed")
+		print(f"{result['puts']} puts, {result['deletes']} deletes ({mode})")
+
+	if result["failed"] or result["applied"] is False:
+		return 1
+	if result["dry_run"] and result["operations"]:
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
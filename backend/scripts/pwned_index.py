@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Build and refresh the offline Pwned Passwords index used at registration.
+
+build    Convert the Pwned Passwords SHA-1 dataset into the sorted, memory-mappable
+         index read by app/core/pwned.py. SOURCE is either the directory of range
+         files written by the PwnedPasswordsDownloader (00000.txt ... FFFFF.txt,
+         "SUFFIX:COUNT" lines) or its single-file output ("HASH:COUNT" lines,
+         sorted). --delta folds a delta file into the new index.
+delta    Refresh the delta file: fetch the next --ranges range prefixes from the
+         Pwned Passwords API and record the hashes the index does not have (a
+         changed count does not change whether a password is breached, so those
+         are left for the next build). Successive runs walk all 16^5 ranges; the
+         position is kept next to the delta file. Workers pick up a changed delta
+         within PWNED_REFRESH_SECONDS.
+
+Outputs are written to a temporary file and renamed into place, so running
+workers never map a half-written file.
+
+Usage:
+	python scripts/pwned_index.py build SOURCE pwned.idx [--delta pwned.delta]
+	python scripts/pwned_index.py delta pwned.idx pwned.delta [--ranges 4096]
+"""
+import argparse
+import asyncio
+import heapq
+import os
+import struct
+import sys
+from typing import Dict, Iterator, List, Tuple
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.pwned import FANOUT_SIZE, HEADER_SIZE, INDEX_MAGIC, RECORD, PwnedPasswordIndex, read_range_lines
+
+RANGE_COUNT = 16 ** 5
+RANGE_URL = "https://api.pwnedpasswords.com/range/{prefix}"
+
+
+def read_source(source: str) -> Iterator[Tuple[bytes, int]]:
+	"""Yield (sha1, count) in hash order from a range directory or a single sorted file."""
+	if os.path.isdir(source):
+		for name in sorted(os.listdir(source)):
+			prefix, ext = os.path.splitext(name)
+			if len(prefix) != 5 or ext.lower() != ".txt":
+				continue
+			with open(os.path.join(source, name), "r", encoding="ascii") as f:
+				yield from sorted(read_range_lines(f, prefix.upper()))
+	else:
+		with open(source, "r", encoding="ascii") as f:
+			yield from read_range_lines(f)
+
+
+def read_delta(path: str) -> Dict[bytes, int]:
+	if not path or not os.path.exists(path):
+		return {}
+	with open(path, "r", encoding="ascii") as f:
+		return dict(read_range_lines(f))
+
+
+def merged(source: Iterator[Tuple[bytes, int]], delta: Dict[bytes, int]) -> Iterator[Tuple[bytes, int]]:
+	"""Merge the dataset with the delta; the delta's count wins for a hash in both."""
+	previous = None
+	# Delta entries sort first for equal hashes (rank 0), so they are the ones kept
+	for sha1, _, count in heapq.merge(
+		((sha1, 0, count) for sha1, count in sorted(delta.items())),
+		((sha1, 1, count) for sha1, count in source)
+	):
+		if sha1 == previous:
+			continue
+		previous = sha1
+		yield sha1, count
+
+
+def build(args) -> int:
+	records = merged(read_source(args.source), read_delta(args.delta))
+	fanout = [0] * FANOUT_SIZE
+	count = 0
+	previous = b""
+	tmp = args.output + ".tmp"
+	with open(tmp, "wb") as out:
+		out.write(b"\0" * HEADER_SIZE)
+		for sha1, seen in records:
+			if sha1 <= previous:
+				raise SystemExit(f"Source is not sorted at {sha1.hex().upper()}")
+			previous = sha1
+			fanout[int.from_bytes(sha1[:2], "big") + 1] += 1
+			out.write(RECORD.pack(sha1, min(seen, 0xFFFFFFFF)))
+			count += 1
+		# Bucket sizes to start offsets
+		for i in range(1, FANOUT_SIZE):
+			fanout[i] += fanout[i - 1]
+		out.seek(0)
+		out.write(INDEX_MAGIC + struct.pack(">Q", count) + struct.pack(f">{FANOUT_SIZE}Q", *fanout))
+	os.replace(tmp, args.output)
+	print(f"Wrote {count} hashes to {args.output}")
+	return 0
+
+
+async def fetch_ranges(prefixes: List[str], concurrency: int) -> List[Tuple[str, str]]:
+	semaphore = asyncio.Semaphore(concurrency)
+	async with httpx.AsyncClient(timeout=30) as client:
+		async def fetch(prefix: str) -> Tuple[str, str]:
+			async with semaphore:
+				response = await client.get(RANGE_URL.format(prefix=prefix))
+				response.raise_for_status()
+				return prefix, response.text
+		return await asyncio.gather(*(fetch(prefix) for prefix in prefixes))
+
+
+def delta(args) -> int:
+	index = PwnedPasswordIndex(args.index)
+	index.refresh()
+	if not index.loaded:
+		raise SystemExit(f"Cannot read index {args.index}")
+	cursor_path = args.delta + ".cursor"
+	start = 0
+	if os.path.exists(cursor_path):
+		with open(cursor_path) as f:
+			start = int(f.read().strip() or 0) % RANGE_COUNT
+	prefixes = [f"{(start + i) % RANGE_COUNT:05X}" for i in range(min(args.ranges, RANGE_COUNT))]
+
+	entries = read_delta(args.delta)
+	added = 0
+	for prefix, body in asyncio.run(fetch_ranges(prefixes, args.concurrency)):
+		for sha1, seen in read_range_lines(body.splitlines(), prefix):
+			if sha1 not in entries and not index.lookup(sha1):
+				entries[sha1] = seen
+				added += 1
+
+	tmp = args.delta + ".tmp"
+	with open(tmp, "w", encoding="ascii") as out:
+		for sha1, seen in sorted(entries.items()):
+			out.write(f"{sha1.hex().upper()}:{seen}\n")
+	os.replace(tmp, args.delta)
+	with open(cursor_path, "w") as f:
+		f.write(str((start + len(prefixes)) % RANGE_COUNT))
+	print(f"Ranges {prefixes[0]}-{prefixes[-1]}: {added} new hashes, {len(entries)} in delta")
+	return 0
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	build_parser = commands.add_parser("build", help="Build the index from the dataset")
+	build_parser.add_argument("source", help="Range file directory or single HASH:COUNT file")
+	build_parser.add_argument("output", help="Index file to write")
+	build_parser.add_argument("--delta", help="Delta file to fold into the index")
+	build_parser.set_defaults(func=build)
+
+	delta_parser = commands.add_parser("delta", help="Refresh the delta file from the API")
+	delta_parser.add_argument("index", help="Index file")
+	delta_parser.add_argument("delta", help="Delta file to update")
+	delta_parser.add_argument("--ranges", type=int, default=4096, help="Range prefixes to fetch in this run")
+	delta_parser.add_argument("--concurrency", type=int, default=16, help="Concurrent API requests")
+	delta_parser.set_defaults(func=delta)
+
+	args = parser.parse_args()
+	return args.func(args)
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Reconcile MySQL users with APISIX consumers.
+
+Reports users without consumer, consumers without user and consumers whose group
+differs from the user's u_type; with --repair, fixes them (see
+app/services/reconcile.py). --incremental only looks at users updated since the
+last completed repairing run and cannot find consumers without user. The run
+is recorded in reconcile_runs like those started from POST /admin/reconcile.
+
+--repair deletes consumers without user, except those in
+RECONCILE_IGNORE_CONSUMERS and CRUD_ADMIN; while that list is empty, orphans
+are reported but not deleted, so list the service consumers there first.
+
+Exits with status 1 when the run fails, or when drift is found in a dry run.
+
+Usage:
+	python scripts/reconcile.py [--repair] [--incremental] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import background
+from app.services.reconcile import ReconciliationService
+
+
+async def reconcile(args) -> dict:
+	service = ReconciliationService(dry_run=not args.repair, incremental=args.incremental)
+	try:
+		return await service.run()
+	finally:
+		# Closes the shared admin API client
+		await background.stop_all()
+
+
+def main() -> int:
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--repair", action="store_true", help="Repair the drift found (default: report only)")
+	parser.add_argument("--incremental", action="store_true", help="Only users updated since the last repairing run")
+	parser.add_argument("--json", action="store_true", help="Print the full summary as JSON")
+	args = parser.parse_args()
+
+	summary = asyncio.run(reconcile(args))
+	if args.json:
+		print(json.dumps(summary, indent=2, default=str))
+	else:
+		print(f"Run {summary['id']} ({summary['mode']}{', dry run' if summary['dry_run'] else ''}): {summary['status']} in {summary['seconds']}s")
+		print(f"  {summary['users']} users, {summary['consumers']} consumers, {summary['skipped_recent']} skipped as recent")
+		for kind, found in summary["found"].items():
+			print(f"  {kind}: {found} found, {summary['repaired'][kind]} repaired, {summary['failed'][kind]} failed")
+		if not summary["dry_run"] and not summary["orphan_repair"]:
+			print("  orphan consumers not deleted: RECONCILE_IGNORE_CONSUMERS is empty")
+		if summary["error"]:
+			print(f"  error: {summary['error']}")
+
+	if summary["status"] != "completed":
+		return 1
+	if summary["dry_run"] and any(summary["found"].values()):
+		return 1
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
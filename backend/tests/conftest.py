@@ -0,0 +1,14 @@
+import os
+
+# Settings are read at import time; unit tests never reach SMTP or APISIX
+for name, value in {
+	"SMTP_HOST": "localhost",
+	"SMTP_PORT": "25",
+	"SMTP_USERNAME": "test",
+	"SMTP_PASSWORD": "test",
+	"SMTP_FROM_EMAIL": "test@example.com",
+	"SMTP_FROM_NAME": "test",
+	"APISIX_ADMIN_KEY": "test",
+	"TOKEN_HASH_KEY": "test",
+}.items():
+	os.environ.setdefault(name, value)
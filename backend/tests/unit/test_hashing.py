@@ -0,0 +1,26 @@
+import asyncio
+import os
+
+from app.core.hashing import PasswordHasher
+
+
+def test_pool_is_replaced_after_a_worker_dies():
+	hasher = PasswordHasher(workers=1, max_pending=8, rounds=4)
+
+	async def main() -> None:
+		hashed = await hasher.hash("correct horse")
+		# Kill the worker process: the pool is broken from then on
+		executor = hasher._get_executor()
+		pid = await asyncio.get_running_loop().run_in_executor(executor, os.getpid)
+		os.kill(pid, 9)
+		await asyncio.sleep(0.5)
+
+		assert await hasher.verify("correct horse", hashed)
+		assert hasher._get_executor() is not executor
+		assert hasher.stats()["restarts"] == 1
+		assert await hasher.verify("wrong", hashed) is False
+
+	try:
+		asyncio.run(main())
+	finally:
+		hasher.shutdown()
@@ -0,0 +1,70 @@
+import asyncio
+
+from app.utils.locks import KeyedLocks
+
+
+def test_same_key_is_serialized():
+	locks = KeyedLocks()
+	events = []
+
+	async def worker(name: str) -> None:
+		async with locks.hold("ann"):
+			events.append(f"{name} in")
+			await asyncio.sleep(0.01)
+			events.append(f"{name} out")
+
+	async def main() -> None:
+		await asyncio.gather(worker("a"), worker("b"))
+
+	asyncio.run(main())
+	assert events == ["a in", "a out", "b in", "b out"]
+
+
+def test_different_keys_run_concurrently():
+	locks = KeyedLocks()
+	inside = []
+
+	async def worker(key: str) -> None:
+		async with locks.hold(key):
+			inside.append(key)
+			await asyncio.sleep(0.01)
+			# Both got in before either left
+			assert len(inside) == 2
+
+	async def main() -> None:
+		await asyncio.gather(worker("ann"), worker("bob"))
+
+	asyncio.run(main())
+
+
+def test_locks_are_dropped_when_released():
+	locks = KeyedLocks()
+
+	async def main() -> None:
+		async with locks.hold("ann"):
+			waiter = asyncio.create_task(_hold(locks, "ann"))
+			await asyncio.sleep(0)
+			assert len(locks) == 1
+		await waiter
+		assert len(locks) == 0
+
+	asyncio.run(main())
+
+
+def test_lock_is_dropped_after_an_error():
+	locks = KeyedLocks()
+
+	async def main() -> None:
+		try:
+			async with locks.hold("ann"):
+				raise ValueError("boom")
+		except ValueError:
+			pass
+		assert len(locks) == 0
+
+	asyncio.run(main())
+
+
+async def _hold(locks: KeyedLocks, key: str) -> None:
+	async with locks.hold(key):
+		pass
@@ -0,0 +1,47 @@
+from app.utils.merge_patch import merge_patch, is_applied
+
+
+def test_merges_objects_key_by_key():
+	target = {"username": "ann", "plugins": {"jwt-auth": {"key": "ann", "secret": "s"}}}
+	patch = {"group_id": "pro", "plugins": {"jwt-auth": {"secret": "t"}}}
+	assert merge_patch(target, patch) == {
+		"username": "ann",
+		"group_id": "pro",
+		"plugins": {"jwt-auth": {"key": "ann", "secret": "t"}},
+	}
+
+
+def test_null_removes_the_key():
+	# RFC 7386: what API key revocation relies on to drop key-auth
+	target = {"plugins": {"jwt-auth": {"key": "ann"}, "key-auth": {"key": "k"}}}
+	assert merge_patch(target, {"plugins": {"key-auth": None}}) == {"plugins": {"jwt-auth": {"key": "ann"}}}
+
+
+def test_null_for_a_missing_key_is_a_no_op():
+	assert merge_patch({"a": 1}, {"b": None}) == {"a": 1}
+
+
+def test_non_object_values_replace():
+	assert merge_patch({"a": {"b": 1}}, {"a": [1, 2]}) == {"a": [1, 2]}
+	assert merge_patch({"a": [1, 2]}, {"a": {"b": 1}}) == {"a": {"b": 1}}
+	assert merge_patch({"a": 1}, "x") == "x"
+
+
+def test_patch_of_a_non_object_target_starts_from_empty():
+	assert merge_patch("x", {"a": 1, "b": None}) == {"a": 1}
+
+
+def test_inputs_are_not_modified():
+	target = {"plugins": {"key-auth": {"key": "k"}}}
+	patch = {"plugins": {"key-auth": None}}
+	merge_patch(target, patch)
+	assert target == {"plugins": {"key-auth": {"key": "k"}}}
+	assert patch == {"plugins": {"key-auth": None}}
+
+
+def test_is_applied():
+	current = {"group_id": "pro", "plugins": {"jwt-auth": {"key": "ann"}}}
+	assert is_applied(current, {"group_id": "pro"})
+	assert is_applied(current, {"plugins": {"key-auth": None}})
+	assert not is_applied(current, {"group_id": "basic"})
+	assert not is_applied(current, {"plugins": {"jwt-auth": None}})
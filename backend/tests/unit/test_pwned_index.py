@@ -0,0 +1,114 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.core.pwned import PwnedPasswordIndex
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def sha1(password: str) -> bytes:
+	return hashlib.sha1(password.encode()).digest()
+
+
+def write_ranges(directory, hashes) -> None:
+	"""Write {sha1: count} as range files ("SUFFIX:COUNT" lines, unsorted, with padding)."""
+	ranges = {}
+	for digest, count in hashes.items():
+		hex_digest = digest.hex().upper()
+		ranges.setdefault(hex_digest[:5], []).append(f"{hex_digest[5:]}:{count}")
+	for prefix, lines in ranges.items():
+		# Padding entries (count 0) are not part of the dataset
+		lines.append(f"{'A' * 35}:0")
+		(directory / f"{prefix}.txt").write_text("\r\n".join(reversed(lines)) + "\r\n")
+
+
+def run_script(*args) -> None:
+	subprocess.run([sys.executable, "scripts/pwned_index.py", *args], cwd=BACKEND, check=True, capture_output=True)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+	hashes = {sha1(f"password{i}"): i + 1 for i in range(200)}
+	# First and last fan-out buckets
+	hashes[bytes(20)] = 7
+	hashes[b"\xff" * 20] = 9
+	ranges = tmp_path / "ranges"
+	ranges.mkdir()
+	write_ranges(ranges, hashes)
+	return tmp_path, ranges, hashes
+
+
+def load(path, **kwargs) -> PwnedPasswordIndex:
+	index = PwnedPasswordIndex(str(path), **kwargs)
+	assert index.refresh()
+	return index
+
+
+def test_build_round_trip(dataset):
+	tmp_path, ranges, hashes = dataset
+	run_script("build", str(ranges), str(tmp_path / "pwned.idx"))
+	index = load(tmp_path / "pwned.idx")
+
+	assert index.stats()["records"] == len(hashes)
+	for digest, count in hashes.items():
+		assert index.lookup(digest) == count
+	assert index.lookup(sha1("not breached")) == 0
+	assert index.lookup(bytes(19) + b"\x01") == 0
+	assert index.lookup(b"\xff" * 19 + b"\xfe") == 0
+	padding = bytes.fromhex(sha1("password1").hex()[:5] + "A" * 35)
+	assert index.lookup(padding) == 0
+
+
+def test_delta_folded_into_build_wins(dataset):
+	tmp_path, ranges, hashes = dataset
+	known = sha1("password1")
+	delta = tmp_path / "pwned.delta"
+	delta.write_text(f"{known.hex().upper()}:1000\n{sha1('newly breached').hex().upper()}:3\n")
+	run_script("build", str(ranges), str(tmp_path / "pwned.idx"), "--delta", str(delta))
+	index = load(tmp_path / "pwned.idx")
+
+	assert index.stats()["records"] == len(hashes) + 1
+	assert index.lookup(known) == 1000
+	assert index.lookup(sha1("newly breached")) == 3
+
+
+def test_runtime_delta_overrides_index(dataset):
+	tmp_path, ranges, _ = dataset
+	run_script("build", str(ranges), str(tmp_path / "pwned.idx"))
+	delta = tmp_path / "pwned.delta"
+	delta.write_text(f"{sha1('password5').hex().upper()}:42\n{sha1('fresh').hex().upper()}:2\n")
+	index = load(tmp_path / "pwned.idx", delta_path=str(delta))
+
+	assert index.lookup(sha1("password5")) == 42
+	assert index.lookup(sha1("fresh")) == 2
+	assert index.lookup(sha1("password6")) == 7
+
+
+def test_delta_records_only_hashes_missing_from_the_index(dataset, monkeypatch):
+	tmp_path, ranges, _ = dataset
+	idx, delta = tmp_path / "pwned.idx", tmp_path / "pwned.delta"
+	run_script("build", str(ranges), str(idx))
+	spec = importlib.util.spec_from_file_location("pwned_index", os.path.join(BACKEND, "scripts", "pwned_index.py"))
+	script = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(script)
+
+	known, fresh = sha1("password1").hex().upper(), sha1("fresh").hex().upper()
+
+	async def fetch_ranges(prefixes, concurrency):
+		# A known hash whose count has grown, a new one, and padding
+		return [
+			(known[:5], f"{known[5:]}:999\r\n{'A' * 35}:0\r\n"),
+			(fresh[:5], f"{fresh[5:]}:4\r\n"),
+		]
+
+	monkeypatch.setattr(script, "fetch_ranges", fetch_ranges)
+	script.delta(argparse.Namespace(index=str(idx), delta=str(delta), ranges=2, concurrency=1))
+
+	assert delta.read_text() == f"{fresh}:4\n"
+	assert (tmp_path / "pwned.delta.cursor").read_text() == "2"
@@ -0,0 +1,26 @@
+import hashlib
+
+from app.repositories.token import hash_token, hmac_pads, VERIFICATION
+
+
+def sql_form(user_id: int, code: str) -> bytes:
+	# What UserRepository.verify_email_code computes in MySQL
+	inner, outer = hmac_pads()
+	digest = hashlib.sha256(inner + f"verification:{user_id}:{code}".encode()).digest()
+	return hashlib.sha256(outer + digest).digest()
+
+
+def test_sql_form_matches_hash_token():
+	assert sql_form(42, "123456") == hash_token(VERIFICATION, "123456", 42)
+
+
+def test_codes_are_keyed(monkeypatch):
+	unkeyed = hashlib.sha256(b"verification:42:123456").digest()
+	assert hash_token(VERIFICATION, "123456", 42) != unkeyed
+
+	from app.core.config import settings
+	before = hash_token(VERIFICATION, "123456", 42)
+	monkeypatch.setattr(settings, "TOKEN_HASH_KEY", "another secret" * 10)
+	assert hash_token(VERIFICATION, "123456", 42) != before
+	# Keys longer than a block are hashed first
+	assert sql_form(42, "123456") == hash_token(VERIFICATION, "123456", 42)